@@ -0,0 +1,53 @@
+import json
+import logging
+from pathlib import Path
+from typing import Optional
+
+from app.core.atomic_file import atomic_write_bytes
+
+logger = logging.getLogger(__name__)
+
+
+class AliasTable:
+    """
+    Таблица псевдонимов: ключ запроса -> slug сохраненного объяснения.
+    Хранится в JSON файле; перечитывается, если файл изменил другой воркер.
+    Потеря псевдонима при одновременной записи не страшна: он будет найден и записан заново.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._aliases: dict[str, str] = {}
+        self._file_mtime: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def _reload_if_changed(self):
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return
+        if mtime == self._file_mtime:
+            return
+        try:
+            self._aliases = json.loads(self.path.read_text(encoding="utf-8"))
+            self._file_mtime = mtime
+        except Exception as e:
+            logger.error(f"Error loading alias table {self.path}: {e}")
+
+    def get(self, alias: str) -> Optional[str]:
+        self._reload_if_changed()
+        return self._aliases.get(alias)
+
+    def items(self) -> list[tuple[str, str]]:
+        self._reload_if_changed()
+        return list(self._aliases.items())
+
+    def add(self, alias: str, slug: str):
+        self._reload_if_changed()
+        if self._aliases.get(alias) == slug:
+            return
+        self._aliases[alias] = slug
+        atomic_write_bytes(self.path, json.dumps(self._aliases, ensure_ascii=False).encode("utf-8"))
+        self._file_mtime = self.path.stat().st_mtime
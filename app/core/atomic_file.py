@@ -0,0 +1,36 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+
+def unique_temp_path(path: Path) -> Path:
+    """
+    Новый пустой временный файл рядом с path (та же папка - rename атомарен).
+    Имя уникально, поэтому одновременные записи одного файла не портят временные файлы друг друга.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    return Path(tmp_name)
+
+
+@contextmanager
+def atomic_open(path: Path, mode: str = "wb", **kwargs):
+    """
+    Открывает временный файл для записи; после успешного блока `with` подменяет им path через rename.
+    При ошибке временный файл удаляется, читатели видят либо старый файл, либо новый целиком.
+    """
+    tmp_path = unique_temp_path(path)
+    try:
+        with open(tmp_path, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)  # После успешного rename файла уже нет
+
+
+def atomic_write_bytes(path: Path, content: bytes):
+    """Атомарная запись байтов (синхронно - из потока или служебных команд)."""
+    with atomic_open(path, "wb") as f:
+        f.write(content)
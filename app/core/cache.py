@@ -0,0 +1,94 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+@dataclass
+class _CacheEntry:
+    value: Any
+    mtime: float  # Время изменения записи в хранилище на момент чтения
+    size: int  # Примерный размер в байтах (размер исходного файла)
+    validated_at: float  # Когда последний раз сверяли mtime с диском
+
+
+class ExplanationCache:
+    """
+    LRU-кеш разобранных объектов перед хранилищем (файлами или SQLite).
+
+    - Ограничен по числу записей (max_entries) и суммарному размеру (max_bytes).
+    - В течение ttl секунд после проверки запись отдается без обращения к диску.
+    - После ttl запись сверяется с временем изменения в хранилище: если запись изменилась, она выбрасывается.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, mtime: Optional[float] = None) -> Optional[Any]:
+        """
+        Возвращает значение из кеша или None.
+        Без mtime запись считается актуальной только в пределах ttl.
+        С mtime (после stat файла) запись актуальна, если mtime совпадает.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        if mtime is None:
+            if now - entry.validated_at >= self.ttl:
+                return None  # Нужно сверить с диском
+        elif entry.mtime != mtime:
+            self.misses += 1
+            self.invalidate(key)
+            return None
+        else:
+            entry.validated_at = now
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def put(self, key: str, value: Any, mtime: float, size: int):
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return  # Кеш выключен или запись больше всего кеша
+        self.invalidate(key)
+        self._entries[key] = _CacheEntry(value=value, mtime=mtime, size=size, validated_at=time.monotonic())
+        self._total_bytes += size
+        while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._total_bytes -= evicted.size
+            self.evictions += 1
+
+    def invalidate(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry.size
+
+    def clear(self):
+        self._entries.clear()
+        self._total_bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
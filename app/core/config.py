@@ -9,7 +9,105 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(dotenv_path=BASE_DIR / ".env")
 
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-EXPLANATIONS_DIR = BASE_DIR / "explanations" # Путь к папке с объяснениями
+EXPLANATIONS_DIR = Path(os.getenv("EXPLANATIONS_DIR", str(BASE_DIR / "explanations"))) # Путь к папке с объяснениями
+# Папка создается хранилищем при старте (storage.init), а не при импорте настроек
 
-# Убедимся, что директория существует
-EXPLANATIONS_DIR.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+# --- Пул генерации (ограничение одновременных запросов к GenAI) ---
+GENERATION_MAX_CONCURRENCY = int(os.getenv("GENERATION_MAX_CONCURRENCY", "4"))  # Сколько генераций идет одновременно
+GENERATION_MAX_QUEUE = int(os.getenv("GENERATION_MAX_QUEUE", "16"))  # Сколько запросов может ждать свободного слота
+GENERATION_QUEUE_TIMEOUT = float(os.getenv("GENERATION_QUEUE_TIMEOUT", "10"))  # Сколько секунд ждать слот в очереди
+GENERATION_RETRY_AFTER = int(os.getenv("GENERATION_RETRY_AFTER", "5"))  # Значение заголовка Retry-After при отказе
+
+# --- Single-flight: одна генерация на slug при одновременных одинаковых запросах ---
+# Межпроцессная блокировка через lock-файлы нужна, только если запущено несколько воркеров uvicorn
+SINGLEFLIGHT_FILE_LOCK = os.getenv("SINGLEFLIGHT_FILE_LOCK", "false").lower() in ("1", "true", "yes")
+SINGLEFLIGHT_LOCK_TIMEOUT = float(os.getenv("SINGLEFLIGHT_LOCK_TIMEOUT", "60"))  # Секунд ожидания чужой генерации
+LOCKS_DIR = EXPLANATIONS_DIR / ".locks"
+
+# --- In-memory кеш разобранных объяснений ---
+EXPLANATION_CACHE_MAX_ENTRIES = int(os.getenv("EXPLANATION_CACHE_MAX_ENTRIES", "2000"))  # 0 - кеш выключен
+EXPLANATION_CACHE_MAX_BYTES = int(os.getenv("EXPLANATION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+EXPLANATION_CACHE_TTL = float(os.getenv("EXPLANATION_CACHE_TTL", "30"))  # Секунд до повторной сверки mtime с диском
+
+# --- Поисковый индекс (триграммы по теме и началу текста) ---
+SEARCH_INDEX_PATH = EXPLANATIONS_DIR / ".index" / "search_index.json"
+
+# --- Псевдонимы ключей запросов (канонический ключ -> slug сохраненного объяснения), для JSON хранилища ---
+ALIASES_PATH = EXPLANATIONS_DIR / ".index" / "aliases.json"
+
+# --- Семантический поиск перефразировок перед генерацией (нужен numpy) ---
+SEMANTIC_LOOKUP_ENABLED = os.getenv("SEMANTIC_LOOKUP_ENABLED", "false").lower() in ("1", "true", "yes")
+SEMANTIC_SIMILARITY_THRESHOLD = float(os.getenv("SEMANTIC_SIMILARITY_THRESHOLD", "0.9"))  # Косинусная близость
+SEMANTIC_INDEX_DIM = int(os.getenv("SEMANTIC_INDEX_DIM", "256"))  # Размерность хешированных векторов
+SEMANTIC_INDEX_PATH = EXPLANATIONS_DIR / ".index" / "semantic_index.npz"
+
+# --- Хранилище объяснений: "json" (файл на slug, для небольших установок) или "sqlite" ---
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json").lower()
+SQLITE_DB_PATH = Path(os.getenv("SQLITE_DB_PATH", str(EXPLANATIONS_DIR / "explanations.sqlite3")))
+# Сжатие файлов JSON хранилища: "none" (компактный JSON), "gzip" или "zstd" (нужен пакет zstandard)
+JSON_STORAGE_COMPRESSION = os.getenv("JSON_STORAGE_COMPRESSION", "none").lower()
+
+# --- Кеш отрендеренных страниц объяснений (HTML + gzip/brotli) ---
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "1000"))  # 0 - кеш выключен
+
+# --- Sitemap: индекс + дочерние sitemap, кешируются до следующего сохранения объяснения ---
+SITEMAP_PAGE_SIZE = int(os.getenv("SITEMAP_PAGE_SIZE", "50000"))  # URL в одном дочернем sitemap (не больше 50 000)
+SITEMAP_CACHE_DIR = EXPLANATIONS_DIR / ".sitemap"
+
+# --- Устойчивый клиент GenAI: таймауты, повторы, хеджирование, circuit breaker ---
+GENAI_BASE_URL = os.getenv("GENAI_BASE_URL")  # Например, адрес локального фейкового сервера для тестов
+GENAI_TIMEOUT = float(os.getenv("GENAI_TIMEOUT", "60"))  # Секунд на одну попытку (или на фрагмент потока)
+GENAI_MAX_RETRIES = int(os.getenv("GENAI_MAX_RETRIES", "2"))  # Повторов при таймаутах, 429 и 5xx
+GENAI_BACKOFF_BASE = float(os.getenv("GENAI_BACKOFF_BASE", "0.5"))  # Базовая задержка перед повтором, секунд
+GENAI_BACKOFF_MAX = float(os.getenv("GENAI_BACKOFF_MAX", "8"))
+GENAI_HEDGE_PERCENTILE = float(os.getenv("GENAI_HEDGE_PERCENTILE", "0"))  # 0 - без хеджирования, например 0.95
+GENAI_HEDGE_MIN_SAMPLES = int(os.getenv("GENAI_HEDGE_MIN_SAMPLES", "20"))  # Замеров задержки до включения хеджа
+GENAI_BREAKER_FAILURES = int(os.getenv("GENAI_BREAKER_FAILURES", "5"))  # Ошибок подряд до размыкания (0 - выкл.)
+GENAI_BREAKER_RESET = float(os.getenv("GENAI_BREAKER_RESET", "30"))  # Секунд до пробного вызова
+
+# --- Негативный кеш: запросы, которые не прошли проверку или заблокированы, не генерируются повторно ---
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv("NEGATIVE_CACHE_MAX_ENTRIES", "10000"))  # 0 - кеш выключен
+NEGATIVE_CACHE_TTLS = {  # Секунд жизни записи по классу отказа (0 - не кешировать)
+    "blocked": float(os.getenv("NEGATIVE_CACHE_TTL_BLOCKED", "86400")),  # Заблокировано фильтрами/прервано
+    "empty": float(os.getenv("NEGATIVE_CACHE_TTL_EMPTY", "600")),
+    "too_short": float(os.getenv("NEGATIVE_CACHE_TTL_TOO_SHORT", "3600")),
+    "error_text": float(os.getenv("NEGATIVE_CACHE_TTL_ERROR_TEXT", "3600")),  # Ответ похож на отказ/ошибку
+    "upstream_error": float(os.getenv("NEGATIVE_CACHE_TTL_UPSTREAM_ERROR", "0")),  # Сбой сервиса AI - временный
+}
+
+# --- Служебные эндпоинты /api/admin/* (заголовок X-Admin-Token); без токена они выключены ---
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# --- Фоновое обновление устаревших объяснений (stale-while-revalidate) ---
+PROMPT_VERSION = int(os.getenv("PROMPT_VERSION", "1"))  # Увеличить при изменении промпта: старые тексты обновятся
+REFRESH_MAX_AGE_DAYS = float(os.getenv("REFRESH_MAX_AGE_DAYS", "0"))  # Возраст, после которого текст обновляется (0 - никогда)
+REFRESH_AGE_JITTER = float(os.getenv("REFRESH_AGE_JITTER", "0.2"))  # Разброс возраста по slug, чтобы не устаревали разом
+REFRESH_MAX_CONCURRENCY = int(os.getenv("REFRESH_MAX_CONCURRENCY", "1"))  # Фоновых генераций одновременно (0 - выкл.)
+REFRESH_MAX_QUEUE = int(os.getenv("REFRESH_MAX_QUEUE", "100"))  # Сколько slug может ждать обновления
+REFRESH_MIN_INTERVAL = float(os.getenv("REFRESH_MIN_INTERVAL", "5"))  # Секунд между стартами фоновых генераций
+REFRESH_RETRY_INTERVAL = float(os.getenv("REFRESH_RETRY_INTERVAL", "3600"))  # Секунд до повторной попытки для slug
+
+# --- Метрики Prometheus на /metrics (у каждого воркера свои) ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# --- Ограничение частоты запросов к /api/explain по клиенту (IP или API-ключ), ответ 429 с Retry-After ---
+# Выключено по умолчанию: за обратным прокси без RATE_LIMIT_TRUST_PROXY все посетители имеют IP прокси
+# и делили бы один бюджет генераций на весь сайт
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "false").lower() in ("1", "true", "yes")
+RATE_LIMIT_EXPLAIN_PER_MINUTE = float(os.getenv("RATE_LIMIT_EXPLAIN_PER_MINUTE", "60"))  # Любые запросы, в т.ч. из кеша
+RATE_LIMIT_EXPLAIN_BURST = float(os.getenv("RATE_LIMIT_EXPLAIN_BURST", "30"))
+RATE_LIMIT_GENERATE_PER_MINUTE = float(os.getenv("RATE_LIMIT_GENERATE_PER_MINUTE", "3"))  # Только промахи (вызовы AI)
+RATE_LIMIT_GENERATE_BURST = float(os.getenv("RATE_LIMIT_GENERATE_BURST", "10"))
+# Общие для всех воркеров uvicorn лимиты через файл SQLite; иначе у каждого воркера свои корзины
+RATE_LIMIT_SHARED = os.getenv("RATE_LIMIT_SHARED", "false").lower() in ("1", "true", "yes")
+RATE_LIMIT_DB_PATH = EXPLANATIONS_DIR / ".index" / "rate_limit.sqlite3"
+# Брать IP клиента из X-Forwarded-For (только если приложение стоит за своим nginx/балансировщиком)
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() in ("1", "true", "yes")
+# Ключи из заголовка X-API-Key, которые считаются отдельными клиентами (через запятую); чужие ключи игнорируются
+RATE_LIMIT_API_KEYS = {key.strip() for key in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if key.strip()}
+# Сколько запросов к API генерации обрабатывается одновременно (0 - без ограничения); страницы не ограничиваются
+API_MAX_IN_FLIGHT = int(os.getenv("API_MAX_IN_FLIGHT", "64"))
+
+# --- Прогрев при старте: воркер начинает принимать запросы только после него ---
+PREWARM_EXPLANATIONS = int(os.getenv("PREWARM_EXPLANATIONS", "0"))  # Сколько последних объяснений загрузить в кеш
+PREWARM_GENAI = os.getenv("PREWARM_GENAI", "false").lower() in ("1", "true", "yes")  # Создать клиент GenAI сразу
@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationOverloadedError(Exception):
+    """Пул генерации переполнен — клиенту нужно повторить запрос позже."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Сервис генерации сейчас перегружен. Пожалуйста, попробуйте через несколько секунд.")
+        self.retry_after = retry_after
+
+
+class GenerationPool:
+    """
+    Ограничивает число одновременных генераций и длину очереди ожидания.
+    Если очередь заполнена (или слот не освободился за queue_timeout),
+    запрос сразу отклоняется, чтобы не копить зависшие соединения.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._rejected = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Занимает слот генерации на время блока `async with`."""
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            self._reject("queue is full")
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject(f"no free slot after {self.queue_timeout}s")
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    def _reject(self, reason: str):
+        self._rejected += 1
+        logger.warning(f"Generation rejected ({reason}). In flight: {self._in_flight}, waiting: {self._waiting}")
+        raise GenerationOverloadedError(self.retry_after)
+
+    def stats(self) -> dict:
+        """Текущее состояние пула (для логов и метрик)."""
+        return {
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "rejected": self._rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
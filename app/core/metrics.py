@@ -0,0 +1,171 @@
+import bisect
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional, Union
+
+# Границы корзин гистограмм по умолчанию, секунд: от чтения из памяти до долгой генерации AI
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+LabelValues = tuple[str, ...]
+# Значение метрики-обратного вызова: одно число или пары (значения меток, число)
+CallbackValue = Union[float, Iterable[tuple[dict, float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+
+    def _key(self, labels: dict) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class CounterMetric(_Metric):
+    """Монотонный счетчик с метками."""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())]
+
+
+class HistogramMetric(_Metric):
+    """Гистограмма длительностей (сумма, количество и накопительные корзины, как в Prometheus)."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: dict[LabelValues, list] = {}  # метки -> [счетчики корзин..., +Inf, сумма]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет длительность блока `with` (в том числе завершившегося исключением)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """Значение вычисляется при каждом сборе (gauge или counter из уже существующей статистики)."""
+
+    def __init__(self, name: str, documentation: str, metric_type: str, callback: Callable[[], CallbackValue],
+                 labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.type = metric_type
+        self.callback = callback
+
+    def samples(self) -> list[str]:
+        value = self.callback()
+        if value is None:
+            return []
+        if isinstance(value, (int, float)):
+            return [f"{self.name} {_format_value(value)}"]
+        return [f"{self.name}{_format_labels(self.labelnames, self._key(labels))} {_format_value(number)}"
+                for labels, number in value]
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса в текстовом формате Prometheus (для /metrics).
+    Значения хранятся в памяти воркера: при нескольких воркерах uvicorn каждый отдает свои,
+    и Prometheus суммирует их по меткам instance/pod.
+    """
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self._metrics: dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> CounterMetric:
+        return self._register(CounterMetric(self.prefix + name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> HistogramMetric:
+        return self._register(HistogramMetric(self.prefix + name, documentation, labelnames, buckets))
+
+    def gauge_callback(self, name: str, documentation: str, callback: Callable[[], CallbackValue],
+                       labelnames: tuple[str, ...] = ()) -> CallbackMetric:
+        return self._register(CallbackMetric(self.prefix + name, documentation, "gauge", callback, labelnames))
+
+    def counter_callback(self, name: str, documentation: str, callback: Callable[[], CallbackValue],
+                         labelnames: tuple[str, ...] = ()) -> CallbackMetric:
+        return self._register(CallbackMetric(self.prefix + name, documentation, "counter", callback, labelnames))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(self.prefix + name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.header())
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,70 @@
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class NegativeEntry:
+    failure_class: str  # blocked, empty, too_short, error_text, upstream_error
+    message: str  # Что ответить пользователю вместо повторной генерации
+    created_at: float  # time.time() - для просмотра в админке
+    expires_at: float  # time.monotonic()
+
+
+class NegativeCache:
+    """
+    Ограниченный LRU-кеш неудачных генераций: ключ запроса -> причина отказа.
+    Пока запись жива, повтор того же запроса получает сохраненный ответ сразу, без обращения к AI.
+    Время жизни задается отдельно для каждого класса отказа; TTL 0 - такие отказы не кешируются.
+    """
+
+    def __init__(self, max_entries: int, ttls: dict[str, float]):
+        self.max_entries = max_entries
+        self.ttls = ttls
+        self._entries: OrderedDict[str, NegativeEntry] = OrderedDict()
+        self.hits = Counter()
+        self.stored = Counter()
+
+    def get(self, key: str) -> Optional[NegativeEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.hits[entry.failure_class] += 1
+        return entry
+
+    def put(self, key: str, failure_class: str, message: str):
+        ttl = self.ttls.get(failure_class, 0)
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+        self._entries[key] = NegativeEntry(failure_class, message, created_at=time.time(),
+                                           expires_at=time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        self.stored[failure_class] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: str) -> bool:
+        return self._entries.pop(key, None) is not None
+
+    def clear(self, failure_class: Optional[str] = None) -> int:
+        """Удаляет все записи (или только записи одного класса); возвращает, сколько удалено."""
+        keys = [key for key, entry in self._entries.items()
+                if failure_class is None or entry.failure_class == failure_class]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def entries(self) -> list[dict]:
+        now = time.monotonic()
+        return [{"key": key, "failure_class": entry.failure_class, "message": entry.message,
+                 "created_at": entry.created_at, "expires_in": round(entry.expires_at - now, 1)}
+                for key, entry in self._entries.items() if entry.expires_at > now]
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "max_entries": self.max_entries,
+                "hits": dict(self.hits), "stored": dict(self.stored), "ttls": self.ttls}
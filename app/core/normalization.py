@@ -0,0 +1,90 @@
+import hashlib
+import re
+import unicodedata
+from typing import Optional
+
+from slugify import slugify
+
+# Вопросительные обороты, которые не меняют тему: "Что такое ДНК?" == "ДНК — что это" == "днк"
+QUESTION_TEMPLATES = [
+    "что это такое", "что такое", "что это", "что значит", "что означает", "что представляет собой",
+    "кто такой", "кто такая", "кто такие", "кто это",
+    "объясни мне", "объясните мне", "объясни", "объясните",
+    "расскажи мне про", "расскажи про", "расскажи о", "расскажи об", "расскажите про", "расскажите о",
+    "простыми словами", "простым языком", "своими словами",
+    "what is", "what are", "what s", "who is", "explain",
+]
+_TEMPLATES = sorted((tuple(template.split()) for template in QUESTION_TEMPLATES), key=len, reverse=True)
+
+# Служебные слова, которые выбрасываются из темы
+STOPWORDS = frozenset([
+    "и", "в", "во", "на", "о", "об", "про", "это", "такое", "ли", "же", "вообще", "пожалуйста",
+    "а", "ну", "вот", "the", "a", "an", "of", "please",
+])
+
+_WORD_RE = re.compile(r"\w+")
+
+KEY_HASH_CHARS = 10  # Длина хеш-суффикса ключа
+KEY_READABLE_CHARS = 60  # Сколько символов читаемой части оставлять в ключе
+LEGACY_MAX_LENGTH = 80  # Длина slug в старой схеме ключей
+
+
+def fold_text(text: str) -> list[str]:
+    """Unicode (NFKC), регистр, ё/е и пунктуация: возвращает список слов."""
+    text = unicodedata.normalize("NFKC", text).casefold().replace("ё", "е")
+    text = text.replace("+", " plus ").replace("#", " sharp ")  # C++ и C# не должны схлопываться в "c"
+    return _WORD_RE.findall(text.replace("_", " "))
+
+
+def _strip_templates(words: list[str]) -> list[str]:
+    result = []
+    i = 0
+    while i < len(words):
+        for template in _TEMPLATES:
+            if tuple(words[i:i + len(template)]) == template:
+                i += len(template)
+                break
+        else:
+            result.append(words[i])
+            i += 1
+    return result
+
+
+def normalize_topic(topic: str) -> str:
+    """
+    Каноническая форма темы: свертка Unicode/регистра/пунктуации, без вопросительных оборотов
+    и служебных слов. Если после очистки ничего не осталось, возвращается просто свернутый текст.
+    """
+    words = fold_text(topic)
+    meaningful = [word for word in _strip_templates(words) if word not in STOPWORDS]
+    return " ".join(meaningful or words)
+
+
+def canonical_key(topic: str, level: str, analogy: Optional[str] = None) -> str:
+    """
+    Ключ кеша (slug) для запроса: читаемая часть из канонической темы и уровня
+    плюс хеш полной канонической формы, поэтому длинные темы с общим началом не сталкиваются.
+    Аналогия учитывается только для уровня custom_analogy - только там она влияет на текст.
+    """
+    canonical_topic = normalize_topic(topic)
+    canonical_analogy = normalize_topic(analogy) if level == "custom_analogy" and analogy else ""
+    digest = hashlib.sha1(f"{canonical_topic}\x1f{level}\x1f{canonical_analogy}".encode("utf-8")).hexdigest()
+    readable = slugify(f"{canonical_topic} {level} {canonical_analogy}", lowercase=True, separator='-',
+                       max_length=KEY_READABLE_CHARS, word_boundary=True)
+    return f"{readable}-{digest[:KEY_HASH_CHARS]}" if readable else digest[:KEY_HASH_CHARS]
+
+
+def legacy_topic_slug(topic: str, level: str, analogy: Optional[str] = None,
+                      allow_truncated: bool = False) -> Optional[str]:
+    """
+    Slug по старой схеме (slugify темы, уровня и аналогии с обрезкой до 80 символов).
+    Обрезанный slug возвращается только с allow_truncated: по нему нельзя надежно найти объяснение
+    (у двух длинных тем с общим началом он одинаковый).
+    """
+    slug_args = dict(lowercase=True, separator='-', replacements=[['+', 'plus'], ['#', 'sharp']])
+    full_slug = slugify(f"{topic}-{level}-{analogy or ''}", **slug_args)
+    if len(full_slug) <= LEGACY_MAX_LENGTH:
+        return full_slug
+    if not allow_truncated:
+        return None
+    return slugify(f"{topic}-{level}-{analogy or ''}", max_length=LEGACY_MAX_LENGTH, **slug_args)
@@ -0,0 +1,101 @@
+import datetime
+import email.utils
+import gzip
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    import brotli  # Необязательная зависимость: без нее отдаем только gzip
+except ImportError:
+    brotli = None
+
+
+@dataclass
+class RenderedPage:
+    version: str  # Версия объяснения, из которой отрендерена страница
+    body: bytes
+    gzip_body: bytes
+    brotli_body: Optional[bytes]
+    etag: str
+    last_modified: datetime.datetime
+
+    @classmethod
+    def build(cls, html: str, version: str, last_modified: datetime.datetime) -> "RenderedPage":
+        body = html.encode("utf-8")
+        return cls(
+            version=version,
+            body=body,
+            gzip_body=gzip.compress(body, compresslevel=9),
+            brotli_body=brotli.compress(body, quality=9) if brotli else None,
+            etag='"' + hashlib.sha1(body).hexdigest()[:20] + '"',
+            last_modified=last_modified.replace(microsecond=0),
+        )
+
+    @property
+    def last_modified_header(self) -> str:
+        return email.utils.format_datetime(self.last_modified.astimezone(datetime.timezone.utc), usegmt=True)
+
+    def is_not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        """Проверка условного запроса: If-None-Match важнее If-Modified-Since (RFC 9110)."""
+        if if_none_match:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag in tags
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=datetime.timezone.utc)
+            return self.last_modified <= since
+        return False
+
+    def select_body(self, accept_encoding: str) -> tuple[bytes, Optional[str]]:
+        """Выбирает вариант тела под Accept-Encoding клиента: (тело, Content-Encoding или None)."""
+        accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+        if self.brotli_body is not None and "br" in accepted:
+            return self.brotli_body, "br"
+        if "gzip" in accepted:
+            return self.gzip_body, "gzip"
+        return self.body, None
+
+
+class PageCache:
+    """
+    LRU-кеш отрендеренных страниц объяснений (HTML + сжатые варианты).
+    Ключ - slug и базовый URL (он попадает в canonical-ссылку), значение действительно,
+    пока совпадает версия объяснения. При сохранении объяснения запись сбрасывается через invalidate().
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._pages: OrderedDict[tuple[str, str], RenderedPage] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, slug: str, base_url: str, version: str) -> Optional[RenderedPage]:
+        page = self._pages.get((slug, base_url))
+        if page is None or page.version != version:
+            self.misses += 1
+            return None
+        self._pages.move_to_end((slug, base_url))
+        self.hits += 1
+        return page
+
+    def put(self, slug: str, base_url: str, page: RenderedPage):
+        if self.max_entries <= 0:
+            return
+        self._pages[(slug, base_url)] = page
+        self._pages.move_to_end((slug, base_url))
+        while len(self._pages) > self.max_entries:
+            self._pages.popitem(last=False)
+
+    def invalidate(self, slug: str):
+        for key in [key for key in self._pages if key[0] == slug]:
+            del self._pages[key]
+
+    def stats(self) -> dict:
+        return {"entries": len(self._pages), "hits": self.hits, "misses": self.misses,
+                "brotli": brotli is not None}
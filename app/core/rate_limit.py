@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from app.core.generation_pool import GenerationOverloadedError
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitedError(Exception):
+    """Клиент исчерпал свой бюджет запросов — эндпоинт отвечает 429 с Retry-After."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Слишком много запросов. Пожалуйста, попробуйте немного позже.")
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class BucketPolicy:
+    per_minute: float  # Скорость пополнения; 0 - ограничение выключено
+    burst: float  # Емкость корзины: сколько запросов можно сделать подряд
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60
+
+
+def _take_token(tokens: float, updated_at: float, policy: BucketPolicy, cost: float, now: float) -> tuple[float, float]:
+    """Token bucket: (токенов было, когда) -> (токенов стало, сколько секунд ждать; 0 - запрос пропущен)."""
+    tokens = min(policy.burst, tokens + max(0.0, now - updated_at) * policy.rate)
+    if tokens >= cost:
+        return tokens - cost, 0.0
+    return tokens, (cost - tokens) / policy.rate
+
+
+class MemoryBucketStore:
+    """Корзины в памяти процесса (у каждого воркера uvicorn свои); давно не использованные вытесняются."""
+
+    shared = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: str, policy: BucketPolicy, cost: float) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (policy.burst, now))
+        tokens, wait = _take_token(tokens, updated_at, policy, cost, now)
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteBucketStore:
+    """
+    Корзины в общем файле SQLite: лимиты действуют на все воркеры uvicorn одной машины.
+    Чтение и обновление корзины идут в одной транзакции BEGIN IMMEDIATE, поэтому воркеры не теряют списания.
+    Вызывается из потока (asyncio.to_thread).
+    """
+
+    shared = True
+    CLEANUP_INTERVAL = 600  # Секунд между удалениями давно полных корзин
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # Потерять счетчики при сбое питания не страшно
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets "
+                         "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    def take(self, key: str, policy: BucketPolicy, cost: float) -> float:
+        now = time.time()  # Время общее для процессов, monotonic здесь не подходит
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated_at = row if row else (policy.burst, now)
+                tokens, wait = _take_token(tokens, updated_at, policy, cost, now)
+                conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                             (key, tokens, now))
+                if now - self._last_cleanup > self.CLEANUP_INTERVAL:
+                    # За час любая корзина с ненулевой скоростью снова полная - запись можно не хранить
+                    conn.execute("DELETE FROM buckets WHERE updated_at < ?", (now - 3600,))
+                    self._last_cleanup = now
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return wait
+
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов по клиенту (IP или API-ключ) с отдельными корзинами:
+    например, "explain" списывается за каждый запрос к API, а "generate" - только за промах кеша,
+    то есть за платное обращение к AI. Если общее хранилище недоступно, запрос пропускается.
+    """
+
+    def __init__(self, policies: dict[str, BucketPolicy], store):
+        self.policies = policies
+        self.store = store
+        self.rejected = Counter()
+
+    async def check(self, client_id: Optional[str], bucket: str, cost: float = 1):
+        """Списывает cost токенов из корзины клиента или выбрасывает RateLimitedError."""
+        policy = self.policies.get(bucket)
+        if client_id is None or policy is None or policy.per_minute <= 0:
+            return
+        key = f"{bucket}:{client_id}"
+        try:
+            if self.store.shared:
+                wait = await asyncio.to_thread(self.store.take, key, policy, cost)
+            else:
+                wait = self.store.take(key, policy, cost)
+        except Exception as e:
+            logger.warning(f"Rate limit store unavailable, letting request through: {e}")
+            return
+        if wait > 0:
+            self.rejected[bucket] += 1
+            logger.warning(f"Rate limit '{bucket}' exceeded for client {client_id}, retry after {wait:.1f}s")
+            raise RateLimitedError(max(1, math.ceil(wait)))
+
+    def stats(self) -> dict:
+        return {
+            "store": "sqlite" if self.store.shared else "memory",
+            "policies": {name: {"per_minute": p.per_minute, "burst": p.burst} for name, p in self.policies.items()},
+            "rejected": dict(self.rejected),
+        }
+
+
+class AdmissionGate:
+    """
+    Ограничивает число одновременно обрабатываемых запросов одного класса (например, API генерации).
+    Страницы через ворота не проходят, поэтому при наплыве запросов к API им остается event loop и потоки.
+    """
+
+    def __init__(self, max_in_flight: int, retry_after: int):
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = 0
+
+    def enter(self):
+        """Занимает место или выбрасывает GenerationOverloadedError; после обработки запроса - leave()."""
+        if 0 < self.max_in_flight <= self.in_flight:
+            self.rejected += 1
+            logger.warning(f"Admission rejected: {self.in_flight} requests in flight")
+            raise GenerationOverloadedError(self.retry_after)
+        self.in_flight += 1
+
+    def leave(self):
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {"in_flight": self.in_flight, "max_in_flight": self.max_in_flight, "rejected": self.rejected}
+
+
+def create_rate_limiter(policies: dict[str, BucketPolicy], shared_db_path: Optional[Path]) -> RateLimiter:
+    """Лимитер с общим SQLite хранилищем (если задан путь) или с корзинами в памяти процесса."""
+    store = SQLiteBucketStore(shared_db_path) if shared_db_path else MemoryBucketStore()
+    return RateLimiter(policies, store)
@@ -0,0 +1,84 @@
+import gzip
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Optional
+
+try:
+    import zstandard  # Необязательная зависимость: без нее вместо zstd используется gzip
+except ImportError:
+    zstandard = None
+
+from app.core.atomic_file import atomic_write_bytes
+
+logger = logging.getLogger(__name__)
+
+# Расширение файла -> сжатие. Порядок важен: сначала более длинные расширения
+RECORD_SUFFIXES = {".json.zst": "zstd", ".json.gz": "gzip", ".json": "none"}
+COMPRESSION_SUFFIXES = {compression: suffix for suffix, compression in RECORD_SUFFIXES.items()}
+SHARD_CHARS = 2  # Подпапки по первым двум hex-символам sha1(slug): 256 папок
+
+
+def effective_compression(compression: str) -> str:
+    """Сжатие из настроек с учетом доступных библиотек (zstd без пакета zstandard -> gzip)."""
+    if compression not in COMPRESSION_SUFFIXES:
+        logger.warning(f"Unknown record compression '{compression}', writing plain JSON")
+        return "none"
+    if compression == "zstd" and zstandard is None:
+        logger.warning("zstd compression requested but zstandard is not installed, using gzip")
+        return "gzip"
+    return compression
+
+
+def shard_name(slug: str) -> str:
+    return hashlib.sha1(slug.encode("utf-8")).hexdigest()[:SHARD_CHARS]
+
+
+def is_shard_name(name: str) -> bool:
+    return len(name) == SHARD_CHARS and all(c in "0123456789abcdef" for c in name)
+
+
+def split_record_name(name: str) -> Optional[tuple[str, str]]:
+    """Имя файла записи -> (slug, расширение) или None, если это не файл объяснения."""
+    if name.startswith("."):
+        return None  # Временные и служебные файлы
+    for suffix in RECORD_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)], suffix
+    return None
+
+
+def encode_record(data: dict, compression: str) -> bytes:
+    """dict записи -> байты файла: JSON без отступов, при необходимости сжатый."""
+    raw = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode("utf-8")
+    if compression == "gzip":
+        return gzip.compress(raw, compresslevel=6, mtime=0)
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(raw)
+    return raw
+
+
+def decode_bytes(content: bytes, suffix: str) -> bytes:
+    """Байты файла -> JSON (распаковка по расширению); читает и старые файлы с отступами."""
+    compression = RECORD_SUFFIXES[suffix]
+    if compression == "gzip":
+        return gzip.decompress(content)
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .json.zst records")
+        return zstandard.ZstdDecompressor().decompress(content)
+    return content
+
+
+def read_record_file(path: Path) -> dict:
+    """Читает файл записи любого поддерживаемого формата (синхронно - вызывать из потока)."""
+    parsed = split_record_name(path.name)
+    if parsed is None:
+        raise ValueError(f"Not an explanation record: {path}")
+    return json.loads(decode_bytes(path.read_bytes(), parsed[1]))
+
+
+def write_record_file(path: Path, content: bytes):
+    """Атомарная запись (временный файл + rename), синхронно - для служебных команд."""
+    atomic_write_bytes(path, content)
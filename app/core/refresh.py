@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Обновление одного объяснения по slug; возвращает исход для статистики
+# (refreshed, invalid, fresh, superseded, missing, deferred)
+RefreshFunc = Callable[[str], Awaitable[str]]
+
+
+class BackgroundRefresher:
+    """
+    Фоновое обновление устаревших объяснений (stale-while-revalidate): пользователь сразу получает
+    сохраненную копию, а slug ставится в ограниченную очередь. Очередь разбирают max_concurrency
+    воркеров, новые обновления стартуют не чаще раза в min_interval секунд - после смены промпта
+    устаревшие страницы обновляются постепенно, по мере обращений, без лавины запросов к AI.
+    Одна и та же тема не обновляется повторно чаще, чем раз в retry_interval секунд
+    (даже если новый текст не прошел проверку и копия осталась старой).
+    """
+
+    MAX_REMEMBERED_ATTEMPTS = 10000
+
+    def __init__(self, max_concurrency: int, max_queue: int, min_interval: float, retry_interval: float):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.min_interval = min_interval
+        self.retry_interval = retry_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: set[str] = set()
+        self._attempted: OrderedDict[str, float] = OrderedDict()  # slug -> time.monotonic() попытки
+        self._workers: list[asyncio.Task] = []
+        self._pace_lock = asyncio.Lock()
+        self._next_start = 0.0
+        self._refresh: Optional[RefreshFunc] = None
+        self.outcomes = Counter()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self, refresh: RefreshFunc):
+        """Запускает воркеры в текущем event loop (при старте приложения)."""
+        if self.max_concurrency <= 0 or self.running:
+            return
+        self._refresh = refresh
+        self._queue = asyncio.Queue(maxsize=max(1, self.max_queue))
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+        logger.info(f"Background refresh started: {self.max_concurrency} workers, queue {self.max_queue}")
+
+    async def stop(self):
+        """Останавливает воркеры; незавершенные обновления отменяются, сохраненные копии не меняются."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._pending.clear()
+
+    def schedule(self, slug: str) -> bool:
+        """Ставит slug в очередь обновления; False - уже в очереди, недавно обновлялся или очередь полна."""
+        if not self.running or slug in self._pending:
+            return False
+        attempted_at = self._attempted.get(slug)
+        if attempted_at is not None and time.monotonic() - attempted_at < self.retry_interval:
+            return False
+        try:
+            self._queue.put_nowait(slug)
+        except asyncio.QueueFull:
+            self.outcomes["dropped_queue_full"] += 1
+            return False
+        self._pending.add(slug)
+        self.outcomes["scheduled"] += 1
+        return True
+
+    def _remember_attempt(self, slug: str):
+        self._attempted[slug] = time.monotonic()
+        self._attempted.move_to_end(slug)
+        while len(self._attempted) > self.MAX_REMEMBERED_ATTEMPTS:
+            self._attempted.popitem(last=False)
+
+    async def _wait_for_turn(self):
+        """Разносит старты обновлений во времени не меньше чем на min_interval."""
+        async with self._pace_lock:
+            delay = self._next_start - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_start = time.monotonic() + self.min_interval
+
+    async def _worker(self):
+        while True:
+            slug = await self._queue.get()
+            try:
+                await self._wait_for_turn()
+                outcome = await self._refresh(slug)
+                if outcome != "deferred":  # Отложенное из-за перегрузки можно повторить при следующем обращении
+                    self._remember_attempt(slug)
+                self.outcomes[outcome] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._remember_attempt(slug)
+                self.outcomes["error"] += 1
+                logger.error(f"Background refresh of '{slug}' failed: {e}", exc_info=True)
+            finally:
+                self._pending.discard(slug)
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "workers": len(self._workers),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "outcomes": dict(self.outcomes),
+        }
@@ -0,0 +1,42 @@
+import html
+
+from markdown_it import MarkdownIt
+from pygments import highlight
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import get_lexer_by_name
+from pygments.util import ClassNotFound
+
+_code_formatter = HtmlFormatter(nowrap=True)
+
+
+def _highlight_code(code: str, lang: str, _attrs) -> str:
+    """Подсветка блоков кода через Pygments (разметка как у highlight.js: pre.hljs > code)."""
+    lang = (lang or "").strip().lower()
+    if lang:
+        try:
+            lexer = get_lexer_by_name(lang)
+            highlighted = highlight(code, lexer, _code_formatter)
+            return f'<pre class="hljs"><code class="language-{html.escape(lang)}">{highlighted}</code></pre>'
+        except ClassNotFound:
+            pass
+    return f'<pre class="hljs"><code>{html.escape(code)}</code></pre>'
+
+
+# Те же настройки, что были у markdown-it в браузере: сырой HTML запрещен (экранируется),
+# опасные ссылки (javascript:, vbscript:, data: кроме картинок) отбрасывает validateLink
+_markdown = MarkdownIt("commonmark", {"html": False, "typographer": True, "highlight": _highlight_code}) \
+    .enable(["table", "strikethrough", "replacements", "smartquotes"])
+
+
+def render_markdown(text: str) -> str:
+    """Markdown -> безопасный HTML с подсвеченным кодом."""
+    return _markdown.render(text)
+
+
+def highlight_css(selector: str = ".hljs code", style: str = "github-dark") -> str:
+    """
+    CSS для токенов Pygments (содержимое static/highlight.css).
+    Оставляем только правила для токенов: фон и шрифт блоков кода задает styles.css.
+    """
+    rules = HtmlFormatter(style=style).get_style_defs(selector).splitlines()
+    return "\n".join(rule for rule in rules if rule.startswith(selector + " ."))
@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import random
+import time
+from collections import Counter, deque
+from typing import Any, AsyncIterator, Callable, Optional
+
+from app.core.generation_pool import GenerationOverloadedError
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(GenerationOverloadedError):
+    """Автомат разомкнут после серии ошибок GenAI: промахи кеша отклоняются сразу, без обращения к AI."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after)
+        self.args = ("Сервис AI временно недоступен. Пожалуйста, попробуйте через несколько секунд.",)
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Таймауты, сетевые ошибки, 429 и 5xx стоит повторить; ошибки запроса (4xx, неверный ключ) - нет."""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    # Импорт здесь, а не в начале модуля: к этому моменту оба пакета уже загружены вместе с клиентом GenAI
+    import httpx
+    from google.genai import errors as genai_errors
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, genai_errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return False
+
+
+class CircuitBreaker:
+    """
+    Автомат: после failure_threshold неудачных вызовов подряд размыкается на reset_timeout секунд.
+    Затем пропускает один пробный вызов (half-open): успех замыкает автомат, ошибка размыкает снова.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def retry_after(self) -> int:
+        return max(1, int(self._opened_at + self.reset_timeout - time.monotonic() + 0.999))
+
+    def reject_if_open(self):
+        """Выбрасывает CircuitOpenError, пока автомат разомкнут (без резервирования пробного вызова)."""
+        if self.state == "open" and time.monotonic() - self._opened_at < self.reset_timeout:
+            raise CircuitOpenError(self.retry_after())
+
+    def check(self):
+        """Выбрасывает CircuitOpenError, если вызов сейчас делать нельзя; в half-open резервирует пробный вызов."""
+        if self.failure_threshold <= 0 or self.state == "closed":
+            return
+        if self.state == "open":
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(self.retry_after())
+            self.state = "half_open"
+            self._probe_in_flight = False
+        if self._probe_in_flight:
+            raise CircuitOpenError(1)
+        self._probe_in_flight = True
+
+    def release_probe(self):
+        """Вызов завершился ошибкой запроса, которая ничего не говорит о здоровье сервиса."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info("GenAI circuit breaker closed")
+        self.state = "closed"
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.failure_threshold > 0 and (self.state == "half_open" or self._failures >= self.failure_threshold):
+            if self.state != "open":
+                logger.warning(f"GenAI circuit breaker opened after {self._failures} failures "
+                               f"for {self.reset_timeout:.0f}s")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+
+class LatencyWindow:
+    """Последние max_samples задержек успешных вызовов (для порога хеджирования)."""
+
+    def __init__(self, max_samples: int = 200):
+        self._samples: deque[float] = deque(maxlen=max_samples)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class ResilientGenAIClient:
+    """
+    Обертка над client.aio.models Google GenAI:
+    - таймаут на каждую попытку;
+    - повторы retryable ошибок с экспоненциальной задержкой и full jitter;
+    - хеджирование: если ответа нет дольше hedge_percentile обычной задержки, параллельно
+      отправляется второй такой же запрос и берется первый успешный ответ;
+    - circuit breaker: при серии ошибок вызовы сразу отклоняются CircuitOpenError (503 для клиента).
+    Клиент берется через client_provider при каждом вызове, поэтому его можно подменить или создать позже.
+    """
+
+    def __init__(self, client_provider: Callable[[], Any], timeout: float, max_retries: int,
+                 backoff_base: float, backoff_max: float, hedge_percentile: float, hedge_min_samples: int,
+                 breaker: CircuitBreaker):
+        self.client_provider = client_provider
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker
+        self.latency = LatencyWindow()
+        self.outcomes = Counter()
+
+    def _models(self):
+        client = self.client_provider()
+        if client is None:
+            raise ConnectionError("Google GenAI client not configured or API key missing.")
+        return client.aio.models
+
+    def ensure_available(self):
+        """Быстрый отказ до постановки в очередь генерации, если автомат разомкнут."""
+        try:
+            self.breaker.reject_if_open()
+        except CircuitOpenError:
+            self.outcomes["rejected_circuit_open"] += 1
+            raise
+
+    def _check_breaker(self):
+        try:
+            self.breaker.check()
+        except CircuitOpenError:
+            self.outcomes["rejected_circuit_open"] += 1
+            raise
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile <= 0 or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    async def _call_once(self, model: str, contents, config):
+        return await asyncio.wait_for(
+            self._models().generate_content(model=model, contents=contents, config=config), self.timeout)
+
+    async def _call_hedged(self, model: str, contents, config):
+        """Одна попытка, при медленном ответе - с параллельным хеджирующим запросом."""
+        hedge_delay = self._hedge_delay()
+        primary = asyncio.create_task(self._call_once(model, contents, config))
+        if hedge_delay is None:
+            return await primary
+
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                self.outcomes["hedge_started"] += 1
+                tasks.add(asyncio.create_task(self._call_once(model, contents, config)))
+            last_error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.outcomes["hedge_won"] += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def generate_content(self, model: str, contents, config=None):
+        """generate_content с таймаутами, повторами, хеджированием и автоматом."""
+        self._check_breaker()
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                response = await self._call_hedged(model, contents, config)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.outcomes["timeout"] += 1
+                if not is_retryable(e):
+                    self.outcomes["error_fatal"] += 1
+                    self.breaker.release_probe()
+                    raise
+                if attempt >= self.max_retries:
+                    self.outcomes["error_retries_exhausted"] += 1
+                    self.breaker.record_failure()
+                    raise
+                delay = self._backoff(attempt)
+                self.outcomes["retry"] += 1
+                logger.warning(f"GenAI call failed ({type(e).__name__}: {e}), retry {attempt + 1}/{self.max_retries} "
+                               f"in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            self.latency.add(time.monotonic() - started)
+            self.breaker.record_success()
+            self.outcomes["success" if attempt == 0 else "success_after_retry"] += 1
+            return response
+
+    async def generate_content_stream(self, model: str, contents, config=None) -> AsyncIterator:
+        """
+        Потоковая генерация. Повторяется только открытие потока и ожидание первого фрагмента:
+        после того как текст пошел клиенту, повтор дал бы дубли. Хеджирование для потока не применяется.
+        """
+        self._check_breaker()
+        for attempt in range(self.max_retries + 1):
+            try:
+                stream = await asyncio.wait_for(
+                    self._models().generate_content_stream(model=model, contents=contents, config=config),
+                    self.timeout)
+                iterator = stream.__aiter__()
+                first_chunk = await asyncio.wait_for(iterator.__anext__(), self.timeout)
+                break
+            except StopAsyncIteration:
+                self.breaker.record_success()
+                return self._relay_stream(None, None)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.outcomes["timeout"] += 1
+                if not is_retryable(e):
+                    self.outcomes["error_fatal"] += 1
+                    self.breaker.release_probe()
+                    raise
+                if attempt >= self.max_retries:
+                    self.outcomes["error_retries_exhausted"] += 1
+                    self.breaker.record_failure()
+                    raise
+                delay = self._backoff(attempt)
+                self.outcomes["retry"] += 1
+                logger.warning(f"GenAI stream failed to start ({type(e).__name__}: {e}), "
+                               f"retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+        return self._relay_stream(first_chunk, iterator)
+
+    async def _relay_stream(self, first_chunk, iterator) -> AsyncIterator:
+        if iterator is None:
+            return
+        try:
+            yield first_chunk
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), self.timeout)
+                except StopAsyncIteration:
+                    break
+                yield chunk
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.outcomes["timeout"] += 1
+            self.outcomes["stream_broken"] += 1
+            self.breaker.record_failure()
+            raise
+        self.outcomes["stream_success"] += 1
+        self.breaker.record_success()
+
+    def stats(self) -> dict:
+        p50 = self.latency.percentile(0.5)
+        p95 = self.latency.percentile(0.95)
+        return {
+            "outcomes": dict(self.outcomes),
+            "circuit": self.breaker.state,
+            "latency_p50": round(p50, 3) if p50 is not None else None,
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+            "hedge_after": round(self._hedge_delay(), 3) if self._hedge_delay() is not None else None,
+        }
@@ -0,0 +1,217 @@
+import bisect
+import json
+import logging
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional
+
+from app.core.atomic_file import atomic_open
+from app.core.record_format import read_record_file
+
+logger = logging.getLogger(__name__)
+
+TEXT_PREFIX_CHARS = 500  # Сколько символов explanation_text участвует в поиске (как и раньше)
+INDEX_FORMAT_VERSION = 1
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+@dataclass
+class IndexedDocument:
+    slug: str
+    topic: str
+    text: str  # Первые TEXT_PREFIX_CHARS символов explanation_text
+    level: str
+    created_at: str  # ISO-строка, как в JSON файле
+    mtime: float  # mtime файла на момент индексации
+    topic_lower: str = field(init=False, repr=False)
+    text_lower: str = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self.text = self.text[:TEXT_PREFIX_CHARS]
+        self.topic_lower = self.topic.lower()
+        self.text_lower = self.text.lower()
+
+    def trigrams(self) -> set[str]:
+        return _trigrams(self.topic_lower) | _trigrams(self.text_lower)
+
+    def to_row(self) -> list:
+        return [self.slug, self.topic, self.text, self.level, self.created_at, self.mtime]
+
+    @classmethod
+    def from_row(cls, row: list) -> "IndexedDocument":
+        slug, topic, text, level, created_at, mtime = row
+        return cls(slug=slug, topic=topic, text=text, level=level, created_at=created_at, mtime=mtime)
+
+    @classmethod
+    def from_file(cls, filepath: Path, mtime: Optional[float] = None) -> Optional["IndexedDocument"]:
+        """Читает файл объяснения любого формата (синхронно - вызывать из потока)."""
+        try:
+            if mtime is None:
+                mtime = filepath.stat().st_mtime
+            data = read_record_file(filepath)
+            return cls(slug=data['slug'], topic=data['topic_raw'], text=data['explanation_text'],
+                       level=data['level'], created_at=data['created_at'], mtime=mtime)
+        except Exception as e:
+            logger.error(f"Error indexing explanation file {filepath}: {e}")
+            return None
+
+
+def rank_documents(docs: Iterable[IndexedDocument], query_lower: str, limit: int) -> list[IndexedDocument]:
+    """
+    Оставляет документы, содержащие query_lower в теме или начале текста, и сортирует их:
+    сначала совпадения в теме (чем раньше в теме, тем выше), затем совпадения в тексте.
+    """
+    ranked = []
+    for doc in docs:
+        topic_pos = doc.topic_lower.find(query_lower)
+        if topic_pos >= 0:
+            ranked.append(((0, topic_pos, doc.slug), doc))  # Приоритет совпадению в теме
+        elif query_lower in doc.text_lower:
+            ranked.append(((1, 0, doc.slug), doc))
+    ranked.sort(key=lambda item: item[0])
+    return [doc for _, doc in ranked[:limit]]
+
+
+class SearchIndex:
+    """
+    Триграммный инвертированный индекс по topic_raw и началу explanation_text.
+
+    Кандидаты отбираются пересечением списков триграмм запроса, затем проверяется
+    точное вхождение подстроки - результат совпадает с прежним полным перебором файлов.
+    Документы сохраняются на диск (index_path), списки триграмм пересобираются в памяти при загрузке.
+    """
+
+    def __init__(self, index_path: Path):
+        self.index_path = index_path
+        self._ids: dict[str, int] = {}
+        self._docs: dict[int, IndexedDocument] = {}
+        self._postings: defaultdict[str, set[int]] = defaultdict(set)
+        self._next_id = 0
+        self._sorted_slugs: Optional[list[str]] = None  # Для sitemap; строится при первом запросе
+        self.dirty = False
+        self.change_stamp: Optional[tuple] = None  # Отметка изменений папки на момент последней синхронизации
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, doc: IndexedDocument):
+        is_new = not self._discard(doc.slug)
+        doc_id = self._next_id
+        self._next_id += 1
+        self._ids[doc.slug] = doc_id
+        self._docs[doc_id] = doc
+        for gram in doc.trigrams():
+            self._postings[gram].add(doc_id)
+        if is_new and self._sorted_slugs is not None:
+            bisect.insort(self._sorted_slugs, doc.slug)
+        self.dirty = True
+
+    def remove(self, slug: str):
+        if self._discard(slug) and self._sorted_slugs is not None:
+            del self._sorted_slugs[bisect.bisect_left(self._sorted_slugs, slug)]
+
+    def _discard(self, slug: str) -> bool:
+        """Убирает документ из словарей и триграмм (но не из списка slug'ов); False, если его не было."""
+        doc_id = self._ids.pop(slug, None)
+        if doc_id is None:
+            return False
+        doc = self._docs.pop(doc_id)
+        for gram in doc.trigrams():
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self._postings[gram]
+        self.dirty = True
+        return True
+
+    def get(self, slug: str) -> Optional[IndexedDocument]:
+        doc_id = self._ids.get(slug)
+        return self._docs.get(doc_id) if doc_id is not None else None
+
+    def documents(self) -> Iterable[IndexedDocument]:
+        return self._docs.values()
+
+    def documents_after(self, after_slug: str, limit: int) -> list[IndexedDocument]:
+        """До limit документов по возрастанию slug, начиная со следующего за after_slug (как WHERE slug > ?)."""
+        if self._sorted_slugs is None:
+            self._sorted_slugs = sorted(self._ids)
+        start = bisect.bisect_right(self._sorted_slugs, after_slug)
+        return [self.get(slug) for slug in self._sorted_slugs[start:start + limit]]
+
+    def search(self, query: str, limit: int = 10) -> list[IndexedDocument]:
+        """Ищет подстроку query (без учета регистра). Совпадения в теме - первыми."""
+        query_lower = query.lower().strip()
+        grams = _trigrams(query_lower)
+        if not grams:
+            return []
+
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+
+        return rank_documents((self._docs[doc_id] for doc_id in candidates), query_lower, limit)
+
+    # --- Синхронизация с папкой объяснений ---
+
+    def known_mtimes(self) -> dict[str, float]:
+        return {doc.slug: doc.mtime for doc in self._docs.values()}
+
+    @staticmethod
+    def scan_files(files: dict[str, tuple[Path, float]],
+                   known: dict[str, float]) -> tuple[list[IndexedDocument], list[str]]:
+        """
+        Сравнивает снимок индекса (known_mtimes) с файлами {slug: (путь, mtime)} (синхронно - вызывать из потока).
+        Возвращает (новые/измененные документы, slug'и удаленных файлов); сам индекс не меняет.
+        """
+        changed = []
+        for slug, (path, mtime) in files.items():
+            if known.get(slug) == mtime:
+                continue
+            doc = IndexedDocument.from_file(path, mtime)
+            if doc is not None:
+                changed.append(doc)
+        removed = [slug for slug in known if slug not in files]
+        return changed, removed
+
+    def apply_changes(self, changed: list[IndexedDocument], removed: list[str]):
+        for slug in removed:
+            self.remove(slug)
+        for doc in changed:
+            self.add(doc)
+
+    # --- Сохранение на диск ---
+
+    def load(self) -> bool:
+        if not self.index_path.is_file():
+            return False
+        try:
+            with open(self.index_path, mode='r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != INDEX_FORMAT_VERSION:
+                logger.info("Search index format changed, rebuilding from files")
+                return False
+            for row in data["documents"]:
+                self.add(IndexedDocument.from_row(row))
+            self.dirty = False
+            return True
+        except Exception as e:
+            logger.error(f"Error loading search index {self.index_path}: {e}")
+            return False
+
+    def save(self):
+        """Атомарно записывает документы индекса (через временный файл и rename)."""
+        data = {
+            "version": INDEX_FORMAT_VERSION,
+            "documents": [doc.to_row() for doc in self._docs.values()],
+        }
+        with atomic_open(self.index_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        self.dirty = False
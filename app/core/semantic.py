@@ -0,0 +1,228 @@
+import logging
+import re
+import zlib
+from pathlib import Path
+from typing import Iterable, Optional
+
+from app.core.atomic_file import atomic_open
+from app.core.normalization import normalize_topic
+
+logger = logging.getLogger(__name__)
+
+# Необязательная зависимость: без нее семантический поиск выключен.
+# Импортируется только при создании индекса (load_numpy), чтобы не замедлять старт без семантического поиска
+np = None
+
+
+def load_numpy() -> bool:
+    """Импортирует numpy при первом обращении; False, если пакет не установлен."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return False
+        np = numpy
+    return True
+
+
+SEMANTIC_FORMAT_VERSION = 2  # Меняется при изменении векторизатора или формата: старый индекс перестраивается
+
+NUMBER_RE = re.compile(r"\d+")
+
+
+def number_tokens(topic: str) -> frozenset[str]:
+    """
+    Числа в теме. Триграммы почти не различают "Python 2" и "Python 3", а это разные темы:
+    совпадение засчитывается, только если наборы чисел одинаковы.
+    """
+    return frozenset(NUMBER_RE.findall(normalize_topic(topic)))
+
+
+class HashedNgramVectorizer:
+    """
+    Векторизатор без модели: символьные триграммы и слова канонической темы
+    хешируются (crc32, стабилен между процессами) в dim корзин со знаком, вектор нормируется по L2.
+    Косинусная близость таких векторов хорошо ловит перефразировки с общими словами и корнями.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def _features(self, topic: str) -> list[str]:
+        text = normalize_topic(topic)
+        padded = f" {text} "
+        features = [padded[i:i + 3] for i in range(len(padded) - 2)]
+        features.extend("w:" + word for word in text.split())
+        return features
+
+    def vectorize(self, topic: str):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature in self._features(topic):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class _LevelVectors:
+    """Векторы тем одного уровня: матрица с запасом по строкам, как у list; topics - темы тех же строк."""
+
+    def __init__(self, dim: int):
+        self.vectors = np.zeros((16, dim), dtype=np.float32)
+        self.slugs: list[str] = []
+        self.topics: list[str] = []
+        self.rows: dict[str, int] = {}
+
+    def set(self, slug: str, topic: str, vector):
+        row = self.rows.get(slug)
+        if row is None:
+            row = len(self.slugs)
+            if row == len(self.vectors):
+                self.vectors = np.concatenate([self.vectors, np.zeros_like(self.vectors)])
+            self.slugs.append(slug)
+            self.topics.append(topic)
+            self.rows[slug] = row
+        self.vectors[row] = vector
+        self.topics[row] = topic
+
+    def remove(self, slug: str):
+        row = self.rows.pop(slug, None)
+        if row is None:
+            return
+        last = len(self.slugs) - 1
+        if row != last:  # Переносим последнюю строку на место удаленной
+            self.vectors[row] = self.vectors[last]
+            self.slugs[row] = self.slugs[last]
+            self.topics[row] = self.topics[last]
+            self.rows[self.slugs[row]] = row
+        self.slugs.pop()
+        self.topics.pop()
+
+    def matches(self, vector, threshold: float) -> list[tuple[str, str, float]]:
+        """(slug, тема, близость) с близостью не ниже threshold, от самой близкой."""
+        if not self.slugs:
+            return []
+        scores = self.vectors[:len(self.slugs)] @ vector
+        rows = np.flatnonzero(scores >= threshold)
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return [(self.slugs[row], self.topics[row], float(scores[row])) for row in rows]
+
+
+class SemanticIndex:
+    """
+    Векторный индекс topic_raw сохраненных объяснений, отдельно по уровням.
+    Поиск - полный перебор (одно умножение матрицы на вектор), обновляется по одному документу
+    при сохранении и хранится на диске в .npz.
+    """
+
+    def __init__(self, index_path: Path, dim: int):
+        if not load_numpy():
+            raise RuntimeError("numpy is required for the semantic index")
+        self.index_path = index_path
+        self.vectorizer = HashedNgramVectorizer(dim)
+        self._levels: dict[str, _LevelVectors] = {}
+        self._levels_by_slug: dict[str, str] = {}
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self._levels_by_slug)
+
+    def __contains__(self, slug: str) -> bool:
+        return slug in self._levels_by_slug
+
+    def add(self, slug: str, topic: str, level: str):
+        previous_level = self._levels_by_slug.get(slug)
+        if previous_level is not None and previous_level != level:
+            self._levels[previous_level].remove(slug)
+        self._levels.setdefault(level, _LevelVectors(self.vectorizer.dim)).set(
+            slug, topic, self.vectorizer.vectorize(topic))
+        self._levels_by_slug[slug] = level
+        self.dirty = True
+
+    def remove(self, slug: str):
+        level = self._levels_by_slug.pop(slug, None)
+        if level is not None:
+            self._levels[level].remove(slug)
+            self.dirty = True
+
+    def rebuild(self, items: Iterable[tuple[str, str, str]]):
+        """Досинхронизирует индекс с хранилищем: items - (slug, topic, level) всех объяснений."""
+        seen = set()
+        for slug, topic, level in items:
+            seen.add(slug)
+            if self._levels_by_slug.get(slug) != level:
+                self.add(slug, topic, level)
+        for slug in [slug for slug in self._levels_by_slug if slug not in seen]:
+            self.remove(slug)
+
+    def lookup(self, topic: str, level: str, threshold: float) -> Optional[tuple[str, float]]:
+        """
+        Самое близкое объяснение того же уровня с косинусной близостью не ниже threshold.
+        Темы с другими числами (версии, годы, номера) пропускаются, даже если они ближе всего.
+        """
+        level_vectors = self._levels.get(level)
+        if level_vectors is None:
+            return None
+        numbers = number_tokens(topic)
+        for slug, stored_topic, score in level_vectors.matches(self.vectorizer.vectorize(topic), threshold):
+            if number_tokens(stored_topic) == numbers:
+                return slug, score
+        return None
+
+    def load(self) -> bool:
+        if not self.index_path.is_file():
+            return False
+        try:
+            with np.load(self.index_path, allow_pickle=False) as data:
+                if int(data["version"]) != SEMANTIC_FORMAT_VERSION or int(data["dim"]) != self.vectorizer.dim:
+                    logger.info("Semantic index format changed, rebuilding from storage")
+                    return False
+                for level in data["levels"].tolist():
+                    level_vectors = _LevelVectors(self.vectorizer.dim)
+                    slugs = data[f"slugs:{level}"].tolist()
+                    vectors = data[f"vectors:{level}"]
+                    # Запас строк под новые темы, как при росте в set()
+                    level_vectors.vectors = np.empty((max(16, 2 * len(slugs)), self.vectorizer.dim), dtype=np.float32)
+                    level_vectors.vectors[:len(slugs)] = vectors
+                    level_vectors.slugs = slugs
+                    level_vectors.topics = data[f"topics:{level}"].tolist()
+                    level_vectors.rows = {slug: row for row, slug in enumerate(slugs)}
+                    self._levels[level] = level_vectors
+                    self._levels_by_slug.update((slug, level) for slug in slugs)
+            self.dirty = False
+            return True
+        except Exception as e:
+            logger.error(f"Error loading semantic index {self.index_path}: {e}")
+            self._levels.clear()
+            self._levels_by_slug.clear()
+            return False
+
+    def save(self):
+        """Атомарно записывает индекс (через временный файл и rename)."""
+        arrays = {
+            "version": np.array(SEMANTIC_FORMAT_VERSION),
+            "dim": np.array(self.vectorizer.dim),
+            "levels": np.array(list(self._levels), dtype=str),
+        }
+        for level, level_vectors in self._levels.items():
+            arrays[f"slugs:{level}"] = np.array(level_vectors.slugs, dtype=str)
+            arrays[f"topics:{level}"] = np.array(level_vectors.topics, dtype=str)
+            arrays[f"vectors:{level}"] = level_vectors.vectors[:len(level_vectors.slugs)]
+        with atomic_open(self.index_path, 'wb') as f:
+            np.savez(f, **arrays)
+        self.dirty = False
+
+    def stats(self) -> dict:
+        return {"documents": len(self), "dim": self.vectorizer.dim,
+                "levels": {level: len(vectors.slugs) for level, vectors in self._levels.items()}}
+
+
+def create_semantic_index(enabled: bool, index_path: Path, dim: int) -> Optional[SemanticIndex]:
+    """Семантический индекс из настроек (SEMANTIC_LOOKUP_ENABLED) или None, если он выключен или нет numpy."""
+    if not enabled:
+        return None
+    if not load_numpy():
+        logger.warning("SEMANTIC_LOOKUP_ENABLED is set but numpy is not installed, semantic lookup disabled")
+        return None
+    return SemanticIndex(index_path, dim)
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import time
+import zlib
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+
+try:
+    import fcntl  # Доступен только на POSIX-системах
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Число lock-файлов: ключи раскладываются по ним хешем, поэтому файлов не больше LOCK_BUCKETS,
+# сколько бы slug ни было сгенерировано. Совпадение корзины у двух ключей лишь ставит их генерации в очередь
+LOCK_BUCKETS = 1024
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом в один.
+    Первый вызов запускает работу в отдельной задаче, остальные ждут ее результат.
+    Отмена одного ожидающего (например, клиент закрыл соединение) не отменяет
+    саму работу для остальных.
+    """
+
+    def __init__(self):
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._coalesced = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        return await asyncio.shield(self.start(key, func))
+
+    def start(self, key: str, func: Callable[[], Awaitable[T]]) -> "asyncio.Future[T]":
+        """
+        Запускает func для key (или присоединяется к идущему вызову) и сразу возвращает его задачу.
+        Задача регистрируется синхронно, поэтому вызов, пришедший следом, уже видит ее в is_running.
+        Ждать задачу нужно через asyncio.shield, чтобы отмена ожидающего не отменила работу.
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run(key, func))
+            # Забираем исключение, даже если все ожидающие уже ушли
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._tasks[key] = task
+        else:
+            self._coalesced += 1
+            logger.info(f"Single-flight: joining in-flight call for key '{key}'")
+        return task
+
+    def is_running(self, key: str) -> bool:
+        return key in self._tasks
+
+    async def _run(self, key: str, func: Callable[[], Awaitable[T]]) -> T:
+        try:
+            return await func()
+        finally:
+            self._tasks.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._tasks), "coalesced": self._coalesced}
+
+
+class StreamRelay:
+    """
+    Раздает события одной потоковой генерации всем, кто ее ждет.
+    Подписчик, пришедший позже, сначала получает уже опубликованные события, затем новые.
+    """
+
+    def __init__(self):
+        self._events: list[tuple[str, dict]] = []
+        self._closed = False
+        self._changed = asyncio.Event()
+
+    def publish(self, event: str, data: dict):
+        self._events.append((event, data))
+        self._notify()
+
+    def close(self):
+        """Больше событий не будет; подписчики завершают перебор."""
+        self._closed = True
+        self._notify()
+
+    def _notify(self):
+        # Будим всех, кто ждет текущее событие, и заводим новое для следующего ожидания
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[tuple[str, dict]]:
+        position = 0
+        while True:
+            while position < len(self._events):
+                yield self._events[position]
+                position += 1
+            if self._closed:
+                return
+            await self._changed.wait()
+
+
+@asynccontextmanager
+async def cross_worker_lock(lock_dir: Path, key: str, timeout: float, poll_interval: float = 0.1):
+    """
+    Межпроцессная блокировка на lock-файле (fcntl.flock) для нескольких воркеров uvicorn.
+    Файл выбирается по хешу ключа из LOCK_BUCKETS штук и не удаляется: удаление файла, который
+    в этот момент открыт другим воркером, дало бы двум процессам "разные" блокировки одного ключа.
+    Если блокировку не удалось получить за timeout секунд, блок выполняется без нее:
+    в худшем случае будет лишняя генерация, но запрос не зависнет.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    bucket = zlib.crc32(key.encode("utf-8")) % LOCK_BUCKETS
+    lock_file = open(lock_dir / f"bucket-{bucket:04d}.lock", "a+")
+    acquired = False
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                acquired = True
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    logger.warning(f"Could not acquire cross-worker lock for '{key}' in {timeout}s, proceeding without it")
+                    break
+                await asyncio.sleep(poll_interval)
+        yield
+    finally:
+        if acquired:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        lock_file.close()
+
+
+@asynccontextmanager
+async def optional_lock(lock_dir: Optional[Path], key: str, timeout: float):
+    """Берет cross_worker_lock, только если задан lock_dir."""
+    if lock_dir is None:
+        yield
+        return
+    async with cross_worker_lock(lock_dir, key, timeout):
+        yield
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from xml.sax.saxutils import escape
+
+import aiofiles
+
+from app.core.atomic_file import unique_temp_path
+
+logger = logging.getLogger(__name__)
+
+MAX_URLS_PER_SITEMAP = 50000  # Ограничение протокола sitemaps.org на один файл
+
+# (after_slug, limit) -> [(slug, created_at в ISO)] по возрастанию slug, начиная со следующего за after_slug
+EntryFetcher = Callable[[str, int], Awaitable[list[tuple[str, str]]]]
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_XMLNS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+
+def w3c_datetime(value: str) -> str:
+    """created_at в формате ISO -> значение для <lastmod> (без часового пояса оставляем только дату)."""
+    if "+" in value[10:] or value.endswith("Z"):
+        return value
+    return value[:10]
+
+
+@dataclass
+class SitemapPage:
+    after_slug: str  # Страница начинается со slug, следующего за этим ("" - с самого начала)
+    count: int  # Сколько объяснений на странице
+    lastmod: str  # Самая поздняя дата создания среди них
+
+
+class SitemapCache:
+    """
+    Sitemap index и дочерние sitemap не больше чем по page_size URL.
+
+    - Разметка страниц (с какого slug начинается каждая и ее lastmod) строится одним проходом
+      по хранилищу пачками по batch_size и хранится до следующего сохранения объяснения (invalidate()).
+    - Дочерний sitemap генерируется потоково и одновременно пишется в файл в cache_dir;
+      следующие запросы получают готовый файл.
+    - В памяти держится только разметка: одна запись на page_size URL.
+    """
+
+    def __init__(self, cache_dir: Path, page_size: int, batch_size: int = 1000):
+        self.cache_dir = cache_dir
+        self.page_size = max(2, min(page_size, MAX_URLS_PER_SITEMAP))
+        self.batch_size = batch_size
+        self._pages: Optional[list[SitemapPage]] = None
+        self._layout_lock = asyncio.Lock()
+        self._generation = 0  # Увеличивается при каждом сбросе: результаты старых проходов не кешируются
+        self._fresh_files: set[Path] = set()
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        self._pages = None
+        self._generation += 1
+        self._fresh_files.clear()
+
+    async def get_pages(self, fetch: EntryFetcher) -> list[SitemapPage]:
+        """Разметка дочерних sitemap (всегда хотя бы одна страница - на первой еще и главная)."""
+        if self._pages is not None:
+            return self._pages
+        async with self._layout_lock:
+            if self._pages is not None:
+                return self._pages
+            generation = self._generation
+            pages = []
+            current = SitemapPage(after_slug="", count=0, lastmod="")
+            capacity = self.page_size - 1  # Первая страница содержит еще и URL главной
+            last_slug = ""
+            while True:
+                batch = await fetch(last_slug, self.batch_size)
+                for slug, created_at in batch:
+                    if current.count >= capacity:
+                        pages.append(current)
+                        current = SitemapPage(after_slug=last_slug, count=0, lastmod="")
+                        capacity = self.page_size
+                    current.count += 1
+                    current.lastmod = max(current.lastmod, created_at)
+                    last_slug = slug
+                if len(batch) < self.batch_size:
+                    break
+            pages.append(current)
+            if generation == self._generation:
+                self._pages = pages
+            logger.info(f"Sitemap layout built: {sum(page.count for page in pages)} URLs in {len(pages)} sitemap(s)")
+            return pages
+
+    def render_index(self, base_url: str, pages: list[SitemapPage]) -> str:
+        parts = [XML_HEADER, f'<sitemapindex {SITEMAP_XMLNS}>\n']
+        for number, page in enumerate(pages, start=1):
+            lastmod = f'<lastmod>{w3c_datetime(page.lastmod)}</lastmod>' if page.lastmod else ''
+            parts.append(f'  <sitemap><loc>{escape(base_url)}/sitemap-{number}.xml</loc>{lastmod}</sitemap>\n')
+        parts.append('</sitemapindex>\n')
+        return "".join(parts)
+
+    def _file_path(self, base_url: str, number: int) -> Path:
+        host_key = hashlib.sha1(base_url.encode("utf-8")).hexdigest()[:12]
+        return self.cache_dir / f"sitemap-{host_key}-{number}.xml"
+
+    def cached_file(self, base_url: str, number: int) -> Optional[Path]:
+        """Готовый файл дочернего sitemap, если он сгенерирован после последнего сброса."""
+        path = self._file_path(base_url, number)
+        if path in self._fresh_files and path.exists():
+            self.hits += 1
+            return path
+        self.misses += 1
+        return None
+
+    async def _page_chunks(self, base_url: str, number: int, page: SitemapPage,
+                           fetch: EntryFetcher) -> AsyncIterator[str]:
+        base = escape(base_url)
+        yield XML_HEADER + f'<urlset {SITEMAP_XMLNS}>\n'
+        if number == 1:
+            yield f'  <url><loc>{base}/</loc><changefreq>daily</changefreq><priority>1.0</priority></url>\n'
+        remaining = page.count
+        after_slug = page.after_slug
+        while remaining > 0:
+            batch = await fetch(after_slug, min(self.batch_size, remaining))
+            if not batch:
+                break
+            yield "".join(
+                f'  <url><loc>{base}/explanation/{escape(slug)}</loc><lastmod>{w3c_datetime(created_at)}</lastmod>'
+                f'<changefreq>monthly</changefreq><priority>0.8</priority></url>\n'
+                for slug, created_at in batch
+            )
+            remaining -= len(batch)
+            after_slug = batch[-1][0]
+        yield '</urlset>\n'
+
+    async def stream_page(self, base_url: str, number: int, page: SitemapPage,
+                          fetch: EntryFetcher) -> AsyncIterator[bytes]:
+        """Отдает дочерний sitemap по частям и параллельно сохраняет его в файл для следующих запросов."""
+        path = self._file_path(base_url, number)
+        tmp_path = unique_temp_path(path)  # Свой файл у каждой выдачи: одновременные запросы не мешают друг другу
+        generation = self._generation
+        completed = False
+        f = None
+        try:
+            f = await aiofiles.open(tmp_path, mode='wb')
+            async for chunk in self._page_chunks(base_url, number, page, fetch):
+                data = chunk.encode("utf-8")
+                await f.write(data)
+                yield data
+            completed = True
+        finally:
+            if f is not None:
+                await f.close()
+            if completed and generation == self._generation:
+                os.replace(tmp_path, path)
+                self._fresh_files.add(path)
+            else:
+                tmp_path.unlink(missing_ok=True)  # Клиент отключился или данные успели устареть
+
+    def stats(self) -> dict:
+        return {
+            "pages": len(self._pages) if self._pages is not None else None,
+            "page_size": self.page_size,
+            "cached_files": len(self._fresh_files),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,48 @@
+import logging
+import sys
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Пакеты, импорт которых заметно удлиняет старт; в отчете видно, успели ли они загрузиться
+HEAVY_MODULES = ("google.genai", "httpx", "numpy", "brotli", "zstandard")
+
+
+class StartupReport:
+    """
+    Длительность этапов старта воркера: импорты, подготовка хранилища, прогрев.
+    Отсчет идет от первого импорта этого модуля (в main.py он импортируется первым).
+    Подробная разбивка импортов по модулям: python -X importtime -c "import main".
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+
+    def mark_ready(self):
+        self.ready_after = time.perf_counter() - self.started
+        phases = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases.items())
+        loaded = [name for name in HEAVY_MODULES if name in sys.modules]
+        logger.info(f"Startup finished in {self.ready_after * 1000:.0f} ms ({phases}); "
+                    f"heavy modules loaded: {', '.join(loaded) or 'none'}")
+
+    def stats(self) -> dict:
+        return {
+            "ready_after_seconds": round(self.ready_after, 3) if self.ready_after is not None else None,
+            "phases_seconds": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in sys.modules],
+        }
+
+
+startup_report = StartupReport()
@@ -0,0 +1,586 @@
+import asyncio
+import datetime
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, NamedTuple, Optional
+
+import aiofiles
+
+from app.core.aliases import AliasTable
+from app.core.atomic_file import unique_temp_path
+from app.core.record_format import COMPRESSION_SUFFIXES, RECORD_SUFFIXES, decode_bytes, effective_compression, \
+    encode_record, is_shard_name, shard_name, split_record_name
+from app.core.search_index import SearchIndex, IndexedDocument, rank_documents, TEXT_PREFIX_CHARS
+from models import StoredExplanation
+
+logger = logging.getLogger(__name__)
+
+# Слушатель изменений хранилища: (новые/измененные документы, slug'и удаленных)
+ChangeListener = Callable[[list[IndexedDocument], list[str]], None]
+
+
+class StoredRecord(NamedTuple):
+    explanation: StoredExplanation
+    mtime: float  # Время последнего изменения записи (для сверки кеша)
+    size: int  # Размер сериализованной записи в байтах
+
+
+def explanation_to_dict(data: StoredExplanation) -> dict:
+    """StoredExplanation -> dict для JSON (datetime в ISO строку)."""
+    data_dict = data.model_dump()
+    data_dict['created_at'] = data.created_at.isoformat()
+    if data.updated_at is not None:
+        data_dict['updated_at'] = data.updated_at.isoformat()
+    return data_dict
+
+
+def explanation_from_dict(data: dict) -> StoredExplanation:
+    """dict из JSON -> StoredExplanation (ISO строку обратно в datetime)."""
+    for field in ('created_at', 'updated_at'):
+        if isinstance(data.get(field), str):
+            data[field] = datetime.datetime.fromisoformat(data[field])
+    return StoredExplanation(**data)
+
+
+def document_for(data: StoredExplanation, mtime: float) -> IndexedDocument:
+    return IndexedDocument(slug=data.slug, topic=data.topic_raw, text=data.explanation_text,
+                           level=data.level, created_at=data.created_at.isoformat(), mtime=mtime)
+
+
+class ExplanationStorage(ABC):
+    """
+    Хранилище объяснений. Все операции асинхронные; блокирующий ввод-вывод
+    выполняется в отдельных потоках. Изменения (свои и, после sync(), чужие - других воркеров)
+    сообщаются подписчикам через subscribe().
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self._listeners: list[ChangeListener] = []
+
+    def subscribe(self, listener: ChangeListener):
+        self._listeners.append(listener)
+
+    def _notify(self, changed: list[IndexedDocument], removed: list[str]):
+        if not changed and not removed:
+            return
+        for listener in self._listeners:
+            try:
+                listener(changed, removed)
+            except Exception as e:
+                logger.error(f"Error in storage change listener {listener}: {e}", exc_info=True)
+
+    async def init(self):
+        """Подготовка при старте приложения."""
+
+    async def close(self):
+        """Освобождение ресурсов при остановке приложения."""
+
+    async def sync(self):
+        """Подхватывает изменения, сделанные другими процессами (если хранилище это поддерживает)."""
+
+    @abstractmethod
+    async def read(self, slug: str) -> Optional[StoredRecord]:
+        ...
+
+    @abstractmethod
+    async def get_mtime(self, slug: str) -> Optional[float]:
+        """Время изменения записи или None, если записи нет. Должно быть дешевле read()."""
+
+    @abstractmethod
+    async def write(self, data: StoredExplanation) -> StoredRecord:
+        ...
+
+    @abstractmethod
+    async def list_slugs(self) -> list[str]:
+        ...
+
+    @abstractmethod
+    async def list_documents(self) -> list[IndexedDocument]:
+        """Краткие сведения обо всех записях (для построения индексов в памяти)."""
+
+    @abstractmethod
+    async def get_alias(self, alias: str) -> Optional[str]:
+        """slug объяснения, на которое указывает псевдоним (ключ запроса), или None."""
+
+    @abstractmethod
+    async def add_alias(self, alias: str, slug: str):
+        ...
+
+    @abstractmethod
+    async def list_aliases(self) -> list[tuple[str, str]]:
+        ...
+
+    @abstractmethod
+    async def list_sitemap_entries(self, after_slug: str, limit: int) -> list[tuple[str, str]]:
+        """Пачка (slug, created_at в ISO) по возрастанию slug, начиная со следующего за after_slug."""
+
+    @abstractmethod
+    async def search(self, query_lower: str, limit: int) -> list[IndexedDocument]:
+        """Подстрока query_lower в теме или начале текста; совпадения в теме - первыми."""
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+def scan_record_files(directory: Path) -> dict[str, tuple[Path, float]]:
+    """
+    Все файлы объяснений в папке: {slug: (путь, mtime)} (синхронно - вызывать из потока).
+    Смотрит и шардированные подпапки, и старые файлы в корне; если у slug есть оба варианта,
+    берется файл из подпапки (он записан позже).
+    """
+    files: dict[str, tuple[Path, float]] = {}
+    sharded: set[str] = set()
+    if not directory.is_dir():
+        return files
+    for entry in os.scandir(directory):
+        if entry.is_dir() and is_shard_name(entry.name):
+            for sub_entry in os.scandir(entry.path):
+                parsed = split_record_name(sub_entry.name)
+                if parsed is not None and sub_entry.is_file():
+                    files[parsed[0]] = (Path(sub_entry.path), sub_entry.stat().st_mtime)
+                    sharded.add(parsed[0])
+        elif entry.is_file():
+            parsed = split_record_name(entry.name)
+            if parsed is not None and parsed[0] not in sharded:
+                files.setdefault(parsed[0], (Path(entry.path), entry.stat().st_mtime))
+    return files
+
+
+class JsonFileStorage(ExplanationStorage):
+    """
+    Один файл на slug: компактный JSON (при JSON_STORAGE_COMPRESSION - сжатый gzip/zstd)
+    в подпапке по первым символам sha1(slug), чтобы ни в одной папке не было миллионов файлов.
+    Старые файлы с отступами в корне папки читаются как есть (compact-storage переводит их в новый формат).
+    Поиск - через триграммный SearchIndex, который хранится рядом и досинхронизируется с папкой,
+    когда меняется ее mtime или отметка изменений .changes (ее обновляет каждая запись).
+    Подходит для небольших установок.
+    """
+
+    name = "json"
+
+    def __init__(self, directory: Path, index_path: Path, alias_path: Path, compression: str = "none"):
+        super().__init__()
+        self.directory = directory
+        self.compression = effective_compression(compression)
+        self.search_index = SearchIndex(index_path)
+        self.aliases = AliasTable(alias_path)
+        self.change_marker = directory / ".changes"
+        self._paths: dict[str, Path] = {}  # slug -> известный путь файла (формат и расположение бывают разными)
+        self._sync_lock = asyncio.Lock()
+
+    def get_filepath(self, slug: str) -> Path:
+        """Путь, по которому записывается объяснение (подпапка шарда и расширение текущего формата)."""
+        return self.directory / shard_name(slug) / f"{slug}{COMPRESSION_SUFFIXES[self.compression]}"
+
+    def _candidate_paths(self, slug: str) -> list[Path]:
+        """Где может лежать файл slug: текущий формат, другие форматы в шарде, старые файлы в корне."""
+        suffixes = [COMPRESSION_SUFFIXES[self.compression]] + [
+            suffix for suffix in RECORD_SUFFIXES if suffix != COMPRESSION_SUFFIXES[self.compression]]
+        shard_dir = self.directory / shard_name(slug)
+        return [shard_dir / f"{slug}{suffix}" for suffix in suffixes] + \
+               [self.directory / f"{slug}{suffix}" for suffix in suffixes]
+
+    def _locate(self, slug: str) -> Optional[tuple[Path, float]]:
+        """(путь, mtime) файла slug или None, если его нет."""
+        known = self._paths.get(slug)
+        if known is not None:
+            try:
+                return known, known.stat().st_mtime
+            except (FileNotFoundError, NotADirectoryError):
+                self._paths.pop(slug, None)  # Файл перенесли (compact-storage) или удалили
+        for path in self._candidate_paths(slug):
+            try:
+                mtime = path.stat().st_mtime
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            self._paths[slug] = path
+            return path, mtime
+        return None
+
+    def _change_stamp(self) -> tuple[float, float]:
+        """mtime корня папки (старые файлы) и отметки .changes (записи в подпапки шардов)."""
+        try:
+            marker_mtime = self.change_marker.stat().st_mtime
+        except FileNotFoundError:
+            marker_mtime = 0.0
+        return self.directory.stat().st_mtime, marker_mtime
+
+    async def init(self):
+        """Загружает сохраненный индекс и дочитывает файлы, изменившиеся с момента его записи."""
+        await asyncio.to_thread(self.directory.mkdir, parents=True, exist_ok=True)
+        loaded = await asyncio.to_thread(self.search_index.load)
+        logger.info(f"Search index {'loaded' if loaded else 'not found'}: {len(self.search_index)} documents")
+        await self._sync(force=True)
+        if self.search_index.dirty:
+            await asyncio.to_thread(self.search_index.save)
+
+    async def close(self):
+        """Сохраняет индекс на диск, если он менялся."""
+        if self.search_index.dirty:
+            try:
+                self.search_index.save()
+                logger.info(f"Search index saved: {len(self.search_index)} documents")
+            except Exception as e:
+                logger.error(f"Error saving search index: {e}")
+
+    async def sync(self):
+        await self._sync(force=False)
+
+    async def _sync(self, force: bool):
+        """
+        Досинхронизирует search_index с папкой объяснений, если она изменилась
+        (например, файлы записал другой воркер). Файлы читаются в отдельном потоке.
+        """
+        try:
+            stamp = self._change_stamp()
+        except Exception as e:
+            logger.error(f"Error reading explanations directory: {e}")
+            return
+        if not force and stamp == self.search_index.change_stamp:
+            return
+
+        async with self._sync_lock:
+            if not force and stamp == self.search_index.change_stamp:
+                return  # Пока ждали блокировку, индекс уже обновили
+            files = await asyncio.to_thread(scan_record_files, self.directory)
+            self._paths = {slug: path for slug, (path, _) in files.items()}
+            changed, removed = await asyncio.to_thread(
+                SearchIndex.scan_files, files, self.search_index.known_mtimes()
+            )
+            self.search_index.apply_changes(changed, removed)
+            self.search_index.change_stamp = stamp
+            if changed or removed:
+                logger.info(f"Search index synced: {len(changed)} updated, {len(removed)} removed, "
+                            f"{len(self.search_index)} total")
+                if not force:
+                    self._notify(changed, removed)
+
+    async def read(self, slug: str) -> Optional[StoredRecord]:
+        located = self._locate(slug)
+        if located is None:
+            return None
+        filepath, mtime = located
+        try:
+            async with aiofiles.open(filepath, mode='rb') as f:
+                content = decode_bytes(await f.read(), split_record_name(filepath.name)[1])
+            explanation = explanation_from_dict(json.loads(content))
+            return StoredRecord(explanation, mtime, len(content))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        except Exception as e:
+            logger.error(f"Error loading explanation file {filepath}: {e}")
+            return None
+
+    async def get_mtime(self, slug: str) -> Optional[float]:
+        located = self._locate(slug)
+        return located[1] if located else None
+
+    async def write(self, data: StoredExplanation) -> StoredRecord:
+        filepath = self.get_filepath(data.slug)
+        data_dict = explanation_to_dict(data)
+        content = encode_record(data_dict, self.compression)
+        previous = self._locate(data.slug)
+
+        stamp_before = self._change_stamp()
+        # Пишем во временный файл и подменяем через rename: читатели видят либо старую, либо новую запись целиком.
+        # Имя временного файла уникально - одновременные сохранения одного slug не мешают друг другу
+        tmp_path = unique_temp_path(filepath)
+        try:
+            async with aiofiles.open(tmp_path, mode='wb') as f:
+                await f.write(content)
+            os.replace(tmp_path, filepath)
+        finally:
+            tmp_path.unlink(missing_ok=True)  # После успешного rename файла уже нет
+        self._paths[data.slug] = filepath
+        if previous is not None and previous[0] != filepath:
+            previous[0].unlink(missing_ok=True)  # Старый файл в корне или в другом формате больше не нужен
+        self.change_marker.touch()
+        mtime = filepath.stat().st_mtime
+
+        doc = document_for(data, mtime)
+        self.search_index.add(doc)
+        # Если до записи индекс был синхронизирован с папкой, то после нашей записи он тоже актуален
+        if self.search_index.change_stamp == stamp_before:
+            self.search_index.change_stamp = self._change_stamp()
+        self._notify([doc], [])
+        return StoredRecord(data, mtime, len(json.dumps(data_dict, ensure_ascii=False).encode('utf-8')))
+
+    async def list_slugs(self) -> list[str]:
+        await self.sync()
+        return sorted(doc.slug for doc in self.search_index.documents())
+
+    async def list_documents(self) -> list[IndexedDocument]:
+        await self.sync()
+        return list(self.search_index.documents())
+
+    async def get_alias(self, alias: str) -> Optional[str]:
+        return self.aliases.get(alias)
+
+    async def add_alias(self, alias: str, slug: str):
+        await asyncio.to_thread(self.aliases.add, alias, slug)
+
+    async def list_aliases(self) -> list[tuple[str, str]]:
+        return self.aliases.items()
+
+    async def list_sitemap_entries(self, after_slug: str, limit: int) -> list[tuple[str, str]]:
+        await self.sync()
+        docs = self.search_index.documents_after(after_slug, limit)
+        return [(doc.slug, doc.created_at) for doc in docs]
+
+    async def search(self, query_lower: str, limit: int) -> list[IndexedDocument]:
+        await self.sync()
+        return self.search_index.search(query_lower, limit=limit)
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "documents": len(self.search_index)}
+
+
+class SQLiteStorage(ExplanationStorage):
+    """
+    SQLite в режиме WAL: атомарные записи, индексы по slug/level/created_at
+    и полнотекстовый поиск FTS5 (токенизатор trigram - поиск подстроки, как в JSON варианте).
+    Полная запись хранится как JSON в колонке data, поэтому новые поля модели не требуют миграций схемы.
+    """
+
+    name = "sqlite"
+    SEARCH_CANDIDATES = 200  # Сколько кандидатов FTS ранжировать в Python
+
+    def __init__(self, db_path: Path):
+        super().__init__()
+        self.db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()  # Одно соединение на процесс, доступ из потоков по очереди
+        self._has_fts = False
+        self._data_version: Optional[int] = None
+        self._last_seen_seq = 0  # Наибольший change_seq, о котором уже знают подписчики
+
+    # --- Низкоуровневые операции (выполняются в потоке) ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._create_schema(conn)
+            self._conn = conn
+        return self._conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS explanations (
+                id INTEGER PRIMARY KEY,
+                slug TEXT NOT NULL UNIQUE,
+                topic_raw TEXT NOT NULL,
+                level TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL,
+                change_seq INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_explanations_level ON explanations(level);
+            CREATE INDEX IF NOT EXISTS idx_explanations_created_at ON explanations(created_at);
+            CREATE INDEX IF NOT EXISTS idx_explanations_updated_at ON explanations(updated_at);
+            CREATE TABLE IF NOT EXISTS aliases (
+                alias TEXT PRIMARY KEY,
+                slug TEXT NOT NULL
+            );
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(explanations)")}
+        if "change_seq" not in columns:  # Базы, созданные до счетчика изменений
+            conn.execute("ALTER TABLE explanations ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_explanations_change_seq ON explanations(change_seq)")
+        try:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS explanations_fts "
+                         "USING fts5(topic_raw, text_prefix, tokenize='trigram')")
+            self._has_fts = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite FTS5 trigram tokenizer unavailable ({e}), search will scan the table")
+            self._has_fts = False
+        conn.commit()
+
+    def _execute(self, func):
+        with self._lock:
+            return func(self._connect())
+
+    @staticmethod
+    def _row_to_document(row) -> IndexedDocument:
+        slug, topic, text, level, created_at, updated_at = row
+        return IndexedDocument(slug=slug, topic=topic, text=text or "", level=level,
+                               created_at=created_at, mtime=updated_at)
+
+    # --- Интерфейс ExplanationStorage ---
+
+    async def init(self):
+        await asyncio.to_thread(self._execute, lambda conn: None)
+        self._data_version = await asyncio.to_thread(self._execute, self._read_data_version)
+        self._last_seen_seq = await asyncio.to_thread(
+            self._execute, lambda conn: conn.execute("SELECT COALESCE(MAX(change_seq), 0) FROM explanations").fetchone()[0]
+        )
+
+    async def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @staticmethod
+    def _read_data_version(conn: sqlite3.Connection) -> int:
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    async def sync(self):
+        """
+        PRAGMA data_version меняется, когда коммитит другое соединение (другой воркер).
+        Новые записи ищутся по change_seq: номер выдается под блокировкой записи, поэтому коммиты идут
+        строго по возрастанию номера, и запись с меньшим номером не может появиться после уже увиденной
+        (в отличие от updated_at - часы воркеров могут расходиться).
+        """
+        def _changes(conn):
+            version = self._read_data_version(conn)
+            if version == self._data_version:
+                return version, []
+            rows = conn.execute(
+                "SELECT slug, topic_raw, substr(json_extract(data, '$.explanation_text'), 1, ?), level, created_at, "
+                "updated_at, change_seq FROM explanations WHERE change_seq > ? ORDER BY change_seq",
+                (TEXT_PREFIX_CHARS, self._last_seen_seq)).fetchall()
+            return version, rows
+
+        version, rows = await asyncio.to_thread(self._execute, _changes)
+        self._data_version = version
+        if rows:
+            self._last_seen_seq = max(self._last_seen_seq, rows[-1][-1])
+            self._notify([self._row_to_document(row[:-1]) for row in rows], [])
+
+    async def read(self, slug: str) -> Optional[StoredRecord]:
+        row = await asyncio.to_thread(self._execute, lambda conn: conn.execute(
+            "SELECT data, updated_at FROM explanations WHERE slug = ?", (slug,)).fetchone())
+        if row is None:
+            return None
+        try:
+            return StoredRecord(explanation_from_dict(json.loads(row[0])), row[1], len(row[0].encode('utf-8')))
+        except Exception as e:
+            logger.error(f"Error loading explanation '{slug}' from SQLite: {e}")
+            return None
+
+    async def get_mtime(self, slug: str) -> Optional[float]:
+        row = await asyncio.to_thread(self._execute, lambda conn: conn.execute(
+            "SELECT updated_at FROM explanations WHERE slug = ?", (slug,)).fetchone())
+        return row[0] if row else None
+
+    def _write_rows(self, conn: sqlite3.Connection, records: list[tuple[StoredExplanation, float]]) -> int:
+        """Вставляет/обновляет записи одной транзакцией; возвращает change_seq последней записи."""
+        with conn:
+            # Блокировка записи берется сразу: change_seq читается и увеличивается без гонки с другими воркерами
+            conn.execute("BEGIN IMMEDIATE")
+            change_seq = conn.execute("SELECT COALESCE(MAX(change_seq), 0) FROM explanations").fetchone()[0]
+            for data, mtime in records:
+                change_seq += 1
+                content = json.dumps(explanation_to_dict(data), ensure_ascii=False)
+                conn.execute(
+                    "INSERT INTO explanations (slug, topic_raw, level, created_at, updated_at, data, change_seq) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(slug) DO UPDATE SET topic_raw=excluded.topic_raw, level=excluded.level, "
+                    "created_at=excluded.created_at, updated_at=excluded.updated_at, data=excluded.data, "
+                    "change_seq=excluded.change_seq",
+                    (data.slug, data.topic_raw, data.level, data.created_at.isoformat(), mtime, content, change_seq),
+                )
+                row_id = conn.execute("SELECT id FROM explanations WHERE slug = ?", (data.slug,)).fetchone()[0]
+                if self._has_fts:
+                    conn.execute("DELETE FROM explanations_fts WHERE rowid = ?", (row_id,))
+                    conn.execute("INSERT INTO explanations_fts (rowid, topic_raw, text_prefix) VALUES (?, ?, ?)",
+                                 (row_id, data.topic_raw, data.explanation_text[:TEXT_PREFIX_CHARS]))
+        return change_seq
+
+    async def write(self, data: StoredExplanation) -> StoredRecord:
+        mtime = time.time()
+        change_seq = await asyncio.to_thread(self._execute, lambda conn: self._write_rows(conn, [(data, mtime)]))
+        if change_seq == self._last_seen_seq + 1:
+            # Свои записи data_version не меняют. Сдвигаем отметку, только если перед нашей записью
+            # не было чужих, еще не прочитанных sync, - иначе они были бы пропущены
+            self._last_seen_seq = change_seq
+        self._notify([document_for(data, mtime)], [])
+        size = len(json.dumps(explanation_to_dict(data), ensure_ascii=False).encode('utf-8'))
+        return StoredRecord(data, mtime, size)
+
+    async def write_many(self, records: list[StoredExplanation]):
+        """Пакетная запись (для миграции) - без уведомления подписчиков."""
+        mtime = time.time()
+        await asyncio.to_thread(self._execute, lambda conn: self._write_rows(conn, [(r, mtime) for r in records]))
+
+    async def list_slugs(self) -> list[str]:
+        rows = await asyncio.to_thread(self._execute, lambda conn: conn.execute(
+            "SELECT slug FROM explanations ORDER BY slug").fetchall())
+        return [row[0] for row in rows]
+
+    async def list_documents(self) -> list[IndexedDocument]:
+        rows = await asyncio.to_thread(self._execute, lambda conn: conn.execute(
+            "SELECT slug, topic_raw, substr(json_extract(data, '$.explanation_text'), 1, ?), level, created_at, "
+            "updated_at FROM explanations", (TEXT_PREFIX_CHARS,)).fetchall())
+        return [self._row_to_document(row) for row in rows]
+
+    async def get_alias(self, alias: str) -> Optional[str]:
+        row = await asyncio.to_thread(self._execute, lambda conn: conn.execute(
+            "SELECT slug FROM aliases WHERE alias = ?", (alias,)).fetchone())
+        return row[0] if row else None
+
+    async def add_alias(self, alias: str, slug: str):
+        def _add(conn):
+            with conn:
+                conn.execute("INSERT INTO aliases (alias, slug) VALUES (?, ?) "
+                             "ON CONFLICT(alias) DO UPDATE SET slug=excluded.slug", (alias, slug))
+        await asyncio.to_thread(self._execute, _add)
+
+    async def list_aliases(self) -> list[tuple[str, str]]:
+        rows = await asyncio.to_thread(self._execute, lambda conn: conn.execute(
+            "SELECT alias, slug FROM aliases").fetchall())
+        return [(row[0], row[1]) for row in rows]
+
+    async def list_sitemap_entries(self, after_slug: str, limit: int) -> list[tuple[str, str]]:
+        rows = await asyncio.to_thread(self._execute, lambda conn: conn.execute(
+            "SELECT slug, created_at FROM explanations WHERE slug > ? ORDER BY slug LIMIT ?",
+            (after_slug, limit)).fetchall())
+        return [(row[0], row[1]) for row in rows]
+
+    async def search(self, query_lower: str, limit: int) -> list[IndexedDocument]:
+        def _search(conn):
+            if self._has_fts:
+                fts_query = '"' + query_lower.replace('"', '""') + '"'
+                return conn.execute(
+                    "SELECT e.slug, e.topic_raw, f.text_prefix, e.level, e.created_at, e.updated_at "
+                    "FROM explanations_fts f JOIN explanations e ON e.id = f.rowid "
+                    "WHERE explanations_fts MATCH ? LIMIT ?", (fts_query, self.SEARCH_CANDIDATES)).fetchall()
+            return conn.execute(
+                "SELECT slug, topic_raw, substr(json_extract(data, '$.explanation_text'), 1, ?), level, created_at, "
+                "updated_at FROM explanations", (TEXT_PREFIX_CHARS,)).fetchall()
+
+        rows = await asyncio.to_thread(self._execute, _search)
+        return rank_documents((self._row_to_document(row) for row in rows), query_lower, limit)
+
+    async def vacuum(self):
+        """Перестраивает файл базы, освобождая место после удалений и перезаписей."""
+        await asyncio.to_thread(self._execute, lambda conn: conn.execute("VACUUM"))
+
+    async def count(self) -> int:
+        return await asyncio.to_thread(self._execute, lambda conn: conn.execute(
+            "SELECT COUNT(*) FROM explanations").fetchone()[0])
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "path": str(self.db_path), "fts": self._has_fts}
+
+
+def create_storage(backend: str, explanations_dir: Path, index_path: Path, alias_path: Path,
+                   sqlite_path: Path, json_compression: str = "none") -> ExplanationStorage:
+    """Создает хранилище по имени из настроек (STORAGE_BACKEND)."""
+    if backend == "sqlite":
+        return SQLiteStorage(sqlite_path)
+    if backend != "json":
+        logger.warning(f"Unknown STORAGE_BACKEND '{backend}', falling back to 'json'")
+    return JsonFileStorage(explanations_dir, index_path, alias_path, compression=json_compression)
@@ -0,0 +1,94 @@
+import bisect
+import re
+from collections import Counter
+
+_NON_WORD_RE = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_for_suggest(text: str) -> str:
+    """Нижний регистр, ё -> е, пунктуация и повторные пробелы -> один пробел."""
+    return _NON_WORD_RE.sub(" ", text.lower().replace("ё", "е")).strip()
+
+
+class SuggestIndex:
+    """
+    Префиксный индекс для подсказок поиска: отсортированный массив (ключ, slug) + bisect.
+
+    Для каждой темы индексируется нормализованный текст, начиная с каждого слова,
+    поэтому запрос "днк" находит и "днк", и "что такое днк".
+    Подходящие темы ранжируются по популярности (просмотрам), затем по дате создания.
+    """
+
+    MAX_SCAN = 500  # Сколько совпадений по префиксу рассматривать максимум (ограничивает время ответа)
+
+    def __init__(self):
+        self._entries: list[tuple[str, str]] = []  # (ключ, slug), отсортировано
+        self._topics: dict[str, str] = {}  # slug -> исходная тема
+        self._keys: dict[str, list[str]] = {}  # slug -> его ключи (для удаления)
+        self._created_at: dict[str, str] = {}
+        self._popularity: Counter = Counter()
+
+    def __len__(self) -> int:
+        return len(self._topics)
+
+    @staticmethod
+    def _keys_for(topic: str) -> list[str]:
+        normalized = normalize_for_suggest(topic)
+        if not normalized:
+            return []
+        keys = [normalized]
+        for match in re.finditer(r" ", normalized):
+            keys.append(normalized[match.end():])
+        return keys
+
+    def add(self, slug: str, topic: str, created_at: str = ""):
+        self.remove(slug)
+        keys = self._keys_for(topic)
+        for key in keys:
+            bisect.insort(self._entries, (key, slug))
+        self._topics[slug] = topic
+        self._keys[slug] = keys
+        self._created_at[slug] = created_at
+
+    def remove(self, slug: str):
+        for key in self._keys.pop(slug, []):
+            i = bisect.bisect_left(self._entries, (key, slug))
+            if i < len(self._entries) and self._entries[i] == (key, slug):
+                del self._entries[i]
+        self._topics.pop(slug, None)
+        self._created_at.pop(slug, None)
+
+    def rebuild(self, items: list[tuple[str, str, str]]):
+        """Полная перестройка из (slug, topic, created_at) - быстрее, чем add по одному."""
+        self._entries, self._topics, self._keys, self._created_at = [], {}, {}, {}
+        for slug, topic, created_at in items:
+            keys = self._keys_for(topic)
+            self._entries.extend((key, slug) for key in keys)
+            self._topics[slug] = topic
+            self._keys[slug] = keys
+            self._created_at[slug] = created_at
+        self._entries.sort()
+
+    def record_hit(self, slug: str):
+        if slug in self._topics:
+            self._popularity[slug] += 1
+
+    def suggest(self, prefix: str, limit: int = 8) -> list[tuple[str, str]]:
+        """Возвращает до limit пар (slug, topic) для темы, начинающейся (по словам) с prefix."""
+        prefix = normalize_for_suggest(prefix)
+        if not prefix:
+            return []
+
+        found: set[str] = set()
+        i = bisect.bisect_left(self._entries, (prefix, ""))
+        scanned = 0
+        while i < len(self._entries) and scanned < self.MAX_SCAN:
+            key, slug = self._entries[i]
+            if not key.startswith(prefix):
+                break
+            found.add(slug)
+            i += 1
+            scanned += 1
+
+        ranked = sorted(found, key=lambda s: (self._popularity[s], self._created_at.get(s, "")), reverse=True)
+        return [(slug, self._topics[slug]) for slug in ranked[:limit]]
@@ -1,29 +1,67 @@
+from app.core.startup import startup_report  # Первым импортом: от него отсчитывается время старта воркера
+
 import jinja2
 import markupsafe
-from fastapi import FastAPI, Request, HTTPException, Form, BackgroundTasks, Query
-from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse, Response, JSONResponse
+from fastapi import FastAPI, Request, HTTPException, Form, BackgroundTasks, Query, Header, Depends
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse, Response, JSONResponse, \
+    StreamingResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import AsyncIterator, Optional
+import asyncio
+import ipaddress
+import json
 import logging
-
-from models import ExplainRequest, ExplainResponse, SearchResponse
-from services import get_or_create_explanation, load_explanation_from_file, get_all_explanation_slugs, \
-    search_explanations
+import secrets
+import time
+
+from app.core.config import PAGE_CACHE_MAX_ENTRIES, SITEMAP_PAGE_SIZE, SITEMAP_CACHE_DIR, ADMIN_TOKEN, METRICS_ENABLED, \
+    RATE_LIMIT_ENABLED, RATE_LIMIT_TRUST_PROXY, RATE_LIMIT_API_KEYS, API_MAX_IN_FLIGHT, GENERATION_RETRY_AFTER
+from app.core.generation_pool import GenerationOverloadedError
+from app.core.rate_limit import AdmissionGate, RateLimitedError
+from app.core.page_cache import PageCache, RenderedPage
+from app.core.sitemap import SitemapCache
+from models import ExplainRequest, ExplainResponse, ExplainBatchRequest, ExplainBatchItem, ExplainBatchResponse, \
+    SearchResponse
+
+# Настройка логирования приложения (до импорта services, чтобы его сообщения шли в общий формат)
+logging.basicConfig(level=logging.INFO)
+
+with startup_report.phase("import_services"):
+    from services import get_or_create_explanation, load_explanation_from_file, list_sitemap_entries, \
+        search_explanations, get_runtime_stats, startup, shutdown, suggest_topics, \
+        record_explanation_view, stream_explanation, subscribe_to_changes, sync_storage, \
+        resolve_alias, negative_cache, schedule_refresh_if_stale, metrics, rate_limiter
 
 logger = logging.getLogger(__name__)
 
 # Определяем базовую директорию приложения
 APP_DIR = Path(__file__).resolve().parent
 
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """
+    Старт: готовим хранилище и индексы, при PREWARM_* прогреваем кеши - uvicorn начинает принимать
+    запросы только после этого. Остановка: сохраняем индексы и закрываем хранилище.
+    """
+    await startup()
+    startup_report.mark_ready()
+    yield
+    await shutdown()
+
+
 app = FastAPI(
     title="ПростоПонятно.ai",
     description="Объяснение сложных тем простыми словами с помощью AI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Монтируем статические файлы (CSS, JS)
-app.mount("static", StaticFiles(directory=APP_DIR / "static"), name="static")
+app.mount("/static", StaticFiles(directory=APP_DIR / "static"), name="static")
 
 # Настраиваем шаблонизатор Jinja2
 templates = Jinja2Templates(directory=APP_DIR / "templates")
@@ -38,6 +76,113 @@ def nl2br(_, value):
 
 templates.env.filters['nl2br'] = nl2br
 
+# Отрендеренные и сжатые страницы объяснений; сбрасываются при сохранении объяснения
+page_cache = PageCache(max_entries=PAGE_CACHE_MAX_ENTRIES)
+
+
+def invalidate_cached_pages(changed, removed):
+    for slug in [doc.slug for doc in changed] + removed:
+        page_cache.invalidate(slug)
+
+
+subscribe_to_changes(invalidate_cached_pages)
+
+# Sitemap index и дочерние sitemap; сбрасываются при любом сохранении объяснения
+sitemap_cache = SitemapCache(cache_dir=SITEMAP_CACHE_DIR, page_size=SITEMAP_PAGE_SIZE)
+subscribe_to_changes(lambda changed, removed: sitemap_cache.invalidate())
+
+# Метрики уровня HTTP и страниц (остальные регистрируются в services)
+http_request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+page_render_seconds = metrics.histogram(
+    "page_render_seconds", "Explanation page Jinja render and compression time")
+metrics.counter_callback("page_cache_lookups_total", "Rendered page cache lookups by result",
+                         lambda: [({"result": "hit"}, page_cache.hits), ({"result": "miss"}, page_cache.misses)],
+                         ("result",))
+
+
+@app.middleware("http")
+async def observe_request_latency(request: Request, call_next):
+    """Длительность запроса до начала ответа; маршрут берется шаблоном (/explanation/{slug}), а не URL."""
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    http_request_seconds.observe(time.perf_counter() - started, method=request.method,
+                                 route=getattr(route, "path", "unmatched"), status=response.status_code)
+    return response
+
+
+# Приоритет страниц: запросов к API генерации одновременно не больше API_MAX_IN_FLIGHT, страницы не ограничиваются
+api_admission = AdmissionGate(max_in_flight=API_MAX_IN_FLIGHT, retry_after=GENERATION_RETRY_AFTER)
+metrics.gauge_callback("api_requests_in_flight", "Explain API requests currently being processed",
+                       lambda: api_admission.in_flight)
+metrics.counter_callback("api_admission_rejected_total", "Explain API requests rejected because too many were in flight",
+                         lambda: api_admission.rejected)
+
+
+def client_identity(request: Request) -> str:
+    """
+    Ключ клиента для лимитов: известный API-ключ из X-API-Key, иначе IP.
+    За доверенным прокси IP берется из последнего адреса X-Forwarded-For (его дописал наш прокси).
+    """
+    api_key = request.headers.get("x-api-key")
+    if api_key and api_key in RATE_LIMIT_API_KEYS:
+        return f"key:{api_key}"
+    forwarded_for = request.headers.get("x-forwarded-for") if RATE_LIMIT_TRUST_PROXY else None
+    if forwarded_for:
+        return f"ip:{forwarded_for.split(',')[-1].strip()}"
+    host = request.client.host if request.client else "unknown"
+    warn_if_proxied_without_trust(host)
+    return f"ip:{host}"
+
+
+_proxy_warning_logged = False
+
+
+def warn_if_proxied_without_trust(host: str):
+    """
+    Один раз предупреждает, если лимиты включены, а запросы приходят с частного или loopback адреса
+    без RATE_LIMIT_TRUST_PROXY: скорее всего, это прокси, и все посетители делят одну корзину.
+    """
+    global _proxy_warning_logged
+    if _proxy_warning_logged or not RATE_LIMIT_ENABLED or RATE_LIMIT_TRUST_PROXY:
+        return
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return
+    if address.is_private or address.is_loopback:
+        _proxy_warning_logged = True
+        logger.warning(f"Rate limiting is enabled but requests come from {host} and RATE_LIMIT_TRUST_PROXY is off: "
+                       f"behind a reverse proxy all visitors share one limit. Set RATE_LIMIT_TRUST_PROXY=true "
+                       f"if the app runs behind your own proxy")
+
+
+async def admit_explain_request(request: Request) -> AsyncIterator[str]:
+    """
+    Зависимость эндпоинтов генерации: лимит запросов клиента (429) и место среди обрабатываемых запросов (503).
+    Отдает ключ клиента, по которому services списывает лимит генераций.
+    """
+    client_id = client_identity(request)
+    try:
+        await rate_limiter.check(client_id, "explain")
+        api_admission.enter()
+    except RateLimitedError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except GenerationOverloadedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    try:
+        yield client_id
+    finally:
+        api_admission.leave()
+
+
+# Карта для user-friendly названий уровней
+LEVEL_DISPLAY_NAMES = {
+    "simple": "Простое", "teenager": "Для подростка", "5-year-old": "Для 5-летнего",
+    "tldr": "Кратко (TL;DR)", "pros_cons": "Плюсы и минусы", "metaphor": "Метафора",
+}
+
 
 # --- Эндпоинты для HTML страниц ---
 
@@ -61,56 +206,179 @@ async def read_root(request: Request):
 
 @app.get("/explanation/{slug}", response_class=HTMLResponse)
 async def read_explanation(request: Request, slug: str):
-    """Отображает страницу с сохраненным объяснением по его slug."""
+    """
+    Отображает страницу с сохраненным объяснением по его slug.
+    Страница рендерится один раз на версию объяснения и хранится в page_cache вместе со сжатыми вариантами;
+    повторные запросы с If-None-Match/If-Modified-Since получают 304.
+    """
     logger.info(f"Request for explanation page with slug: {slug}")
     explanation_data = await load_explanation_from_file(slug)
 
     if not explanation_data:
+        alias_target = await resolve_alias(slug)
+        if alias_target:
+            # Канонический ключ, указывающий на объяснение, сохраненное под другим slug
+            return RedirectResponse(url=f"/explanation/{alias_target}", status_code=301)
         logger.warning(f"Explanation with slug '{slug}' not found.")
         # Можно редиректить на главную или показывать 404
         # return RedirectResponse(url="/", status_code=302)
         raise HTTPException(status_code=404, detail="Explanation not found")
 
-    # Получаем название уровня для отображения
-    level_map = {  # Карта для user-friendly названий уровней
-        "simple": "Простое", "teenager": "Для подростка", "5-year-old": "Для 5-летнего",
-        "tldr": "Кратко (TL;DR)", "pros_cons": "Плюсы и минусы", "metaphor": "Метафора",
-        "custom_analogy": f"Аналогия: {explanation_data.analogy}" if explanation_data.analogy else "Аналогия"
+    record_explanation_view(slug)
+    schedule_refresh_if_stale(explanation_data)  # Устаревшая копия отдается сразу, новая генерируется в фоне
+    base_url = str(request.base_url)
+    # hash() строки кешируется в самом объекте, а объект живет в explanation_cache - это почти бесплатно
+    version = f"{explanation_data.created_at.isoformat()}-{hash(explanation_data.explanation_text)}"
+    page = page_cache.get(slug, base_url, version)
+    if page is None:
+        logger.info(f"Rendering explanation page for slug: {slug}")
+        with page_render_seconds.time():
+            page = RenderedPage.build(render_explanation_page(request, explanation_data), version,
+                                      last_modified=explanation_data.updated_at or explanation_data.created_at)
+        page_cache.put(slug, base_url, page)
+
+    headers = {
+        "ETag": page.etag,
+        "Last-Modified": page.last_modified_header,
+        "Cache-Control": "public, max-age=300",
+        "Vary": "Accept-Encoding",
     }
-    display_level = level_map.get(explanation_data.level, explanation_data.level)
+    if page.is_not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since")):
+        return Response(status_code=304, headers=headers)
+
+    body, content_encoding = page.select_body(request.headers.get("accept-encoding", ""))
+    if content_encoding:
+        headers["Content-Encoding"] = content_encoding
+    return Response(content=body, media_type="text/html; charset=utf-8", headers=headers)
+
+
+def render_explanation_page(request: Request, explanation_data) -> str:
+    """Рендерит explanation_page.html в строку."""
+    if explanation_data.level == "custom_analogy":
+        display_level = f"Аналогия: {explanation_data.analogy}" if explanation_data.analogy else "Аналогия"
+    else:
+        display_level = LEVEL_DISPLAY_NAMES.get(explanation_data.level, explanation_data.level)
 
     context = {
         "request": request,
         "explanation": explanation_data,
-        "display_level": display_level  # Передаем user-friendly название уровня
+        "display_level": display_level,  # Передаем user-friendly название уровня
+        # canonical-ссылка без query-параметров: одна и та же страница для всех вариантов URL
+        "canonical_url": f"{str(request.base_url).rstrip('/')}/explanation/{explanation_data.slug}",
     }
-    return templates.TemplateResponse("explanation_page.html", context)
+    return templates.get_template("explanation_page.html").render(context)
 
 
 # --- Эндпоинт API для генерации объяснений (используется JS с главной страницы) ---
 
+def explain_error_response(e: Exception, endpoint: str) -> HTTPException:
+    """Ошибка генерации -> HTTP ответ: 429/503 с Retry-After при лимите и перегрузке, 503 без AI, иначе 500."""
+    if isinstance(e, RateLimitedError):
+        # Клиент исчерпал лимит генераций - сохраненные объяснения ему по-прежнему отдаются
+        return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    if isinstance(e, GenerationOverloadedError):
+        # Быстро отказываем вместо накопления очереди: клиент повторит запрос позже
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    if isinstance(e, ConnectionError):
+        logger.error(f"ConnectionError in {endpoint}: {e}")
+        return HTTPException(status_code=503, detail=str(e))  # Возвращаем текст ошибки
+    logger.error(f"Unexpected error in {endpoint}: {e}", exc_info=e)
+    return HTTPException(status_code=500, detail="Внутренняя ошибка сервера при обработке запроса.")
+
+
+async def build_explain_response(explain_request: ExplainRequest, client_id: str) -> ExplainResponse:
+    """Получает или генерирует объяснение и собирает ответ API (с готовым HTML для сохраненных)."""
+    explanation_text, slug = await get_or_create_explanation(explain_request, client_id)
+    if slug:
+        logger.info(f"Returning explanation for slug: {slug}")
+        stored_data = await load_explanation_from_file(slug)  # Только что сохранено - берется из кеша
+        return ExplainResponse(explanation=explanation_text, slug=slug,
+                               explanation_html=stored_data.explanation_html if stored_data else None)
+    logger.warning(f"Failed to get or create valid explanation for topic: {explain_request.topic}")
+    # Если slug=None, значит это текст ошибки или невалидный ответ
+    # Возвращаем его, но клиент должен понять, что это не успешное объяснение
+    return ExplainResponse(explanation=explanation_text, slug=None)
+
+
 @app.post("/api/explain", response_model=ExplainResponse)
-async def api_explain_topic(explain_request: ExplainRequest):
+async def api_explain_topic(explain_request: ExplainRequest, client_id: str = Depends(admit_explain_request)):
     """
     Принимает запрос на объяснение, генерирует/получает его,
     возвращает текст и slug. Сохранение происходит в фоне.
     """
     try:
-        explanation_text, slug = await get_or_create_explanation(explain_request)
-        if slug:
-            logger.info(f"Returning explanation for slug: {slug}")
-            return ExplainResponse(explanation=explanation_text, slug=slug)
+        return await build_explain_response(explain_request, client_id)
+    except Exception as e:
+        raise explain_error_response(e, "/api/explain")
+
+
+@app.post("/api/explain/batch", response_model=ExplainBatchResponse)
+async def api_explain_batch(batch_request: ExplainBatchRequest, client_id: str = Depends(admit_explain_request)):
+    """
+    Одна тема сразу на нескольких уровнях. Уровни обрабатываются параллельно, как отдельные запросы
+    к /api/explain (кеш, пул генерации, single-flight и лимит генераций те же), поэтому ответ приходит
+    за время самой долгой генерации, а не их суммы. Каждый текст проверяется и сохраняется под своим slug;
+    ошибка одного уровня не мешает остальным - у него slug=null и текст ошибки.
+    Если не получился ни один уровень и причина - лимит или перегрузка, ответ 429/503, как у /api/explain.
+    Каждый уровень списывается с лимита запросов клиента как отдельный запрос к /api/explain.
+    """
+    levels = list(dict.fromkeys(batch_request.levels))
+    if len(levels) > 1:
+        try:
+            # Один запрос уже списан в admit_explain_request, доплачиваем за остальные уровни
+            await rate_limiter.check(client_id, "explain", cost=len(levels) - 1)
+        except RateLimitedError as e:
+            raise explain_error_response(e, "/api/explain/batch")
+    outcomes = await asyncio.gather(*(
+        build_explain_response(ExplainRequest(topic=batch_request.topic, level=level, analogy=batch_request.analogy),
+                               client_id)
+        for level in levels), return_exceptions=True)
+
+    errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+    if errors and len(errors) == len(outcomes):
+        raise explain_error_response(errors[0], "/api/explain/batch")
+
+    results = []
+    for level, outcome in zip(levels, outcomes):
+        if isinstance(outcome, Exception):
+            error = explain_error_response(outcome, "/api/explain/batch")
+            results.append(ExplainBatchItem(level=level, explanation=error.detail, slug=None))
         else:
-            logger.warning(f"Failed to get or create valid explanation for topic: {explain_request.topic}")
-            # Если slug=None, значит это текст ошибки или невалидный ответ
-            # Возвращаем его, но клиент должен понять, что это не успешное объяснение
-            return ExplainResponse(explanation=explanation_text, slug=None)
-    except ConnectionError as e:
-        logger.error(f"ConnectionError in /api/explain: {e}")
-        raise HTTPException(status_code=503, detail=str(e))  # Возвращаем текст ошибки
+            results.append(ExplainBatchItem(level=level, **outcome.model_dump()))
+    return ExplainBatchResponse(results=results)
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Форматирует одно событие Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/explain/stream")
+async def api_explain_topic_stream(explain_request: ExplainRequest, client_id: str = Depends(admit_explain_request)):
+    """
+    Потоковый вариант /api/explain: текст приходит фрагментами по мере генерации (SSE).
+    Последнее событие "done" содержит полный текст и slug (или slug=null, если текст не сохранен).
+    """
+    events = stream_explanation(explain_request, client_id)
+    try:
+        # Первое событие получаем до отправки заголовков, чтобы перегрузку вернуть обычным 503
+        first_event = await anext(events)
     except Exception as e:
-        logger.error(f"Unexpected error in /api/explain: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="Внутренняя ошибка сервера при обработке запроса.")
+        raise explain_error_response(e, "/api/explain/stream")
+
+    async def event_source():
+        yield format_sse(*first_event)
+        try:
+            async for event, data in events:
+                yield format_sse(event, data)
+        except Exception as e:
+            logger.error(f"Error while streaming explanation: {e}", exc_info=True)
+            yield format_sse("error", {"detail": "Внутренняя ошибка сервера при генерации объяснения."})
+
+    return StreamingResponse(event_source(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # Отключаем буферизацию в nginx, иначе фрагменты придут разом
+    })
 
 
 # --- НОВЫЙ Эндпоинт для поиска ---
@@ -127,6 +395,64 @@ async def api_search(q: str = Query(None, min_length=3, max_length=50)):
     return SearchResponse(results=search_results)
 
 
+@app.get("/api/suggest", response_model=SearchResponse)
+async def api_suggest(response: Response, q: str = Query(None, min_length=2, max_length=50),
+                      limit: int = Query(8, ge=1, le=20)):
+    """
+    Подсказки для поля поиска по началу слов темы.
+    Ответ строится из памяти и кешируется браузером/прокси.
+    """
+    response.headers["Cache-Control"] = "public, max-age=60, stale-while-revalidate=300"
+    if q is None:
+        return SearchResponse(results=[])
+    return SearchResponse(results=await suggest_topics(q, limit=limit))
+
+
+@app.get("/api/stats")
+async def api_stats():
+    """Счетчики попаданий/промахов кеша и состояние пула генерации."""
+    return JSONResponse({**get_runtime_stats(), "page_cache": page_cache.stats(), "sitemap": sitemap_cache.stats()})
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Метрики воркера в текстовом формате Prometheus (выключаются METRICS_ENABLED=false)."""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not found")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# --- Служебные эндпоинты (заголовок X-Admin-Token, включаются переменной ADMIN_TOKEN) ---
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@app.get("/api/admin/negative-cache", dependencies=[Depends(require_admin)])
+async def list_negative_cache():
+    """Записи негативного кеша этого воркера (ключ, класс отказа, ответ, сколько еще жить)."""
+    return JSONResponse({**negative_cache.stats(), "items": negative_cache.entries()})
+
+
+@app.delete("/api/admin/negative-cache", dependencies=[Depends(require_admin)])
+async def clear_negative_cache(failure_class: Optional[str] = Query(None)):
+    """Очищает негативный кеш целиком или только записи одного класса (?failure_class=too_short)."""
+    removed = negative_cache.clear(failure_class)
+    logger.info(f"Negative cache cleared: {removed} entries (class: {failure_class or 'all'})")
+    return JSONResponse({"removed": removed})
+
+
+@app.delete("/api/admin/negative-cache/{key}", dependencies=[Depends(require_admin)])
+async def delete_negative_cache_entry(key: str):
+    """Удаляет одну запись: следующий такой запрос снова пойдет в AI."""
+    if not negative_cache.invalidate(key):
+        raise HTTPException(status_code=404, detail="Entry not found")
+    return JSONResponse({"removed": 1})
+
+
 # ---------------------------------
 
 # --- Эндпоинты для SEO ---
@@ -146,22 +472,32 @@ Sitemap: {base_url}sitemap.xml
 
 @app.get("/sitemap.xml")
 async def get_sitemap(request: Request):
-    """Генерирует XML Sitemap со всеми сохраненными страницами объяснений."""
-    slugs = await get_all_explanation_slugs()
+    """
+    Sitemap index со ссылками на дочерние sitemap (/sitemap-N.xml, не больше 50 000 URL в каждом).
+    lastmod каждого дочернего sitemap - самая поздняя дата создания объяснений в нем.
+    """
+    await sync_storage()  # Объяснения других воркеров сбрасывают кеш через подписку
     base_url = str(request.base_url).rstrip('/')  # Убираем слэш в конце, если есть
-
-    xml_content = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    xml_content += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-
-    # Главная страница
-    xml_content += f'  <url><loc>{base_url}/</loc><changefreq>daily</changefreq><priority>1.0</priority></url>\n'
-
-    # Страницы объяснений
-    for slug in slugs:
-        xml_content += f'  <url><loc>{base_url}/explanation/{slug}</loc><changefreq>monthly</changefreq><priority>0.8</priority></url>\n'
-    xml_content += '</urlset>'
-
-    return Response(content=xml_content, media_type="application/xml")
+    pages = await sitemap_cache.get_pages(list_sitemap_entries)
+    return Response(content=sitemap_cache.render_index(base_url, pages), media_type="application/xml")
+
+
+@app.get("/sitemap-{number:int}.xml")
+async def get_sitemap_page(request: Request, number: int):
+    """Дочерний sitemap: генерируется потоково при первом запросе, дальше отдается готовым файлом."""
+    await sync_storage()
+    base_url = str(request.base_url).rstrip('/')
+    pages = await sitemap_cache.get_pages(list_sitemap_entries)
+    if not 1 <= number <= len(pages):
+        raise HTTPException(status_code=404, detail="Sitemap не найден")
+
+    cached_path = sitemap_cache.cached_file(base_url, number)
+    if cached_path is not None:
+        return FileResponse(cached_path, media_type="application/xml")
+    return StreamingResponse(
+        sitemap_cache.stream_page(base_url, number, pages[number - 1], list_sitemap_entries),
+        media_type="application/xml",
+    )
 
 
 # --- Запуск сервера для локальной разработки ---
@@ -0,0 +1,421 @@
+"""
+Служебные команды ПростоПонятно.ai.
+
+Запуск из папки app:
+    python manage.py migrate-storage            # перенести JSON файлы объяснений в SQLite
+    python manage.py build-aliases              # псевдонимы канонических ключей для старых объяснений
+    python manage.py normalization-report       # доля попаданий в кеш до и после канонизации тем
+    python manage.py warm --input topics.tsv    # заранее сгенерировать недостающие объяснения
+    python manage.py compact-storage            # перевести JSON файлы в компактный формат и подпапки
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Iterator, Optional
+
+# Импорты проекта имеют вид "app.core..." и "models": добавляем в sys.path и корень проекта, и папку app
+APP_DIR = Path(__file__).resolve().parent
+sys.path[:0] = [str(APP_DIR.parent), str(APP_DIR)]
+
+from app.core.aliases import AliasTable  # noqa: E402
+from app.core.config import EXPLANATIONS_DIR, SQLITE_DB_PATH, ALIASES_PATH, STORAGE_BACKEND, \
+    SEARCH_INDEX_PATH, JSON_STORAGE_COMPRESSION  # noqa: E402
+from app.core.normalization import canonical_key, legacy_topic_slug  # noqa: E402
+from app.core.record_format import decode_bytes, encode_record, read_record_file, split_record_name, \
+    write_record_file  # noqa: E402
+from app.core.storage import SQLiteStorage, JsonFileStorage, explanation_from_dict, explanation_to_dict, \
+    create_storage, scan_record_files  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+logger = logging.getLogger("manage")
+
+
+async def migrate_storage(args: argparse.Namespace):
+    """Импортирует все JSON файлы из папки объяснений в SQLite базу."""
+    source_dir = Path(args.source)
+    target = SQLiteStorage(Path(args.target))
+    await target.init()
+
+    started = time.monotonic()
+    imported, failed, batch = 0, 0, []
+    for _, (filepath, _) in sorted(scan_record_files(source_dir).items()):
+        try:
+            batch.append(explanation_from_dict(read_record_file(filepath)))
+        except Exception as e:
+            failed += 1
+            logger.error(f"Skipping {filepath.name}: {e}")
+            continue
+        if len(batch) >= args.batch_size:
+            await target.write_many(batch)
+            imported += len(batch)
+            batch = []
+            logger.info(f"Imported {imported} explanations...")
+    if batch:
+        await target.write_many(batch)
+        imported += len(batch)
+
+    aliases = AliasTable(Path(args.aliases)).items()
+    for alias, slug in aliases:
+        await target.add_alias(alias, slug)
+
+    total = await target.count()
+    await target.close()
+    logger.info(f"Done in {time.monotonic() - started:.1f}s: imported {imported}, failed {failed}, "
+                f"{total} explanations and {len(aliases)} aliases in {args.target}")
+    logger.info("Set STORAGE_BACKEND=sqlite to serve from the database.")
+
+
+async def build_aliases(args: argparse.Namespace):
+    """
+    Записывает псевдоним канонический ключ -> slug для объяснений, сохраненных по старой схеме slug,
+    чтобы любые варианты их темы сразу попадали в уже сгенерированный текст.
+    """
+    storage = create_storage(STORAGE_BACKEND, EXPLANATIONS_DIR, SEARCH_INDEX_PATH, ALIASES_PATH, SQLITE_DB_PATH,
+                             JSON_STORAGE_COMPRESSION)
+    await storage.init()
+    added, conflicts = 0, 0
+    for slug in await storage.list_slugs():
+        record = await storage.read(slug)
+        if record is None:
+            continue
+        data = record.explanation
+        key = canonical_key(data.topic_raw, data.level, data.analogy)
+        if key == slug:
+            continue
+        if await storage.get_mtime(key) is not None:
+            continue  # Под каноническим ключом уже есть свое объяснение
+        existing = await storage.get_alias(key)
+        if existing and existing != slug:
+            conflicts += 1  # Несколько старых вариантов одной темы: оставляем первый
+            continue
+        if existing is None:
+            await storage.add_alias(key, slug)
+            added += 1
+    await storage.close()
+    logger.info(f"Added {added} aliases, {conflicts} duplicate variants skipped")
+
+
+def _read_report_requests(args: argparse.Namespace) -> list[tuple[str, str, str | None]]:
+    """Запросы для отчета: строки файла (тема или JSON {"topic", "level", "analogy"})."""
+    requests = []
+    with open(args.input, mode='r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                requests.append((item["topic"], item.get("level", args.level), item.get("analogy")))
+            else:
+                requests.append((line, args.level, None))
+    return requests
+
+
+async def _stored_report_requests() -> list[tuple[str, str, str | None]]:
+    """Запросы для отчета из сохраненных объяснений (по одному на объяснение)."""
+    storage = create_storage(STORAGE_BACKEND, EXPLANATIONS_DIR, SEARCH_INDEX_PATH, ALIASES_PATH, SQLITE_DB_PATH,
+                             JSON_STORAGE_COMPRESSION)
+    await storage.init()
+    requests = []
+    for slug in await storage.list_slugs():
+        record = await storage.read(slug)
+        if record is not None:
+            data = record.explanation
+            requests.append((data.topic_raw, data.level, data.analogy))
+    await storage.close()
+    return requests
+
+
+async def normalization_report(args: argparse.Namespace):
+    """
+    Прогоняет поток запросов через старую и каноническую схему ключей и считает,
+    какая доля запросов попала бы в уже сгенерированное объяснение.
+    """
+    requests = _read_report_requests(args) if args.input else await _stored_report_requests()
+    if not requests:
+        print("No requests to analyse.")
+        return
+
+    old_seen, new_seen = set(), set()
+    old_hits = new_hits = 0
+    old_to_new = defaultdict(set)  # Старый slug -> канонические ключи (больше одного - коллизия)
+    variants = defaultdict(set)  # Канонический ключ -> разные старые slug'и, которые он объединил
+    for topic, level, analogy in requests:
+        old_key = legacy_topic_slug(topic, level, analogy, allow_truncated=True)
+        new_key = canonical_key(topic, level, analogy)
+        old_hits += old_key in old_seen
+        new_hits += new_key in new_seen
+        old_seen.add(old_key)
+        new_seen.add(new_key)
+        old_to_new[old_key].add(new_key)
+        variants[new_key].add(old_key)
+
+    total = len(requests)
+    collisions = sum(1 for keys in old_to_new.values() if len(keys) > 1)
+    print(f"Requests:                 {total}")
+    print(f"Unique keys (old/new):    {len(old_seen)} / {len(new_seen)}")
+    print(f"Hit rate before:          {old_hits / total:.1%}")
+    print(f"Hit rate after:           {new_hits / total:.1%}")
+    print(f"Generations saved:        {len(old_seen) - len(new_seen)}")
+    print(f"Truncation collisions:    {collisions} old slug(s) shared by different topics")
+
+    merged = sorted(((key, olds) for key, olds in variants.items() if len(olds) > 1),
+                    key=lambda item: len(item[1]), reverse=True)
+    if merged:
+        print(f"\nTop merged variants (of {len(merged)}):")
+        for key, olds in merged[:args.top]:
+            print(f"  {key} <- {', '.join(sorted(olds))}")
+
+
+class RateLimiter:
+    """Не больше rate запусков в секунду (равномерно, без всплесков); rate <= 0 - без ограничения."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            if self._next_at > now:
+                await asyncio.sleep(self._next_at - now)
+            self._next_at = max(now, self._next_at) + self.interval
+
+
+def _read_warm_topics(args: argparse.Namespace) -> Iterator[tuple[int, list[str]]]:
+    """Строки списка тем: (номер строки, [тема, уровень, аналогия]). Заголовок "topic..." пропускается."""
+    f = sys.stdin if args.input == "-" else open(args.input, mode='r', encoding='utf-8', newline='')
+    try:
+        for line_no, row in enumerate(csv.reader(f, delimiter=args.delimiter), start=1):
+            if not row or not row[0].strip() or row[0].startswith("#"):
+                continue
+            if line_no == 1 and row[0].strip().lower() == "topic":
+                continue
+            yield line_no, [column.strip() for column in row]
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+async def warm_cache(args: argparse.Namespace):
+    """
+    Генерирует объяснения для списка тем с ограничением параллельности и частоты запросов к AI.
+    Уже сохраненные объяснения пропускаются, поэтому прерванный прогон можно просто запустить заново.
+    """
+    import services  # Здесь, а не в начале файла: остальным командам клиент GenAI не нужен
+    from app.core.generation_pool import GenerationOverloadedError
+    from models import ExplainRequest
+    from pydantic import ValidationError
+
+    await services.startup()
+    limiter = RateLimiter(args.rate)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    counts = {"generated": 0, "skipped": 0, "failed": 0}
+    failures: list[tuple[int, list[str], str]] = []
+    seen_slugs: set[str] = set()
+    started = time.monotonic()
+
+    def report_progress():
+        processed = sum(counts.values())
+        if processed % args.progress_every == 0:
+            elapsed = max(time.monotonic() - started, 1e-6)
+            logger.info(f"Processed {processed}: {counts['generated']} generated, {counts['skipped']} skipped, "
+                        f"{counts['failed']} failed ({counts['generated'] / elapsed * 60:.1f} generations/min)")
+
+    async def process(line_no: int, row: list[str]) -> Optional[str]:
+        """Возвращает текст ошибки или None."""
+        topic = row[0]
+        level = row[1] if len(row) > 1 and row[1] else args.level
+        analogy = row[2] if len(row) > 2 and row[2] else None
+        try:
+            request = ExplainRequest(topic=topic, level=level, analogy=analogy)
+        except ValidationError as e:
+            return f"invalid input: {e.errors()[0]['msg']}"
+
+        slug = await services.resolve_topic_slug(request)
+        if slug in seen_slugs or await services.load_explanation_from_file(slug) is not None:
+            counts["skipped"] += 1
+            return None
+        seen_slugs.add(slug)  # Повтор той же темы ниже по списку не запустит вторую генерацию
+
+        for attempt in range(args.retries + 1):
+            await limiter.wait()
+            # Отказ прошлой попытки лежит в негативном кеше - без сброса повтор вернул бы его, не вызывая AI
+            services.negative_cache.invalidate(slug)
+            try:
+                explanation_text, saved_slug = await services.get_or_create_explanation(request)
+            except GenerationOverloadedError as e:
+                logger.warning(f"Line {line_no}: generation pool overloaded, retrying in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
+                continue
+            except Exception as e:
+                return f"error: {e}"
+            if saved_slug:
+                counts["generated"] += 1
+                return None
+            if attempt < args.retries:
+                logger.warning(f"Line {line_no}: explanation rejected, retrying ({explanation_text[:80]})")
+                continue
+            return f"not saved: {explanation_text[:200]}"
+        return "generation pool overloaded"
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            line_no, row = item
+            error = await process(line_no, row)
+            if error:
+                counts["failed"] += 1
+                failures.append((line_no, row, error))
+                logger.error(f"Line {line_no} ({row[0]!r}): {error}")
+            report_progress()
+
+    workers = [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+    try:
+        for item in _read_warm_topics(args):
+            await queue.put(item)
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        await services.shutdown()
+
+    elapsed = max(time.monotonic() - started, 1e-6)
+    processed = sum(counts.values())
+    print(f"Processed:   {processed} topics in {elapsed:.1f}s")
+    print(f"Generated:   {counts['generated']} ({counts['generated'] / elapsed * 60:.1f}/min)")
+    print(f"Skipped:     {counts['skipped']} (already saved or repeated in the list)")
+    print(f"Failed:      {counts['failed']}")
+    if failures and args.failures:
+        with open(args.failures, mode='w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, delimiter=args.delimiter)
+            for _, row, _ in failures:
+                writer.writerow(row)
+        print(f"Failed topics written to {args.failures} (same format, can be passed back as --input)")
+
+
+async def compact_storage(args: argparse.Namespace):
+    """
+    Переписывает файлы объяснений в текущий формат JSON хранилища: компактный JSON (или сжатый,
+    см. --compression) в подпапках шардов. Старые файлы с отступами из корня папки удаляются после
+    атомарной записи нового файла, поэтому команду можно запускать на работающем сервисе.
+    Для SQLite выполняется VACUUM.
+    """
+    if STORAGE_BACKEND == "sqlite":
+        size_before = SQLITE_DB_PATH.stat().st_size if SQLITE_DB_PATH.exists() else 0
+        storage = SQLiteStorage(SQLITE_DB_PATH)
+        await storage.init()
+        if not args.dry_run:
+            await storage.vacuum()
+        await storage.close()
+        logger.info(f"SQLite records are already compact JSON; VACUUM: {size_before / 1024 / 1024:.1f} MB -> "
+                    f"{SQLITE_DB_PATH.stat().st_size / 1024 / 1024:.1f} MB")
+        return
+
+    storage = JsonFileStorage(EXPLANATIONS_DIR, SEARCH_INDEX_PATH, ALIASES_PATH,
+                              compression=args.compression or JSON_STORAGE_COMPRESSION)
+    started = time.monotonic()
+    counts = defaultdict(int)
+    bytes_before, bytes_after = 0, 0
+    for slug, (path, _) in sorted(scan_record_files(EXPLANATIONS_DIR).items()):
+        try:
+            content = path.read_bytes()
+            raw_json = decode_bytes(content, split_record_name(path.name)[1])
+            data = explanation_to_dict(explanation_from_dict(json.loads(raw_json)))
+        except Exception as e:
+            counts["corrupt"] += 1
+            logger.error(f"Skipping unreadable record {path}: {e}")
+            continue
+        new_content = encode_record(data, storage.compression)
+        target = storage.get_filepath(slug)
+        bytes_before += len(content)
+        bytes_after += len(new_content)
+        if target == path and new_content == content:
+            counts["unchanged"] += 1
+            continue
+        counts["converted"] += 1
+        if not args.dry_run:
+            write_record_file(target, new_content)
+            if target != path:
+                path.unlink(missing_ok=True)
+        if counts["converted"] % 1000 == 0:
+            logger.info(f"Converted {counts['converted']} records...")
+
+    # Временные файлы, оставшиеся после сбоя посреди записи
+    stale_before = time.time() - 3600
+    for tmp_path in list(EXPLANATIONS_DIR.glob(".*.tmp")) + list(EXPLANATIONS_DIR.glob("*/.*.tmp")):
+        if tmp_path.stat().st_mtime < stale_before:
+            counts["stale_tmp_removed"] += 1
+            if not args.dry_run:
+                tmp_path.unlink(missing_ok=True)
+
+    if not args.dry_run:
+        storage.change_marker.touch()  # Работающие воркеры пересканируют папку
+    logger.info(f"{'Dry run: ' if args.dry_run else ''}{dict(counts)} in {time.monotonic() - started:.1f}s, "
+                f"format '{storage.compression}', {bytes_before / 1024:,.0f} KB -> "
+                f"{bytes_after / 1024:,.0f} KB")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Служебные команды ПростоПонятно.ai")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate-storage", help="Перенести JSON файлы объяснений в SQLite")
+    migrate.add_argument("--source", default=str(EXPLANATIONS_DIR), help="Папка с файлами объяснений")
+    migrate.add_argument("--target", default=str(SQLITE_DB_PATH), help="Путь к SQLite базе")
+    migrate.add_argument("--batch-size", type=int, default=500, help="Записей в одной транзакции")
+    migrate.add_argument("--aliases", default=str(ALIASES_PATH), help="Файл псевдонимов JSON хранилища")
+    migrate.set_defaults(handler=migrate_storage)
+
+    aliases = commands.add_parser("build-aliases", help="Псевдонимы канонических ключей для старых объяснений")
+    aliases.set_defaults(handler=build_aliases)
+
+    report = commands.add_parser("normalization-report",
+                                 help="Доля попаданий в кеш до и после канонизации тем")
+    report.add_argument("--input", help="Файл с запросами: тема или JSON {topic, level, analogy} на строку "
+                                        "(по умолчанию - темы сохраненных объяснений)")
+    report.add_argument("--level", default="simple", help="Уровень для строк без JSON")
+    report.add_argument("--top", type=int, default=10, help="Сколько объединенных групп показать")
+    report.set_defaults(handler=normalization_report)
+
+    warm = commands.add_parser("warm", help="Заранее сгенерировать объяснения для списка тем")
+    warm.add_argument("--input", default="-",
+                      help="Файл со строками 'тема[<TAB>уровень[<TAB>аналогия]]', '-' - stdin")
+    warm.add_argument("--delimiter", default="\t", help="Разделитель колонок (по умолчанию табуляция)")
+    warm.add_argument("--level", default="simple", help="Уровень для строк без колонки уровня")
+    warm.add_argument("--concurrency", type=int, default=2, help="Сколько генераций одновременно")
+    warm.add_argument("--rate", type=float, default=0.5, help="Не больше стольких генераций в секунду (0 - без ограничения)")
+    warm.add_argument("--retries", type=int, default=1, help="Повторов, если объяснение не прошло проверку")
+    warm.add_argument("--failures", help="Куда записать темы, которые не удалось сгенерировать")
+    warm.add_argument("--progress-every", type=int, default=25, help="Как часто писать прогресс (тем)")
+    warm.set_defaults(handler=warm_cache)
+
+    compact = commands.add_parser("compact-storage", help="Перевести файлы объяснений в компактный формат")
+    compact.add_argument("--compression", choices=["none", "gzip", "zstd"],
+                         help="Сжатие (по умолчанию JSON_STORAGE_COMPRESSION)")
+    compact.add_argument("--dry-run", action="store_true", help="Только посчитать, ничего не менять")
+    compact.set_defaults(handler=compact_storage)
+
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
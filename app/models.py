@@ -11,6 +11,19 @@ class ExplainRequest(BaseModel):
 class ExplainResponse(BaseModel):
     explanation: str
     slug: Optional[str] = None # Возвращаем slug для возможного редиректа или ссылки
+    explanation_html: Optional[str] = None # Готовый HTML (для сохраненных объяснений)
+
+# Одна тема сразу на нескольких уровнях (/api/explain/batch)
+class ExplainBatchRequest(BaseModel):
+    topic: str = Field(..., min_length=3, max_length=200)
+    levels: List[str] = Field(..., min_length=1, max_length=6) # Повторы уровней отбрасываются
+    analogy: Optional[str] = Field(None, max_length=100)
+
+class ExplainBatchItem(ExplainResponse):
+    level: str
+
+class ExplainBatchResponse(BaseModel):
+    results: List[ExplainBatchItem] # В порядке уровней из запроса; slug=None - текст не сохранен
 
 # Модель для хранения данных в JSON файле (без изменений)
 class StoredExplanation(BaseModel):
@@ -19,9 +32,12 @@ class StoredExplanation(BaseModel):
     level: str
     analogy: Optional[str] = None
     explanation_text: str
+    explanation_html: Optional[str] = None # Markdown, отрендеренный на сервере при сохранении
     meta_title: str
     meta_description: str
     created_at: datetime.datetime
+    updated_at: Optional[datetime.datetime] = None # Когда текст последний раз обновлялся в фоне
+    prompt_version: Optional[int] = None # Версия промпта (PROMPT_VERSION); None - записи до версионирования
 
 # --- Новая модель для результатов поиска ---
 class SearchResultItem(BaseModel):
@@ -1,92 +1,331 @@
-import asyncio
-from typing import Optional, List
+from typing import Optional, List, AsyncIterator
 
-from google import genai
+import asyncio
 import logging
-import json
+from contextlib import contextmanager
 import datetime
-from pathlib import Path
-
-from google.genai.types import Tool, GoogleSearch, GenerateContentConfig, FinishReason
-from slugify import slugify
-import aiofiles  # Для асинхронного чтения/записи
-
-from app.core.config import GOOGLE_API_KEY, EXPLANATIONS_DIR
+import time
+import zlib
+from collections import Counter
+
+from app.core.config import GOOGLE_API_KEY, EXPLANATIONS_DIR, GENERATION_MAX_CONCURRENCY, GENERATION_MAX_QUEUE, \
+    GENERATION_QUEUE_TIMEOUT, GENERATION_RETRY_AFTER, SINGLEFLIGHT_FILE_LOCK, SINGLEFLIGHT_LOCK_TIMEOUT, LOCKS_DIR, \
+    EXPLANATION_CACHE_MAX_ENTRIES, EXPLANATION_CACHE_MAX_BYTES, EXPLANATION_CACHE_TTL, SEARCH_INDEX_PATH, \
+    STORAGE_BACKEND, SQLITE_DB_PATH, JSON_STORAGE_COMPRESSION, ALIASES_PATH, SEMANTIC_LOOKUP_ENABLED, \
+    SEMANTIC_SIMILARITY_THRESHOLD, SEMANTIC_INDEX_DIM, SEMANTIC_INDEX_PATH, GENAI_BASE_URL, GENAI_TIMEOUT, \
+    GENAI_MAX_RETRIES, GENAI_BACKOFF_BASE, GENAI_BACKOFF_MAX, GENAI_HEDGE_PERCENTILE, GENAI_HEDGE_MIN_SAMPLES, \
+    GENAI_BREAKER_FAILURES, GENAI_BREAKER_RESET, \
+    NEGATIVE_CACHE_MAX_ENTRIES, NEGATIVE_CACHE_TTLS, PROMPT_VERSION, REFRESH_MAX_AGE_DAYS, REFRESH_AGE_JITTER, \
+    REFRESH_MAX_CONCURRENCY, REFRESH_MAX_QUEUE, REFRESH_MIN_INTERVAL, REFRESH_RETRY_INTERVAL, RATE_LIMIT_ENABLED, \
+    RATE_LIMIT_EXPLAIN_PER_MINUTE, RATE_LIMIT_EXPLAIN_BURST, RATE_LIMIT_GENERATE_PER_MINUTE, RATE_LIMIT_GENERATE_BURST, \
+    RATE_LIMIT_SHARED, RATE_LIMIT_DB_PATH, PREWARM_EXPLANATIONS, PREWARM_GENAI
+from app.core.cache import ExplanationCache
+from app.core.generation_pool import GenerationPool, GenerationOverloadedError
+from app.core.metrics import MetricsRegistry
+from app.core.negative_cache import NegativeCache
+from app.core.normalization import canonical_key, legacy_topic_slug
+from app.core.rate_limit import BucketPolicy, create_rate_limiter
+from app.core.refresh import BackgroundRefresher
+from app.core.resilient_client import ResilientGenAIClient, CircuitBreaker
+from app.core.rendering import render_markdown
+from app.core.search_index import IndexedDocument
+from app.core.semantic import create_semantic_index
+from app.core.storage import create_storage
+from app.core.suggest import SuggestIndex
+from app.core.singleflight import SingleFlight, StreamRelay, optional_lock
+from app.core.startup import startup_report
 from models import ExplainRequest, StoredExplanation, SearchResultItem
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Конфигурация клиента GenAI
-try:
-    if not GOOGLE_API_KEY:
-        raise ValueError("GOOGLE_API_KEY not found in environment variables.")
-    # Используем актуальную и доступную модель
-    client = genai.Client(api_key=GOOGLE_API_KEY)
-    logger.info("Google GenAI client configured successfully.")
-except Exception as _:
-    logger.error(f"Error configuring Google GenAI client: {_}", exc_info=True)
-    client = None
+# Клиент GenAI создается при первой генерации (get_genai_client): импорт google.genai занимает
+# заметную часть старта воркера, а первым запросом часто бывает страница из кеша.
+# Тесты и бенчмарки могут заранее подставить сюда свой объект с тем же интерфейсом.
+client = None
+_client_init_failed = False  # Не пытаемся создать клиент на каждом запросе, если ключа нет
 
 model_id = "gemini-2.0-flash"
 
-google_search_tool = Tool(
-    google_search=GoogleSearch()
+
+def get_genai_client():
+    """Клиент GenAI, созданный при первом обращении; None, если ключ не задан или клиент не создался."""
+    global client, _client_init_failed
+    if client is None and not _client_init_failed:
+        try:
+            if not GOOGLE_API_KEY:
+                raise ValueError("GOOGLE_API_KEY not found in environment variables.")
+            from google import genai
+            from google.genai.types import HttpOptions
+            client = genai.Client(api_key=GOOGLE_API_KEY,
+                                  http_options=HttpOptions(base_url=GENAI_BASE_URL) if GENAI_BASE_URL else None)
+            logger.info("Google GenAI client configured successfully.")
+        except Exception as e:
+            logger.error(f"Error configuring Google GenAI client: {e}", exc_info=True)
+            _client_init_failed = True
+    return client
+
+
+# Все обращения к GenAI идут через обертку с таймаутами, повторами, хеджированием и circuit breaker
+genai_client = ResilientGenAIClient(
+    client_provider=get_genai_client,
+    timeout=GENAI_TIMEOUT,
+    max_retries=GENAI_MAX_RETRIES,
+    backoff_base=GENAI_BACKOFF_BASE,
+    backoff_max=GENAI_BACKOFF_MAX,
+    hedge_percentile=GENAI_HEDGE_PERCENTILE,
+    hedge_min_samples=GENAI_HEDGE_MIN_SAMPLES,
+    breaker=CircuitBreaker(failure_threshold=GENAI_BREAKER_FAILURES, reset_timeout=GENAI_BREAKER_RESET),
 )
 
-generation_config = GenerateContentConfig(
-    tools=[google_search_tool],
-    response_modalities=["TEXT"],
+# Пул генерации: ограничивает одновременные обращения к GenAI и длину очереди,
+# чтобы промахи кеша не блокировали обслуживание уже сохраненных страниц
+generation_pool = GenerationPool(
+    max_concurrency=GENERATION_MAX_CONCURRENCY,
+    max_queue=GENERATION_MAX_QUEUE,
+    queue_timeout=GENERATION_QUEUE_TIMEOUT,
+    retry_after=GENERATION_RETRY_AFTER,
 )
 
+# Одновременные одинаковые запросы (один и тот же slug) ждут одну общую генерацию
+explanation_flight = SingleFlight()
+stream_relays: dict[str, StreamRelay] = {}  # slug -> фрагменты идущей потоковой генерации
 
-# --- Функции для работы с файлами объяснений ---
+# In-memory кеш разобранных StoredExplanation: горячие страницы отдаются без чтения диска
+explanation_cache = ExplanationCache(
+    max_entries=EXPLANATION_CACHE_MAX_ENTRIES,
+    max_bytes=EXPLANATION_CACHE_MAX_BYTES,
+    ttl=EXPLANATION_CACHE_TTL,
+)
+
+# Неудачные генерации (блокировка, слишком короткий ответ, отказ): повтор запроса отвечается сразу
+negative_cache = NegativeCache(max_entries=NEGATIVE_CACHE_MAX_ENTRIES, ttls=NEGATIVE_CACHE_TTLS)
+
+# Фоновое обновление устаревших объяснений: пользователю сразу отдается сохраненная копия
+background_refresher = BackgroundRefresher(
+    max_concurrency=REFRESH_MAX_CONCURRENCY,
+    max_queue=REFRESH_MAX_QUEUE,
+    min_interval=REFRESH_MIN_INTERVAL,
+    retry_interval=REFRESH_RETRY_INTERVAL,
+)
 
-def get_explanation_filepath(slug: str) -> Path:
-    """Возвращает путь к файлу объяснения по slug."""
-    return EXPLANATIONS_DIR / f"{slug}.json"
+# Лимиты запросов по клиенту: "explain" - любой запрос к API, "generate" - промах кеша (платный вызов AI)
+rate_limiter = create_rate_limiter(
+    policies={
+        "explain": BucketPolicy(per_minute=RATE_LIMIT_EXPLAIN_PER_MINUTE, burst=RATE_LIMIT_EXPLAIN_BURST),
+        "generate": BucketPolicy(per_minute=RATE_LIMIT_GENERATE_PER_MINUTE, burst=RATE_LIMIT_GENERATE_BURST),
+    } if RATE_LIMIT_ENABLED else {},
+    shared_db_path=RATE_LIMIT_DB_PATH if RATE_LIMIT_SHARED else None,
+)
 
+# Хранилище объяснений (JSON файлы или SQLite, см. STORAGE_BACKEND)
+storage = create_storage(STORAGE_BACKEND, EXPLANATIONS_DIR, SEARCH_INDEX_PATH, ALIASES_PATH, SQLITE_DB_PATH,
+                         JSON_STORAGE_COMPRESSION)
+
+# Префиксный индекс тем для мгновенных подсказок в поле поиска (строится из storage.list_documents)
+suggest_index = SuggestIndex()
+
+# Как разрешались ключи запросов: canonical - объяснение по каноническому ключу, alias - через псевдоним,
+# legacy - найдено по старой схеме slug (и записан псевдоним), semantic - найдена близкая по смыслу тема,
+# new - объяснения еще нет
+topic_key_stats = Counter(canonical=0, alias=0, legacy=0, semantic=0, new=0)
+
+# Векторный индекс тем для поиска перефразировок (None, если SEMANTIC_LOOKUP_ENABLED выключен или нет numpy)
+semantic_index = create_semantic_index(SEMANTIC_LOOKUP_ENABLED, SEMANTIC_INDEX_PATH, SEMANTIC_INDEX_DIM)
+
+# --- Метрики процесса в формате Prometheus (эндпоинт /metrics) ---
+metrics = MetricsRegistry(prefix="prostoponyatno_")
+explain_requests_total = metrics.counter(
+    "explain_requests_total", "Explanation requests by endpoint and result (hit, miss, negative)", ("endpoint", "result"))
+explain_stage_seconds = metrics.histogram(
+    "explain_stage_seconds", "Time spent in each stage of serving an explanation request", ("stage",))
+explanation_load_seconds = metrics.histogram(
+    "explanation_load_seconds", "load_explanation_from_file latency by where the explanation came from", ("source",))
+generation_queue_wait_seconds = metrics.histogram(
+    "generation_queue_wait_seconds", "Time spent waiting for a generation pool slot")
+genai_request_seconds = metrics.histogram(
+    "genai_request_seconds", "GenAI call latency including retries", ("mode", "outcome"))
+validation_outcomes_total = metrics.counter(
+    "validation_outcomes_total", "Generated texts by validation outcome", ("outcome",))
+search_seconds = metrics.histogram("search_seconds", "Search and suggest latency", ("kind",))
+metrics.gauge_callback("generations_in_flight", "Generations currently holding a pool slot",
+                       lambda: generation_pool.stats()["in_flight"])
+metrics.gauge_callback("generations_waiting", "Requests waiting for a generation pool slot",
+                       lambda: generation_pool.stats()["waiting"])
+metrics.counter_callback("generations_rejected_total", "Requests rejected because the generation pool was full",
+                         lambda: generation_pool.stats()["rejected"])
+metrics.counter_callback("single_flight_coalesced_total", "Requests that joined an in-flight generation",
+                         lambda: explanation_flight.stats()["coalesced"])
+metrics.counter_callback("explanation_cache_lookups_total", "In-memory explanation cache lookups by result",
+                         lambda: [({"result": "hit"}, explanation_cache.hits), ({"result": "miss"}, explanation_cache.misses)],
+                         ("result",))
+metrics.gauge_callback("explanation_cache_bytes", "Approximate size of the in-memory explanation cache",
+                       lambda: explanation_cache.stats()["bytes"])
+metrics.gauge_callback("negative_cache_entries", "Entries in the negative cache",
+                       lambda: negative_cache.stats()["entries"])
+metrics.counter_callback("genai_outcomes_total", "Resilient GenAI client outcomes (retries, hedges, timeouts...)",
+                         lambda: [({"outcome": k}, v) for k, v in genai_client.outcomes.items()], ("outcome",))
+metrics.gauge_callback("genai_circuit_open", "1 while the GenAI circuit breaker rejects calls",
+                       lambda: 0 if genai_client.breaker.state == "closed" else 1)
+metrics.gauge_callback("refresh_queue_length", "Stale explanations waiting for background refresh",
+                       lambda: background_refresher.stats()["queued"])
+metrics.counter_callback("rate_limit_rejections_total", "Requests rejected with 429 by rate limit bucket",
+                         lambda: [({"bucket": k}, v) for k, v in rate_limiter.rejected.items()], ("bucket",))
+metrics.gauge_callback("startup_phase_seconds", "Worker startup duration by phase (imports, storage, prewarm)",
+                       lambda: [({"phase": k}, v) for k, v in startup_report.phases.items()], ("phase",))
+metrics.counter_callback("topic_key_resolutions_total", "How request keys were resolved to explanations",
+                         lambda: [({"kind": k}, v) for k, v in topic_key_stats.items()], ("kind",))
+
+
+def _on_storage_change(changed: list[IndexedDocument], removed: list[str]):
+    """Поддерживает in-memory индексы в актуальном состоянии при изменениях хранилища."""
+    for slug in removed:
+        explanation_cache.invalidate(slug)
+        suggest_index.remove(slug)
+        if semantic_index is not None:
+            semantic_index.remove(slug)
+    for doc in changed:
+        negative_cache.invalidate(doc.slug)  # Объяснение все-таки появилось (например, через warm)
+        suggest_index.add(doc.slug, doc.topic, doc.created_at)
+        if semantic_index is not None:
+            semantic_index.add(doc.slug, doc.topic, doc.level)
+
+
+def subscribe_to_changes(listener):
+    """Подписка на изменения объяснений (сохранения в этом процессе и найденные при sync)."""
+    storage.subscribe(listener)
+
+
+async def startup():
+    """Подготовка хранилища и индексов при старте приложения (длительность этапов - в startup_report)."""
+    with startup_report.phase("storage_init"):
+        await storage.init()
+        documents = await storage.list_documents()
+    with startup_report.phase("indexes"):
+        suggest_index.rebuild([(doc.slug, doc.topic, doc.created_at) for doc in documents])
+        if semantic_index is not None:
+            await asyncio.to_thread(semantic_index.load)
+            await asyncio.to_thread(semantic_index.rebuild, [(doc.slug, doc.topic, doc.level) for doc in documents])
+            logger.info(f"Semantic index ready: {len(semantic_index)} topics")
+    storage.subscribe(_on_storage_change)
+    logger.info(f"Storage '{storage.name}' ready: {len(documents)} explanations")
+    if not GOOGLE_API_KEY:
+        logger.warning("GOOGLE_API_KEY is not set: saved explanations are served, new ones cannot be generated")
+    if PREWARM_EXPLANATIONS > 0 or PREWARM_GENAI:
+        with startup_report.phase("prewarm"):
+            await prewarm(documents)
+    if REFRESH_MAX_AGE_DAYS > 0 or PROMPT_VERSION > 1:
+        background_refresher.start(refresh_explanation)
+
+
+async def prewarm(documents: list[IndexedDocument]):
+    """
+    Прогрев до приема запросов: последние объяснения загружаются в explanation_cache,
+    клиент GenAI создается сразу (PREWARM_GENAI), чтобы первый промах не платил за импорт.
+    """
+    if PREWARM_GENAI:
+        await asyncio.to_thread(get_genai_client)
+    limit = min(PREWARM_EXPLANATIONS, EXPLANATION_CACHE_MAX_ENTRIES)
+    if limit > 0:
+        recent = sorted(documents, key=lambda doc: doc.created_at, reverse=True)[:limit]
+        for doc in recent:
+            await load_explanation_from_file(doc.slug)
+        logger.info(f"Prewarmed {len(recent)} explanations into the cache")
+
+
+async def shutdown():
+    """Сохранение индексов и закрытие хранилища при остановке приложения."""
+    await background_refresher.stop()
+    if semantic_index is not None and semantic_index.dirty:
+        try:
+            semantic_index.save()
+            logger.info(f"Semantic index saved: {len(semantic_index)} topics")
+        except Exception as e:
+            logger.error(f"Error saving semantic index: {e}")
+    await storage.close()
+
+
+# --- Функции для работы с сохраненными объяснениями ---
 
 async def load_explanation_from_file(slug: str) -> Optional[StoredExplanation]:
-    """Асинхронно загружает объяснение из JSON файла."""
-    filepath = get_explanation_filepath(slug)
-    if not filepath.is_file():
-        return None
-    try:
-        async with aiofiles.open(filepath, mode='r', encoding='utf-8') as f:
-            content = await f.read()
-            data = json.loads(content)
-            # Преобразуем строку времени обратно в datetime
-            data['created_at'] = datetime.datetime.fromisoformat(data['created_at'])
-            return StoredExplanation(**data)
-    except Exception as e:
-        logger.error(f"Error loading explanation file {filepath}: {e}")
+    """
+    Загружает объяснение: сначала из explanation_cache, затем из хранилища.
+    Прочитанный объект кладется в кеш.
+    """
+    started = time.perf_counter()
+    cached = explanation_cache.get(slug)
+    if cached is not None:
+        explanation_load_seconds.observe(time.perf_counter() - started, source="memory")
+        return cached
+
+    if slug in explanation_cache:
+        # Запись в кеше есть, но давно не сверялась: проверяем только время изменения
+        mtime = await storage.get_mtime(slug)
+        if mtime is None:
+            explanation_cache.invalidate(slug)
+            explanation_load_seconds.observe(time.perf_counter() - started, source="missing")
+            return None
+        cached = explanation_cache.get(slug, mtime=mtime)  # Запись не изменилась - разбирать ее заново не нужно
+        if cached is not None:
+            explanation_load_seconds.observe(time.perf_counter() - started, source="revalidated")
+            return cached
+
+    record = await storage.read(slug)  # Чтение и разбор записи
+    if record is None:
+        explanation_load_seconds.observe(time.perf_counter() - started, source="missing")
         return None
+    if record.explanation.explanation_html is None:
+        # Объяснения, сохраненные до серверного рендеринга: рендерим один раз и держим в кеше
+        record.explanation.explanation_html = render_markdown(record.explanation.explanation_text)
+    explanation_cache.put(slug, record.explanation, mtime=record.mtime, size=record.size)
+    explanation_load_seconds.observe(time.perf_counter() - started, source="storage")
+    return record.explanation
 
 
 async def save_explanation_to_file(data: StoredExplanation):
-    """Асинхронно сохраняет объяснение в JSON файл."""
-    filepath = get_explanation_filepath(data.slug)
+    """Сохраняет объяснение в хранилище и обновляет explanation_cache."""
     try:
-        # Преобразуем datetime в строку ISO для JSON
-        data_dict = data.model_dump()
-        data_dict['created_at'] = data.created_at.isoformat()
-
-        async with aiofiles.open(filepath, mode='w', encoding='utf-8') as f:
-            await f.write(json.dumps(data_dict, ensure_ascii=False, indent=4))
-        logger.info(f"Successfully saved explanation to {filepath}")
+        record = await storage.write(data)
+        explanation_cache.put(data.slug, data, mtime=record.mtime, size=record.size)
+        logger.info(f"Successfully saved explanation '{data.slug}' to {storage.name} storage")
     except Exception as e:
-        logger.error(f"Error saving explanation file {filepath}: {e}")
+        explanation_cache.invalidate(data.slug)
+        logger.error(f"Error saving explanation '{data.slug}': {e}")
+
+
+def get_runtime_stats() -> dict:
+    """Счетчики кешей и пула генерации (для /api/stats)."""
+    return {
+        "explanation_cache": explanation_cache.stats(),
+        "generation_pool": generation_pool.stats(),
+        "genai_client": genai_client.stats(),
+        "single_flight": explanation_flight.stats(),
+        "negative_cache": negative_cache.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "background_refresh": background_refresher.stats(),
+        "storage": storage.stats(),
+        "topic_keys": dict(topic_key_stats),
+        "semantic_index": semantic_index.stats() if semantic_index is not None else None,
+        "startup": startup_report.stats(),
+    }
 
 
 # --- Основная логика генерации и сохранения ---
 
-def generate_ai_explanation(request: ExplainRequest) -> str:
-    """Генерирует объяснение с помощью Google GenAI."""
-    if not client:
-        raise ConnectionError("Google GenAI client not configured or API key missing.")
-
+# Признаки того, что вместо объяснения AI вернул отказ или сообщение об ошибке
+ERROR_INDICATORS = [
+    "извините", "не удалось", "ошибка", "не могу", "ограничений безопасности",
+    "невозможно обработать", "сервис недоступен", "api key not valid",
+    "произошла ошибка"  # Добавляем общие фразы
+]
+MIN_LENGTH_THRESHOLD = {  # Разная минимальная длина для разных типов
+    "tldr": 15,
+    "5-year-old": 30,
+    "default": 50
+}
+
+
+def build_explanation_prompt(request: ExplainRequest) -> str:
+    """Собирает промпт для GenAI по теме, уровню и аналогии из запроса."""
     topic = request.topic.strip()  # Убираем лишние пробелы
     base_prompt = f"Тема или вопрос: '{topic}'."
 
@@ -128,106 +367,274 @@ def generate_ai_explanation(request: ExplainRequest) -> str:
                   f"- Будь точным, но избегай излишней сложности, соответствуй выбранному уровню.\n" \
                   f"Ответ:"  # Начинаем ответ сразу с объяснения
 
+    return full_prompt
+
+
+def compute_topic_slug(request: ExplainRequest) -> str:
+    """
+    Вычисляет канонический slug (ключ кеша и имя файла) для запроса.
+    Варианты одной темы ("Что такое ДНК?", "что такое днк", "ДНК — что это") дают один ключ,
+    хеш-суффикс исключает коллизии длинных тем с общим началом.
+    """
+    return canonical_key(request.topic, request.level, request.analogy)
+
+
+async def resolve_topic_slug(request: ExplainRequest) -> str:
+    """
+    slug объяснения для запроса: канонический ключ или slug, на который он указывает в таблице псевдонимов.
+    Объяснение, сохраненное по старой схеме slug, находится по ней один раз и записывается псевдонимом.
+    """
+    topic_slug = compute_topic_slug(request)
+    if topic_slug in explanation_cache:
+        topic_key_stats["canonical"] += 1
+        return topic_slug
+
+    alias_target = await storage.get_alias(topic_slug)
+    if alias_target:
+        topic_key_stats["alias"] += 1
+        return alias_target
+    if await storage.get_mtime(topic_slug) is not None:
+        topic_key_stats["canonical"] += 1
+        return topic_slug
+
+    legacy_slug = legacy_topic_slug(request.topic, request.level, request.analogy)
+    if legacy_slug and legacy_slug != topic_slug and await storage.get_mtime(legacy_slug) is not None:
+        logger.info(f"Aliasing canonical key '{topic_slug}' to legacy slug '{legacy_slug}'")
+        await storage.add_alias(topic_slug, legacy_slug)
+        topic_key_stats["legacy"] += 1
+        return legacy_slug
+
+    if semantic_index is not None and request.level != "custom_analogy":
+        # Для аналогий текст зависит от аналогии, поэтому близости темы недостаточно
+        match = semantic_index.lookup(request.topic, request.level, SEMANTIC_SIMILARITY_THRESHOLD)
+        if match and await storage.get_mtime(match[0]) is not None:
+            logger.info(f"Semantic match for topic '{request.topic}': '{match[0]}' (similarity {match[1]:.3f})")
+            topic_key_stats["semantic"] += 1
+            return match[0]
+
+    topic_key_stats["new"] += 1
+    return topic_slug
+
+
+async def resolve_alias(slug: str) -> Optional[str]:
+    """slug объяснения, на которое указывает псевдоним (для редиректа со страниц по ключу)."""
+    return await storage.get_alias(slug)
+
+
+BLOCKED_RESPONSE_TEXT = "Извините, не удалось сгенерировать ответ из-за ограничений или ошибки."
+UPSTREAM_ERROR_TEXT = "Произошла ошибка при обращении к AI сервису. Пожалуйста, проверьте конфигурацию или попробуйте позже."
+
+
+def _response_error_text(response) -> Optional[str]:
+    """Текст ошибки, если ответ GenAI заблокирован или прерван; None, если ответ нормальный."""
+    from google.genai.types import FinishReason  # Пакет уже загружен клиентом, импорт из sys.modules
+    block_reason = response.prompt_feedback.block_reason if response.prompt_feedback else None
+    if not response.candidates or block_reason or response.candidates[0].finish_reason != FinishReason.STOP:
+        error_text = BLOCKED_RESPONSE_TEXT
+        if block_reason:
+            error_text += f" (Причина: {block_reason})"
+        elif not response.candidates:
+            error_text += " (Нет кандидатов для ответа)"
+        elif response.candidates and response.candidates[0].finish_reason != FinishReason.STOP:
+            error_text += f" (Генерация прервана: {response.candidates[0].finish_reason})"
+        logger.warning(error_text)
+        return error_text
+    return None
+
+
+@contextmanager
+def genai_timer(mode: str):
+    """Замеряет обращение к GenAI; исход (ok, blocked) записывается в outcome["value"], по умолчанию error."""
+    outcome = {"value": "error"}
+    started = time.perf_counter()
+    try:
+        yield outcome
+    finally:
+        genai_request_seconds.observe(time.perf_counter() - started, mode=mode, outcome=outcome["value"])
+
+
+async def generate_ai_explanation(request: ExplainRequest) -> str:
+    """
+    Генерирует объяснение с помощью асинхронного клиента Google GenAI.
+    Вызов выполняется внутри слота generation_pool; при переполнении
+    пула выбрасывается GenerationOverloadedError.
+    """
+    if not get_genai_client():
+        raise ConnectionError("Google GenAI client not configured or API key missing.")
+
+    full_prompt = build_explanation_prompt(request)
     logger.info(
         f"Generating content for prompt (style: {request.level}): {full_prompt[:300]}...")  # Логируем больше информации
 
     try:
-        response = client.models.generate_content(
-            model=model_id,
-            contents=full_prompt,
-            # config=generation_config,
-        )
-
-        if not response.candidates or response.prompt_feedback.block_reason or response.candidates[
-            0].finish_reason != FinishReason.STOP:
-            # Логирование причин уже внутри этого блока в предыдущей версии
-            error_text = "Извините, не удалось сгенерировать ответ из-за ограничений или ошибки."
-            if response.prompt_feedback.block_reason:
-                error_text += f" (Причина: {response.prompt_feedback.block_reason})"
-            elif not response.candidates:
-                error_text += " (Нет кандидатов для ответа)"
-            elif response.candidates and response.candidates[0].finish_reason != FinishReason.STOP:
-                error_text += f" (Генерация прервана: {response.candidates[0].finish_reason})"
-            logger.warning(error_text)
+        genai_client.ensure_available()  # При разомкнутом автомате отказываем сразу, не занимая очередь
+        queued_at = time.perf_counter()
+        async with generation_pool.slot():
+            generation_queue_wait_seconds.observe(time.perf_counter() - queued_at)
+            with genai_timer("generate") as outcome:
+                response = await genai_client.generate_content(
+                    model=model_id,
+                    contents=full_prompt,
+                )
+                error_text = _response_error_text(response)
+                outcome["value"] = "blocked" if error_text else "ok"
+
+        if error_text:
             return error_text  # Возвращаем текст ошибки пользователю
 
         logger.info(f"Successfully generated response for topic: {request.topic}")
         return response.text.strip()
 
+    except GenerationOverloadedError:
+        raise
     except Exception as e:
         logger.error(f"Error generating content via GenAI: {e}", exc_info=True)
         if "API key not valid" in str(e):
             raise ConnectionError("Invalid Google API Key.") from e
-        return f"Произошла ошибка при обращении к AI сервису. Пожалуйста, проверьте конфигурацию или попробуйте позже."
+        return UPSTREAM_ERROR_TEXT
 
 
-async def get_or_create_explanation(request: ExplainRequest) -> tuple[str, Optional[str]]:
+def validate_explanation(request: ExplainRequest, explanation_text: Optional[str]) -> tuple[bool, Optional[str]]:
+    """
+    Проверяет, можно ли сохранять сгенерированный текст.
+    Возвращает: (валиден ли для сохранения, текст ошибки для пользователя или None)
+    """
+    min_len = MIN_LENGTH_THRESHOLD.get(request.level, MIN_LENGTH_THRESHOLD["default"])
+
+    if not explanation_text:
+        logger.warning(f"Validation failed: Empty response for topic: {request.topic}")
+        validation_outcomes_total.inc(outcome="empty")
+        return False, "AI вернул пустой ответ."
+    if len(explanation_text) < min_len:
+        logger.warning(
+            f"Validation failed: Response too short ({len(explanation_text)} < {min_len} chars) for level '{request.level}', topic: {request.topic}")
+        validation_outcomes_total.inc(outcome=classify_failure(request, explanation_text))
+        return False, None  # Не сохраняем, но можем вернуть пользователю короткий ответ
+    if any(indicator in explanation_text.lower() for indicator in ERROR_INDICATORS):
+        logger.warning(
+            f"Validation failed: Response contains error indicators for topic: {request.topic}. Text: {explanation_text[:100]}...")
+        validation_outcomes_total.inc(outcome=classify_failure(request, explanation_text))
+        return False, None  # Не сохраняем, возвращаем пользователю текст ошибки
+
+    logger.info(f"Validation passed for topic: {request.topic}. Explanation is valid for saving.")
+    validation_outcomes_total.inc(outcome="valid")
+    return True, None
+
+
+def classify_failure(request: ExplainRequest, explanation_text: Optional[str]) -> str:
+    """Класс отказа для текста, не прошедшего validate_explanation (определяет TTL в negative_cache)."""
+    if not explanation_text:
+        return "empty"
+    if explanation_text == UPSTREAM_ERROR_TEXT:
+        return "upstream_error"
+    if explanation_text.startswith(BLOCKED_RESPONSE_TEXT):
+        return "blocked"
+    if len(explanation_text) < MIN_LENGTH_THRESHOLD.get(request.level, MIN_LENGTH_THRESHOLD["default"]):
+        return "too_short"
+    return "error_text"
+
+
+def build_meta_description(explanation_text: str) -> str:
+    """Первые одно-два предложения текста, не длиннее 160 символов."""
+    sentences = explanation_text.split('.')
+    meta_description = (sentences[0] + '.').strip()
+    if len(sentences) > 1:
+        meta_description += (' ' + sentences[1] + '.').strip()
+    return meta_description[:160].rsplit(' ', 1)[0] + '...'
+
+
+async def store_generated_explanation(request: ExplainRequest, topic_slug: str, explanation_text: str) -> StoredExplanation:
+    """Строит метаданные для валидного объяснения и сохраняет его."""
+    # 5. Генерируем метаданные
+    meta_title = f"Как понять '{request.topic[:40]}' простыми словами | ПростоПонятно.ai"
+    meta_description = build_meta_description(explanation_text)
+
+    # 6. Готовим данные для сохранения
+    stored_data = StoredExplanation(
+        topic_raw=request.topic,
+        slug=topic_slug,
+        level=request.level,
+        analogy=request.analogy,
+        explanation_text=explanation_text,
+        explanation_html=render_markdown(explanation_text),  # Рендерим один раз, страницы отдают готовый HTML
+        meta_title=meta_title,
+        meta_description=meta_description,
+        created_at=datetime.datetime.now(datetime.timezone.utc),
+        prompt_version=PROMPT_VERSION,
+    )
+
+    # 7. Сохраняем в файл (асинхронно)
+    await save_explanation_to_file(stored_data)  # Сохранение происходит ТОЛЬКО здесь
+    return stored_data
+
+
+async def get_or_create_explanation(request: ExplainRequest, client_id: Optional[str] = None) -> tuple[str, Optional[str]]:
     """
     Получает объяснение из файла или генерирует новое.
     Сохраняет в файл ТОЛЬКО если генерация прошла успешно и результат валиден.
+    client_id - кто спрашивает (для лимита генераций); новая генерация списывается с его корзины "generate".
     Возвращает: (текст объяснения, slug или None если сохранение не произошло)
     """
     logger.info(f"Processing request for topic: {request.topic}")
 
-    # 1. Сгенерировать slug
-    # Учитываем уровень и аналогию в slug, чтобы различать разные объяснения одной темы
-    slug_base = request.topic
-    if request.level == "custom_analogy" and request.analogy:
-        slug_base += f"-аналогия-{request.analogy}"
-    elif request.level != "simple":
-        slug_base += f"-уровень-{request.level}"
-
-    topic_slug = slugify(f"{request.topic}-{request.level}-{request.analogy or ''}",
-                         lowercase=True, separator='-', max_length=80,
-                         replacements=[['+', 'plus'], ['#', 'sharp']])  # Добавим реплейсменты
+    with explain_stage_seconds.time(stage="resolve"):
+        topic_slug = await resolve_topic_slug(request)
 
-    filepath = get_explanation_filepath(topic_slug)
-
-    # Проверка кеша
-    if filepath.is_file():
-        logger.info(f"Cache hit: Found existing explanation file for slug: {topic_slug}")
+    # Проверка кеша (in-memory, затем файл)
+    with explain_stage_seconds.time(stage="cache_lookup"):
         existing_data = await load_explanation_from_file(topic_slug)
-        if existing_data:
-            return existing_data.explanation_text, topic_slug
-
+    if existing_data:
+        logger.info(f"Cache hit: Found existing explanation for slug: {topic_slug}")
+        explain_requests_total.inc(endpoint="explain", result="hit")
+        schedule_refresh_if_stale(existing_data)
+        return existing_data.explanation_text, topic_slug
+
+    negative_entry = negative_cache.get(topic_slug)
+    if negative_entry:
+        logger.info(f"Negative cache hit ({negative_entry.failure_class}) for slug: {topic_slug}")
+        explain_requests_total.inc(endpoint="explain", result="negative")
+        return negative_entry.message, None
+
+    if not explanation_flight.is_running(topic_slug):
+        await rate_limiter.check(client_id, "generate")  # Присоединение к идущей генерации не списывается
+    explain_requests_total.inc(endpoint="explain", result="miss")
+    # Промах кеша: одна генерация на slug, остальные одновременные запросы ждут ее результат
+    return await explanation_flight.do(topic_slug, lambda: _generate_and_save_explanation(request, topic_slug))
+
+
+async def _generate_and_save_explanation(request: ExplainRequest, topic_slug: str) -> tuple[str, Optional[str]]:
+    """
+    Генерирует, валидирует и сохраняет объяснение для slug.
+    Вызывается через explanation_flight, поэтому в одном процессе для slug выполняется не более одного раза
+    одновременно; при SINGLEFLIGHT_FILE_LOCK то же гарантируется и между воркерами.
+    """
+    lock_dir = LOCKS_DIR if SINGLEFLIGHT_FILE_LOCK else None
+    async with optional_lock(lock_dir, topic_slug, SINGLEFLIGHT_LOCK_TIMEOUT):
+        # Пока мы ждали блокировку, другой воркер мог уже сохранить объяснение
+        if lock_dir is not None:
+            existing_data = await load_explanation_from_file(topic_slug)
+            if existing_data:
+                logger.info(f"Cache hit after cross-worker lock for slug: {topic_slug}")
+                return existing_data.explanation_text, topic_slug
+        return await _generate_explanation_unlocked(request, topic_slug)
+
+
+async def _generate_explanation_unlocked(request: ExplainRequest, topic_slug: str) -> tuple[str, Optional[str]]:
+    """Генерация и валидация без блокировок (см. _generate_and_save_explanation)."""
     # Генерация и Валидация
     logger.info(f"Cache miss: Generating explanation for topic: {request.topic}, level: {request.level}")
     explanation_text = None
-    generation_error = None
+    generation_error = None  # Исключение при генерации: не кешируется, следующий запрос попробует снова
+    validation_error = None
     is_valid_for_saving = False
 
     try:
-        explanation_text = generate_ai_explanation(request)  # Используем улучшенную функцию
-
-        # --- Улучшенная валидация ---
-        error_indicators = [
-            "извините", "не удалось", "ошибка", "не могу", "ограничений безопасности",
-            "невозможно обработать", "сервис недоступен", "api key not valid",
-            "произошла ошибка"  # Добавляем общие фразы
-        ]
-        min_length_threshold = {  # Разная минимальная длина для разных типов
-            "tldr": 15,
-            "5-year-old": 30,
-            "default": 50
-        }
-        min_len = min_length_threshold.get(request.level, min_length_threshold["default"])
-
-        if not explanation_text:
-            logger.warning(f"Validation failed: Empty response for topic: {request.topic}")
-            generation_error = "AI вернул пустой ответ."
-        elif len(explanation_text) < min_len:
-            logger.warning(
-                f"Validation failed: Response too short ({len(explanation_text)} < {min_len} chars) for level '{request.level}', topic: {request.topic}")
-            # Не сохраняем, но можем вернуть пользователю короткий ответ
-        elif any(indicator in explanation_text.lower() for indicator in error_indicators):
-            logger.warning(
-                f"Validation failed: Response contains error indicators for topic: {request.topic}. Text: {explanation_text[:100]}...")
-            # Не сохраняем, возвращаем пользователю текст ошибки
-        else:
-            is_valid_for_saving = True
-            logger.info(f"Validation passed for topic: {request.topic}. Explanation is valid for saving.")
-            # --- Конец улучшенной валидации ---
-
+        with explain_stage_seconds.time(stage="generate"):
+            explanation_text = await generate_ai_explanation(request)  # Генерация не блокирует event loop
+        with explain_stage_seconds.time(stage="validate"):
+            is_valid_for_saving, validation_error = validate_explanation(request, explanation_text)
+    except GenerationOverloadedError:
+        raise  # Перегрузку отдаем наверх как есть: эндпоинт ответит 503 с Retry-After
     except ConnectionError as e:
         logger.error(f"ConnectionError during generation: {e}")
         generation_error = f"Ошибка подключения к сервису AI: {e}"
@@ -236,107 +643,261 @@ async def get_or_create_explanation(request: ExplainRequest) -> tuple[str, Optio
         generation_error = "Произошла внутренняя ошибка при генерации объяснения."
 
     if is_valid_for_saving and explanation_text:
-        # 5. Генерируем метаданные
-        meta_title = f"Как понять '{request.topic[:40]}' простыми словами | ПростоПонятно.ai"
-        sentences = explanation_text.split('.')
-        meta_description = (sentences[0] + '.').strip()
-        if len(sentences) > 1:
-            meta_description += (' ' + sentences[1] + '.').strip()
-        meta_description = meta_description[:160].rsplit(' ', 1)[0] + '...'
-
-        # 6. Готовим данные для сохранения
-        stored_data = StoredExplanation(
-            topic_raw=request.topic,
-            slug=topic_slug,
-            level=request.level,
-            analogy=request.analogy,
-            explanation_text=explanation_text,
-            meta_title=meta_title,
-            meta_description=meta_description,
-            created_at=datetime.datetime.now(datetime.timezone.utc)
-        )
-
-        # 7. Сохраняем в файл (асинхронно)
-        await save_explanation_to_file(stored_data)  # Сохранение происходит ТОЛЬКО здесь
-
-        # 8. Возвращаем успешный результат и slug
+        with explain_stage_seconds.time(stage="save"):
+            await store_generated_explanation(request, topic_slug, explanation_text)  # Сохранение происходит ТОЛЬКО здесь
         return explanation_text, topic_slug
     else:
-        # 9. Если НЕ валидно для сохранения ИЛИ была ошибка генерации
+        # Если НЕ валидно для сохранения ИЛИ была ошибка генерации
         logger.warning(
             f"Explanation for topic '{request.topic}' (level: {request.level}) will NOT be saved. Valid: {is_valid_for_saving}")
-        final_text_to_return = generation_error if generation_error else (
-                explanation_text or "Не удалось получить ответ.")
+        if generation_error:
+            return generation_error, None
+        final_text_to_return = validation_error or explanation_text or "Не удалось получить ответ."
+        # Тот же запрос почти наверняка снова не пройдет проверку - не платим за повтор
+        negative_cache.put(topic_slug, classify_failure(request, explanation_text), final_text_to_return)
         return final_text_to_return, None
 
 
-# --- Новая функция для поиска по файлам ---
+async def stream_explanation(request: ExplainRequest, client_id: Optional[str] = None) -> AsyncIterator[tuple[str, dict]]:
+    """
+    Потоковый вариант get_or_create_explanation для SSE. Отдает события (тип, данные):
+    - "start" - слот генерации получен, генерация началась;
+    - "chunk" - очередной фрагмент текста: {"text": ...};
+    - "done"  - итог: {"explanation": ..., "slug": ...}, slug=None если текст не сохранен.
+    Первое событие отдается только после проверки кеша и получения слота в пуле,
+    поэтому GenerationOverloadedError/RateLimitedError/ConnectionError выбрасываются до начала ответа.
+    Сохраняется только полный текст, прошедший validate_explanation.
+    """
+    with explain_stage_seconds.time(stage="resolve"):
+        topic_slug = await resolve_topic_slug(request)
+
+    with explain_stage_seconds.time(stage="cache_lookup"):
+        existing_data = await load_explanation_from_file(topic_slug)
+    if existing_data:
+        logger.info(f"Cache hit (stream): Found existing explanation for slug: {topic_slug}")
+        explain_requests_total.inc(endpoint="stream", result="hit")
+        schedule_refresh_if_stale(existing_data)
+        yield "done", {"explanation": existing_data.explanation_text, "slug": topic_slug,
+                       "explanation_html": existing_data.explanation_html}
+        return
+
+    negative_entry = negative_cache.get(topic_slug)
+    if negative_entry:
+        logger.info(f"Negative cache hit (stream, {negative_entry.failure_class}) for slug: {topic_slug}")
+        explain_requests_total.inc(endpoint="stream", result="negative")
+        yield "done", {"explanation": negative_entry.message, "slug": None}
+        return
+
+    if not explanation_flight.is_running(topic_slug):
+        await rate_limiter.check(client_id, "generate")
+    explain_requests_total.inc(endpoint="stream", result="miss")
+    relay = stream_relays.get(topic_slug)
+    if relay is None and explanation_flight.is_running(topic_slug):
+        # То же объяснение уже генерирует обычный запрос - ждем его, а не запускаем вторую генерацию
+        explanation_text, slug = await explanation_flight.do(
+            topic_slug, lambda: _generate_and_save_explanation(request, topic_slug))
+        stored_data = await load_explanation_from_file(slug) if slug else None
+        yield "done", {"explanation": explanation_text, "slug": slug,
+                       "explanation_html": stored_data.explanation_html if stored_data else None}
+        return
+
+    if relay is None:
+        relay = StreamRelay()
+        stream_relays[topic_slug] = relay
+        flight = explanation_flight.start(topic_slug, lambda: _stream_and_save_explanation(request, topic_slug, relay))
+    else:
+        # Та же потоковая генерация уже идет: relay перешлет и уже полученные фрагменты
+        flight = explanation_flight.start(topic_slug, lambda: _generate_and_save_explanation(request, topic_slug))
+    # Генерация идет в задаче explanation_flight, здесь только пересылаем ее фрагменты.
+    # Если клиент отключится, генерация продолжится для остальных и результат будет сохранен
+    async for event, data in relay.subscribe():
+        yield event, data
+    explanation_text, slug = await asyncio.shield(flight)
+    stored_data = await load_explanation_from_file(slug) if slug else None
+    yield "done", {"explanation": explanation_text, "slug": slug,
+                   "explanation_html": stored_data.explanation_html if stored_data else None}
+
+
+async def _stream_and_save_explanation(request: ExplainRequest, topic_slug: str,
+                                       relay: StreamRelay) -> tuple[str, Optional[str]]:
+    """
+    Потоковый вариант _generate_and_save_explanation: фрагменты публикуются в relay по мере генерации.
+    Выполняется как задача explanation_flight, поэтому обычные запросы того же slug присоединяются к ней
+    и получают итоговый (текст, slug): на slug приходится одна генерация на оба эндпоинта.
+    """
+    lock_dir = LOCKS_DIR if SINGLEFLIGHT_FILE_LOCK else None
+    try:
+        async with optional_lock(lock_dir, topic_slug, SINGLEFLIGHT_LOCK_TIMEOUT):
+            if lock_dir is not None:
+                existing_data = await load_explanation_from_file(topic_slug)
+                if existing_data:
+                    logger.info(f"Cache hit after cross-worker lock (stream) for slug: {topic_slug}")
+                    return existing_data.explanation_text, topic_slug
+            return await _stream_explanation_unlocked(request, topic_slug, relay)
+    finally:
+        # Убираем relay до того, как explanation_flight забудет задачу: новый запрос запустит новую генерацию
+        stream_relays.pop(topic_slug, None)
+        relay.close()
+
+
+async def _stream_explanation_unlocked(request: ExplainRequest, topic_slug: str,
+                                       relay: StreamRelay) -> tuple[str, Optional[str]]:
+    """Потоковая генерация и валидация без блокировок (см. _stream_and_save_explanation)."""
+    if not get_genai_client():
+        raise ConnectionError("Google GenAI client not configured or API key missing.")
+
+    full_prompt = build_explanation_prompt(request)
+    logger.info(f"Cache miss (stream): Generating explanation for topic: {request.topic}, level: {request.level}")
+
+    explanation_text = None
+    genai_client.ensure_available()
+    queued_at = time.perf_counter()
+    async with generation_pool.slot():
+        generation_queue_wait_seconds.observe(time.perf_counter() - queued_at)
+        relay.publish("start", {})
+        try:
+            with genai_timer("stream") as outcome:
+                chunks = []
+                last_chunk = None
+                async for chunk in await genai_client.generate_content_stream(model=model_id, contents=full_prompt):
+                    last_chunk = chunk
+                    if chunk.text:
+                        chunks.append(chunk.text)
+                        relay.publish("chunk", {"text": chunk.text})
+                explanation_text = "".join(chunks).strip()
+                # Причина остановки/блокировки приходит в последнем фрагменте
+                error_text = _response_error_text(last_chunk) if last_chunk is not None else None
+                if error_text:
+                    explanation_text = error_text
+                outcome["value"] = "blocked" if error_text else "ok"
+        except Exception as e:
+            logger.error(f"Error streaming content via GenAI: {e}", exc_info=True)
+            return UPSTREAM_ERROR_TEXT, None
+
+    is_valid_for_saving, validation_error = validate_explanation(request, explanation_text)
+    if is_valid_for_saving:
+        with explain_stage_seconds.time(stage="save"):
+            await store_generated_explanation(request, topic_slug, explanation_text)
+        return explanation_text, topic_slug
+    logger.warning(f"Streamed explanation for topic '{request.topic}' (level: {request.level}) will NOT be saved.")
+    final_text_to_return = validation_error or explanation_text or "Не удалось получить ответ."
+    negative_cache.put(topic_slug, classify_failure(request, explanation_text), final_text_to_return)
+    return final_text_to_return, None
+
+
+# --- Фоновое обновление устаревших объяснений (stale-while-revalidate) ---
+
+def is_stale(explanation: StoredExplanation) -> bool:
+    """
+    Текст сгенерирован старой версией промпта или старше REFRESH_MAX_AGE_DAYS.
+    Порог возраста сдвигается на долю REFRESH_AGE_JITTER, постоянную для slug, чтобы объяснения,
+    сохраненные в один день, не устаревали одновременно. Записи без prompt_version считаются версией 1.
+    """
+    if (explanation.prompt_version or 1) < PROMPT_VERSION:
+        return True
+    if REFRESH_MAX_AGE_DAYS <= 0:
+        return False
+    spread = (zlib.crc32(explanation.slug.encode("utf-8")) % 1000) / 1000
+    max_age = datetime.timedelta(days=REFRESH_MAX_AGE_DAYS * (1 + REFRESH_AGE_JITTER * spread))
+    refreshed_at = explanation.updated_at or explanation.created_at
+    if refreshed_at.tzinfo is None:
+        refreshed_at = refreshed_at.replace(tzinfo=datetime.timezone.utc)
+    return datetime.datetime.now(datetime.timezone.utc) - refreshed_at > max_age
+
+
+def schedule_refresh_if_stale(explanation: StoredExplanation):
+    """Ставит устаревшее объяснение в очередь фонового обновления; сохраненная копия отдается как есть."""
+    if background_refresher.running and is_stale(explanation):
+        if background_refresher.schedule(explanation.slug):
+            logger.info(f"Scheduled background refresh for slug: {explanation.slug}")
+
+
+async def refresh_explanation(slug: str) -> str:
+    """
+    Генерирует новый текст для сохраненного объяснения (вызывается воркером background_refresher).
+    Запись заменяется целиком, только если новый текст прошел validate_explanation и запись
+    не изменилась за время генерации; иначе остается старая копия. Возвращает исход для статистики.
+    """
+    record = await storage.read(slug)
+    if record is None:
+        return "missing"
+    old = record.explanation
+    if not is_stale(old):
+        return "fresh"
+    request = ExplainRequest(topic=old.topic_raw, level=old.level, analogy=old.analogy)
+
+    lock_dir = LOCKS_DIR if SINGLEFLIGHT_FILE_LOCK else None
+    async with optional_lock(lock_dir, slug, SINGLEFLIGHT_LOCK_TIMEOUT):
+        if await storage.get_mtime(slug) != record.mtime:
+            return "superseded"  # Пока ждали блокировку, запись обновил другой воркер
+        try:
+            explanation_text = await generate_ai_explanation(request)
+        except GenerationOverloadedError:
+            return "deferred"  # Пул занят пользовательскими запросами - попробуем при следующем обращении
+        is_valid, _ = validate_explanation(request, explanation_text)
+        if not is_valid:
+            logger.warning(f"Background refresh of '{slug}' produced invalid text, keeping the stored copy")
+            return "invalid"
+        if await storage.get_mtime(slug) != record.mtime:
+            return "superseded"
+
+        refreshed = old.model_copy(update={
+            "explanation_text": explanation_text,
+            "explanation_html": render_markdown(explanation_text),
+            "meta_description": build_meta_description(explanation_text),
+            "updated_at": datetime.datetime.now(datetime.timezone.utc),
+            "prompt_version": PROMPT_VERSION,
+        })
+        await save_explanation_to_file(refreshed)
+    logger.info(f"Background refresh of '{slug}' finished")
+    return "refreshed"
+
+
+# --- Поиск ---
+
 async def search_explanations(query: str, limit: int = 10) -> List[SearchResultItem]:
     """
-    Асинхронно ищет по JSON файлам объяснений.
-    Ищет вхождение query (case-insensitive) в topic_raw или начале explanation_text.
+    Ищет вхождение query (case-insensitive) в topic_raw или начале explanation_text
+    через поиск хранилища (триграммный индекс или SQLite FTS5). Совпадения в теме идут первыми.
     """
     query_lower = query.lower().strip()
     if not query_lower or len(query_lower) < 3:  # Не ищем слишком короткие запросы
         return []
 
-    logger.info(f"Starting search for query: '{query}'")
-    # Получаем список всех JSON файлов асинхронно
-    try:
-        all_files = [f for f in EXPLANATIONS_DIR.glob("*.json")]
-    except Exception as e:
-        logger.error(f"Error listing explanation files: {e}")
-        return []
+    with search_seconds.time(kind="search"):
+        matched_docs = await storage.search(query_lower, limit=limit)
 
-    # Создаем задачи для чтения и проверки каждого файла
-    tasks = [load_and_check_file(filepath, query_lower) for filepath in all_files]
+    logger.info(f"Search finished. Found {len(matched_docs)} matches for query: '{query}'.")
+    return [SearchResultItem(topic=doc.topic, slug=doc.slug) for doc in matched_docs]
 
-    # Запускаем задачи конкурентно
-    checked_results = await asyncio.gather(*tasks)
 
-    # Отфильтровываем None (файлы, которые не подошли или не прочитались)
-    # Сортируем по релевантности (сначала те, где совпадение в заголовке)
-    matched_items = sorted(
-        [res for res in checked_results if res is not None],
-        key=lambda item: 0 if query_lower in item.topic.lower() else 1  # Приоритет совпадению в теме
-    )
+async def suggest_topics(prefix: str, limit: int = 8) -> List[SearchResultItem]:
+    """Подсказки для поля поиска по началу слов темы (только память, без чтения объяснений)."""
+    with search_seconds.time(kind="suggest"):
+        await storage.sync()  # Подхватываем объяснения, сохраненные другими воркерами
+        suggestions = suggest_index.suggest(prefix, limit=limit)
+    return [SearchResultItem(topic=topic, slug=slug) for slug, topic in suggestions]
 
-    logger.info(f"Search finished. Found {len(matched_items)} potential matches for query: '{query}'.")
-    return matched_items[:limit]  # Возвращаем только топ N результатов
 
+def record_explanation_view(slug: str):
+    """Учитывает просмотр объяснения для ранжирования подсказок по популярности."""
+    suggest_index.record_hit(slug)
+
+
+async def sync_storage():
+    """Подхватывает объяснения, сохраненные другими воркерами (подписчики узнают об изменениях)."""
+    await storage.sync()
 
-async def load_and_check_file(filepath: Path, query_lower: str) -> Optional[SearchResultItem]:
-    """Вспомогательная функция для чтения одного файла и проверки совпадения."""
-    try:
-        async with aiofiles.open(filepath, mode='r', encoding='utf-8') as f:
-            content = await f.read()
-            data = json.loads(content)
-            data["created_at"] = datetime.datetime.fromisoformat(data['created_at']) if isinstance(data.get('created_at'), str) else data.get('created_at')
-            explanation_data = StoredExplanation(
-                **data,
-            )
-
-            # Проверка совпадения (в теме ИЛИ в начале текста)
-            topic_match = query_lower in explanation_data.topic_raw.lower()
-            text_match = query_lower in explanation_data.explanation_text[:500].lower()  # Ищем в первых 500 символах
-
-            if topic_match or text_match:
-                return SearchResultItem(
-                    topic=explanation_data.topic_raw,
-                    slug=explanation_data.slug
-                )
-            return None
-    except Exception as e:
-        logger.error(f"Error processing file {filepath} during search: {e}")
-        return None
+
+async def list_sitemap_entries(after_slug: str, limit: int) -> list[tuple[str, str]]:
+    """Пачка (slug, created_at) для sitemap по возрастанию slug, начиная со следующего за after_slug."""
+    return await storage.list_sitemap_entries(after_slug, limit)
 
 
 async def get_all_explanation_slugs() -> list[str]:
-    """Получает список всех slug'ов из папки explanations."""
-    slugs = []
+    """Получает список всех slug'ов из хранилища."""
     try:
-        for filepath in EXPLANATIONS_DIR.glob("*.json"):
-            slugs.append(filepath.stem)
+        return await storage.list_slugs()
     except Exception as e:
         logger.error(f"Error listing slugs for sitemap: {e}")
-    return slugs
+        return []
@@ -16,14 +16,9 @@ document.addEventListener('DOMContentLoaded', () => {
     const searchInput = document.getElementById('search-input');
     const searchResultsContainer = document.getElementById('search-results');
 
-    // --- Инициализация markdown-it ---
-    const md = window.markdownit({
-        html: false, linkify: true, typographer: true,
-        highlight: function (str, lang) {
-            if (lang && hljs.getLanguage(lang)) {
-                try { return '<pre class="hljs"><code>' + hljs.highlight(str, { language: lang, ignoreIllegals: true }).value + '</code></pre>'; } catch (__) {}
-            } return '<pre class="hljs"><code>' + md.utils.escapeHtml(str) + '</code></pre>'; }
-    });
+    // --- Инициализация markdown-it (только для черновика во время стриминга) ---
+    // Итоговый HTML с подсветкой кода приходит с сервера в explanation_html
+    const md = window.markdownit({ html: false, linkify: true, typographer: true });
 
     // --- Логика формы объяснений ---
     levelSelect?.addEventListener('change', () => {
@@ -61,40 +56,22 @@ document.addEventListener('DOMContentLoaded', () => {
          }
 
         try {
-            const response = await fetch('/api/explain', { /* ... как раньше ... */
-                 method: 'POST', headers: {'Content-Type': 'application/json','Accept': 'application/json'},
+            // Потоковый режим: текст рендерится по мере генерации (SSE поверх fetch, т.к. EventSource не умеет POST)
+            const response = await fetch('/api/explain/stream', {
+                 method: 'POST', headers: {'Content-Type': 'application/json','Accept': 'text/event-stream'},
                  body: JSON.stringify(formData)
             });
 
-            loadingIndicator.style.display = 'none';
-            resetButton();
-
             if (!response.ok) { /* ... Обработка ошибок ответа ... */
+                 loadingIndicator.style.display = 'none';
+                 resetButton();
                  let errorDetail = `Ошибка ${response.status}. Попробуйте позже.`;
                  try { const errorData = await response.json(); errorDetail = errorData.detail || errorDetail;} catch (e) {}
                  showError(errorDetail); return;
             }
 
-            const data = await response.json();
-
-            if (data.explanation) {
-                // Проверяем, не является ли ответ сообщением об ошибке (если slug == null)
-                if (!data.slug) {
-                    showError("Не удалось сгенерировать качественное объяснение. Ответ: " + data.explanation);
-                } else {
-                    const htmlContent = md.render(data.explanation);
-                    explanationOutput.innerHTML = htmlContent;
-                    addCopyButtons(explanationOutput); // Добавляем кнопки копирования
-                    resultArea.style.display = 'block';
-                    errorArea.style.display = 'none'; // Прячем ошибку при успехе
-
-                    const linkUrl = `/explanation/${data.slug}`;
-                    explanationLink.href = linkUrl;
-                    explanationLinkContainer.style.display = 'block';
-                }
-            } else {
-                 showError("Получен пустой ответ от сервера.");
-            }
+            await readExplanationStream(response);
+            resetButton();
 
         } catch (error) { /* ... Обработка ошибок сети ... */
              console.error("Fetch error:", error);
@@ -104,6 +81,84 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
 
+    // --- Чтение SSE потока и прогрессивный рендеринг Markdown ---
+    async function readExplanationStream(response) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let markdownText = '';
+        let renderScheduled = false;
+        let finished = false;
+
+        const scheduleRender = () => { // Рендерим не чаще одного раза за кадр
+            if (renderScheduled) return;
+            renderScheduled = true;
+            requestAnimationFrame(() => {
+                renderScheduled = false;
+                if (!finished) explanationOutput.innerHTML = md.render(markdownText);
+            });
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let separatorIndex;
+            while ((separatorIndex = buffer.indexOf('\n\n')) !== -1) {
+                const rawEvent = buffer.slice(0, separatorIndex);
+                buffer = buffer.slice(separatorIndex + 2);
+
+                let eventName = 'message';
+                let dataText = '';
+                rawEvent.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                    else if (line.startsWith('data:')) dataText += line.slice(5).trim();
+                });
+                const data = dataText ? JSON.parse(dataText) : {};
+
+                if (eventName === 'chunk') {
+                    if (!markdownText) { // Первый фрагмент: вместо спиннера показываем текст
+                        loadingIndicator.style.display = 'none';
+                        resultArea.style.display = 'block';
+                    }
+                    markdownText += data.text;
+                    scheduleRender();
+                } else if (eventName === 'done') {
+                    finished = true;
+                    showFinalExplanation(data);
+                    return;
+                } else if (eventName === 'error') {
+                    finished = true;
+                    showError(data.detail || 'Ошибка при генерации объяснения.');
+                    return;
+                }
+            }
+        }
+        showError("Соединение прервано до завершения генерации.");
+    }
+
+    function showFinalExplanation(data) {
+        loadingIndicator.style.display = 'none';
+        if (!data.explanation) {
+            showError("Получен пустой ответ от сервера.");
+            return;
+        }
+        // Проверяем, не является ли ответ сообщением об ошибке (если slug == null)
+        if (!data.slug) {
+            showError("Не удалось сгенерировать качественное объяснение. Ответ: " + data.explanation);
+            return;
+        }
+        explanationOutput.innerHTML = data.explanation_html || md.render(data.explanation);
+        addCopyButtons(explanationOutput); // Добавляем кнопки копирования
+        resultArea.style.display = 'block';
+        errorArea.style.display = 'none'; // Прячем ошибку при успехе
+
+        const linkUrl = `/explanation/${data.slug}`;
+        explanationLink.href = linkUrl;
+        explanationLinkContainer.style.display = 'block';
+    }
+
     function showError(message) { /* ... как раньше ... */
         errorMessage.textContent = message;
         errorArea.style.display = 'block';
@@ -138,34 +193,56 @@ document.addEventListener('DOMContentLoaded', () => {
 
 
     // --- Логика Поиска ---
+    // Сначала спрашиваем быстрые подсказки (/api/suggest, по началу слов темы),
+    // и только если их нет - полнотекстовый поиск (/api/search).
     let searchTimeout;
+    const suggestCache = new Map(); // query -> results, чтобы не повторять запросы при стирании символов
+
+    async function fetchResults(url) {
+        const response = await fetch(url);
+        if (!response.ok) {
+            console.error("Search API error:", response.statusText);
+            return null;
+        }
+        const data = await response.json();
+        return data.results;
+    }
 
     searchInput?.addEventListener('input', () => {
         clearTimeout(searchTimeout); // Отменяем предыдущий таймаут
         const query = searchInput.value.trim();
 
-        if (query.length < 3) {
+        if (query.length < 2) {
             searchResultsContainer.style.display = 'none'; // Скрываем результаты если запрос короткий
             searchResultsContainer.innerHTML = '';
             return;
         }
 
+        if (suggestCache.has(query)) {
+            displaySearchResults(suggestCache.get(query));
+            return;
+        }
+
         // Запускаем поиск с задержкой (debouncing)
         searchTimeout = setTimeout(async () => {
             try {
-                const response = await fetch(`/api/search?q=${encodeURIComponent(query)}`);
-                if (!response.ok) {
-                    console.error("Search API error:", response.statusText);
+                let results = await fetchResults(`/api/suggest?q=${encodeURIComponent(query)}`);
+                if (results !== null && results.length === 0 && query.length >= 3) {
+                    results = await fetchResults(`/api/search?q=${encodeURIComponent(query)}`);
+                }
+                if (results === null) {
                     searchResultsContainer.style.display = 'none';
                     return;
                 }
-                const data = await response.json();
-                displaySearchResults(data.results);
+                suggestCache.set(query, results);
+                if (searchInput.value.trim() === query) { // Пока ждали ответ, пользователь мог продолжить ввод
+                    displaySearchResults(results);
+                }
             } catch (error) {
                 console.error("Search fetch error:", error);
                 searchResultsContainer.style.display = 'none';
             }
-        }, 300); // Задержка 300 мс
+        }, 120); // Подсказки отвечают из памяти, поэтому задержка короткая
     });
 
     // Скрываем результаты поиска при клике вне поля и результатов
@@ -184,7 +261,7 @@ document.addEventListener('DOMContentLoaded', () => {
      });
      // Показываем при фокусе, если есть текст
      searchInput?.addEventListener('focus', () => {
-         if (searchInput.value.trim().length >= 3 && searchResultsContainer.innerHTML !== '') {
+         if (searchInput.value.trim().length >= 2 && searchResultsContainer.innerHTML !== '') {
               searchResultsContainer.style.display = 'block';
           }
      });
@@ -207,13 +284,4 @@ document.addEventListener('DOMContentLoaded', () => {
         searchResultsContainer.style.display = 'block'; // Показываем контейнер
     }
 
-     // --- Рендеринг Markdown на странице объяснения (если мы на ней) ---
-     const rawMarkdownEl = document.getElementById('raw-markdown');
-     const explanationContentEl = document.getElementById('explanation-content');
-     if (rawMarkdownEl && explanationContentEl) {
-          const markdownText = rawMarkdownEl.textContent;
-         explanationContentEl.innerHTML = md.render(markdownText);
-          addCopyButtons(explanationContentEl);
-      }
-
 });
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""
+Синтетический корпус объяснений для бенчмарков: детерминированный по seed,
+в том же формате, что пишет приложение (JSON файлы или SQLite).
+"""
+import datetime
+import random
+from pathlib import Path
+from typing import Iterator
+
+from app.core.config import ALIASES_PATH, JSON_STORAGE_COMPRESSION, SEARCH_INDEX_PATH
+from app.core.normalization import canonical_key
+from app.core.record_format import encode_record, write_record_file
+from app.core.rendering import render_markdown
+from app.core.storage import JsonFileStorage, SQLiteStorage, explanation_to_dict
+from models import StoredExplanation
+
+LEVELS = ["simple", "teenager", "5-year-old", "tldr", "pros_cons", "metaphor"]
+WORDS = ("квантовый атом энергия клетка рынок инфляция алгоритм сеть звезда галактика белок ген вирус "
+         "иммунитет налог кредит валюта двигатель электричество магнит свет волна частица поле "
+         "история революция империя философия логика язык память сон эмоция мозг обучение модель "
+         "фотосинтез гравитация эволюция блокчейн нейрон вулкан климат океан бактерия метаболизм").split()
+PARAGRAPHS = [
+    "## Суть\n\n{topic} - это явление, которое проще всего понять через повседневный опыт. "
+    "Представьте {w1} и {w2}: между ними есть связь, и именно она объясняет главное.",
+    "### Как это работает\n\n- Сначала появляется {w1}.\n- Затем {w2} меняет состояние системы.\n"
+    "- В итоге мы наблюдаем {w3} и можем его измерить.",
+    "Важно помнить, что {topic} не существует отдельно: это часть большой картины, "
+    "в которой {w3} и {w1} влияют друг на друга. **Ключевая мысль** - взаимодействие важнее деталей.",
+    "```python\n# Модель в одну строку\nresult = '{w1}' + ' -> ' + '{w2}'\nprint(result)\n```",
+    "> {topic}: если объяснить это ребенку, он поймет, что {w2} похож на {w3}.",
+]
+
+
+def random_topic(rng: random.Random, index: int) -> str:
+    words = " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+    return f"{words.capitalize()} {index}"
+
+
+def random_text(rng: random.Random, topic: str) -> str:
+    paragraphs = rng.sample(PARAGRAPHS, k=rng.randint(3, len(PARAGRAPHS)))
+    return "\n\n".join(p.format(topic=topic, w1=rng.choice(WORDS), w2=rng.choice(WORDS), w3=rng.choice(WORDS))
+                       for p in paragraphs)
+
+
+def generate_explanations(count: int, seed: int) -> Iterator[StoredExplanation]:
+    rng = random.Random(seed)
+    started = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    for i in range(count):
+        topic, level = random_topic(rng, i), rng.choice(LEVELS)
+        text = random_text(rng, topic)
+        yield StoredExplanation(
+            topic_raw=topic,
+            slug=canonical_key(topic, level, None),
+            level=level,
+            explanation_text=text,
+            explanation_html=render_markdown(text),
+            meta_title=f"Как понять '{topic[:40]}' простыми словами | ПростоПонятно.ai",
+            meta_description=text[:157] + "...",
+            created_at=started + datetime.timedelta(minutes=i),
+            prompt_version=1,
+        )
+
+
+async def write_corpus(backend: str, directory: Path, sqlite_path: Path, count: int, seed: int) -> list[str]:
+    """Записывает count объяснений в хранилище; возвращает их slug'и."""
+    directory.mkdir(parents=True, exist_ok=True)
+    slugs = []
+    if backend == "sqlite":
+        storage = SQLiteStorage(sqlite_path)
+        await storage.init()
+        batch = []
+        for explanation in generate_explanations(count, seed):
+            slugs.append(explanation.slug)
+            batch.append(explanation)
+            if len(batch) >= 1000:
+                await storage.write_many(batch)
+                batch = []
+        if batch:
+            await storage.write_many(batch)
+        await storage.close()
+        return slugs
+
+    storage = JsonFileStorage(directory, SEARCH_INDEX_PATH, ALIASES_PATH, compression=JSON_STORAGE_COMPRESSION)
+    for explanation in generate_explanations(count, seed):
+        slugs.append(explanation.slug)
+        write_record_file(storage.get_filepath(explanation.slug),
+                          encode_record(explanation_to_dict(explanation), storage.compression))
+    return slugs
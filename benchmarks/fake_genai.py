@@ -0,0 +1,91 @@
+"""
+Встраиваемая заглушка клиента Google GenAI для бенчмарков и нагрузочных тестов без сети.
+Подменяет services.client: генерирует ответ с заданным распределением задержки и доли ошибок.
+
+    import fake_genai, services
+    services.client = fake_genai.FakeGenAIClient(latency_ms=300, error_rate=0.05, seed=1)
+"""
+import asyncio
+import random
+import types
+from collections import Counter
+from typing import Optional
+
+from google.genai import errors as genai_errors
+from google.genai.types import Candidate, Content, FinishReason, GenerateContentResponse, Part
+
+FAKE_TEXT = (
+    "## Простое объяснение\n\n"
+    "Это подробное тестовое объяснение темы «{topic}». Оно достаточно длинное, чтобы пройти проверку "
+    "качества, и содержит немного **Markdown** разметки.\n\n"
+    "- Первый ключевой пункт\n- Второй ключевой пункт\n\n"
+    "```python\nprint('пример кода')\n```\n"
+)
+
+
+def topic_from_prompt(prompt: str) -> str:
+    """Тема из промпта build_explanation_prompt ("Тема или вопрос: '...'.")."""
+    return prompt.split("Тема или вопрос: '", 1)[-1].split("'", 1)[0][:100]
+
+
+def fake_response(text: str, finish_reason: Optional[FinishReason] = FinishReason.STOP) -> GenerateContentResponse:
+    return GenerateContentResponse(candidates=[
+        Candidate(content=Content(parts=[Part(text=text)], role="model"), finish_reason=finish_reason)])
+
+
+class _FakeModels:
+    def __init__(self, client: "FakeGenAIClient"):
+        self._client = client
+
+    async def generate_content(self, model: str, contents, config=None) -> GenerateContentResponse:
+        await self._client.simulate()
+        return fake_response(self._client.text_for(contents))
+
+    async def generate_content_stream(self, model: str, contents, config=None):
+        await self._client.simulate()
+        text = self._client.text_for(contents)
+        chunk_delay = self._client.chunk_ms / 1000
+
+        async def chunks():
+            parts = [text[i:i + 80] for i in range(0, len(text), 80)]
+            for i, part in enumerate(parts):
+                await asyncio.sleep(chunk_delay)
+                yield fake_response(part, FinishReason.STOP if i == len(parts) - 1 else None)
+        return chunks()
+
+
+class FakeGenAIClient:
+    """
+    Повторяет интерфейс genai.Client, который использует приложение (client.aio.models).
+    Задержка - latency_ms ± jitter, доля slow_rate ответов задерживается на slow_ms (хвост),
+    доля error_rate завершается APIError с кодом error_status. seed делает прогон воспроизводимым.
+    """
+
+    def __init__(self, latency_ms: float = 300, jitter: float = 0.3, slow_rate: float = 0.0, slow_ms: float = 5000,
+                 error_rate: float = 0.0, error_status: int = 503, chunk_ms: float = 20, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.chunk_ms = chunk_ms
+        self.random = random.Random(seed)
+        self.stats = Counter()
+        self.aio = types.SimpleNamespace(models=_FakeModels(self))
+
+    def text_for(self, contents) -> str:
+        return FAKE_TEXT.format(topic=topic_from_prompt(str(contents)))
+
+    async def simulate(self):
+        """Задержка и, с заданной вероятностью, ошибка сервиса."""
+        self.stats["requests"] += 1
+        latency = self.latency_ms * self.random.uniform(1 - self.jitter, 1 + self.jitter)
+        if self.random.random() < self.slow_rate:
+            self.stats["slow"] += 1
+            latency = self.slow_ms
+        await asyncio.sleep(latency / 1000)
+        if self.random.random() < self.error_rate:
+            self.stats["errors"] += 1
+            raise genai_errors.APIError(self.error_status, {
+                "error": {"code": self.error_status, "message": "Fake upstream error", "status": "UNAVAILABLE"}})
@@ -0,0 +1,94 @@
+"""
+Локальный фейковый сервер Gemini API (generateContent и streamGenerateContent) для проверки
+устойчивого клиента и нагрузочных тестов без обращения к настоящему AI.
+
+Запуск из корня проекта:
+    python benchmarks/fake_genai_server.py --port 8765 --latency-ms 300 --error-rate 0.1
+Приложение направляется на него через .env:
+    GENAI_BASE_URL=http://127.0.0.1:8765
+"""
+import argparse
+import asyncio
+import json
+import random
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from fake_genai import FAKE_TEXT, topic_from_prompt
+
+
+def build_app(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="Fake GenAI")
+    stats = {"requests": 0, "errors": 0, "slow": 0}
+
+    async def simulate(request: Request) -> tuple[str, JSONResponse | None]:
+        """Задержка и, с заданной вероятностью, ошибка. Возвращает (тема, ответ-ошибка или None)."""
+        stats["requests"] += 1
+        body = await request.json()
+        topic = topic_from_prompt(body["contents"][0]["parts"][0]["text"])
+
+        latency = args.latency_ms * random.uniform(1 - args.jitter, 1 + args.jitter)
+        if random.random() < args.slow_rate:
+            stats["slow"] += 1
+            latency = args.slow_ms
+        await asyncio.sleep(latency / 1000)
+
+        if random.random() < args.error_rate:
+            stats["errors"] += 1
+            error = {"error": {"code": args.error_status, "message": "Fake upstream error", "status": "UNAVAILABLE"}}
+            return topic, JSONResponse(error, status_code=args.error_status)
+        return topic, None
+
+    def response_json(text: str, finish_reason: str | None = "STOP") -> dict:
+        candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+        if finish_reason:
+            candidate["finishReason"] = finish_reason
+        return {"candidates": [candidate], "modelVersion": "fake"}
+
+    @app.post("/{api_version}/models/{model_action}")
+    async def generate(api_version: str, model_action: str, request: Request):
+        topic, error_response = await simulate(request)
+        if error_response is not None:
+            return error_response
+        text = FAKE_TEXT.format(topic=topic)
+
+        if model_action.endswith(":streamGenerateContent"):
+            async def events():
+                parts = [text[i:i + 80] for i in range(0, len(text), 80)]
+                for i, part in enumerate(parts):
+                    await asyncio.sleep(args.chunk_ms / 1000)
+                    finish = "STOP" if i == len(parts) - 1 else None
+                    yield f"data: {json.dumps(response_json(part, finish), ensure_ascii=False)}\r\n\r\n"
+            return StreamingResponse(events(), media_type="text/event-stream")
+        return JSONResponse(response_json(text))
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Фейковый Gemini API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Средняя задержка ответа")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Разброс задержки (доля от средней)")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Доля очень медленных ответов (хвост задержки)")
+    parser.add_argument("--slow-ms", type=float, default=5000, help="Задержка медленных ответов")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов с ошибкой")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP статус ошибки")
+    parser.add_argument("--chunk-ms", type=float, default=20, help="Пауза между фрагментами потока")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    uvicorn.run(build_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Бенчмарк семантического индекса: построение и задержка поиска на большом числе тем.
+
+Запуск из корня проекта (нужен numpy):
+    python benchmarks/semantic_lookup.py --entries 100000 --queries 1000
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT_DIR), str(ROOT_DIR / "app")]
+
+from app.core.semantic import SemanticIndex  # noqa: E402
+
+LEVELS = ["simple", "teenager", "5-year-old", "tldr", "pros_cons", "metaphor"]
+WORDS = ("квантовый атом энергия клетка рынок инфляция алгоритм сеть звезда галактика белок ген вирус "
+         "иммунитет налог кредит валюта двигатель электричество магнит свет волна частица поле "
+         "история революция империя философия логика язык память сон эмоция мозг обучение модель").split()
+
+
+def random_topic(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))) + f" {rng.randint(0, 10 ** 6)}"
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка поиска в SemanticIndex")
+    parser.add_argument("--entries", type=int, default=100_000, help="Сколько тем в индексе")
+    parser.add_argument("--queries", type=int, default=1000, help="Сколько поисковых запросов")
+    parser.add_argument("--dim", type=int, default=256, help="Размерность векторов (SEMANTIC_INDEX_DIM)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index = SemanticIndex(Path(tmp_dir) / "semantic_index.npz", dim=args.dim)
+
+        started = time.perf_counter()
+        for i in range(args.entries):
+            index.add(f"topic-{i}", random_topic(rng), rng.choice(LEVELS))
+        build_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index.save()
+        save_seconds = time.perf_counter() - started
+        file_mb = index.index_path.stat().st_size / 1024 / 1024
+
+        started = time.perf_counter()
+        loaded = SemanticIndex(index.index_path, dim=args.dim)
+        loaded.load()
+        load_seconds = time.perf_counter() - started
+
+        latencies = []
+        for _ in range(args.queries):
+            topic, level = random_topic(rng), rng.choice(LEVELS)
+            started = time.perf_counter()
+            loaded.lookup(topic, level, threshold=0.9)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    print(f"Entries: {args.entries}, dim: {args.dim}, levels: {len(LEVELS)}")
+    print(f"Build (incremental add): {build_seconds:.2f}s ({args.entries / build_seconds:,.0f} topics/s)")
+    print(f"Save: {save_seconds:.2f}s, load: {load_seconds:.2f}s, file: {file_mb:.1f} MB")
+    print(f"Lookup latency over {args.queries} queries: "
+          f"p50 {statistics.median(latencies):.3f} ms, p95 {percentile(latencies, 0.95):.3f} ms, "
+          f"p99 {percentile(latencies, 0.99):.3f} ms, max {max(latencies):.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
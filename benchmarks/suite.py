@@ -0,0 +1,294 @@
+"""
+Воспроизводимый набор бенчмарков приложения без сети и без настоящего AI.
+
+Для каждого размера корпуса (по умолчанию 1k/10k/100k объяснений) запускается отдельный процесс
+с EXPLANATIONS_DIR во временной папке: синтетический корпус, services.client заменен на
+FakeGenAIClient. Замеряются:
+- startup (построение индексов), load_explanation_from_file (холодный и из памяти),
+  search_explanations, suggest, /sitemap.xml и дочерний sitemap (холодные и из кеша),
+  рендеринг шаблона страницы и сборка сжатой страницы;
+- HTTP сценарий: смесь просмотров страниц, поиска и промахов кеша (генерация через заглушку)
+  с заданной конкурентностью, через ASGI без сокетов.
+Результат - JSON с p50/p95/p99 и пропускной способностью; --compare сравнивает с прошлым прогоном.
+
+Запуск из корня проекта:
+    python benchmarks/suite.py --sizes 1000,10000 --output bench.json
+    python benchmarks/suite.py --sizes 1000 --backend sqlite --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT_DIR), str(ROOT_DIR / "app")]
+
+SEARCH_QUERIES = ["атом", "энерг", "квантовый", "рынок", "клетка", "галакти", "память", "модель", "вулкан", "нейрон"]
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summarize(samples: list[float], wall_seconds: Optional[float] = None) -> dict:
+    """Длительности (секунды) -> перцентили в мс и пропускная способность (ops/s)."""
+    if not samples:
+        return {"count": 0}
+    total = wall_seconds if wall_seconds is not None else sum(samples)
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+        "max_ms": round(max(samples) * 1000, 3),
+        "ops_per_sec": round(len(samples) / total, 1) if total else None,
+    }
+
+
+async def measure(func, iterations: int) -> dict:
+    """Последовательно вызывает асинхронную func(i) iterations раз."""
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        await func(i)
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+# --- Прогон на одном корпусе (в отдельном процессе) ---
+
+async def run_benchmarks(args: argparse.Namespace) -> dict:
+    import logging
+    from starlette.requests import Request
+
+    import fake_genai
+    from corpus import write_corpus
+    from app.core.config import EXPLANATIONS_DIR, SQLITE_DB_PATH, STORAGE_BACKEND
+
+    started = time.perf_counter()
+    slugs = await write_corpus(STORAGE_BACKEND, EXPLANATIONS_DIR, SQLITE_DB_PATH, args.size, args.seed)
+    corpus_seconds = time.perf_counter() - started
+
+    import services
+    import main
+    logging.disable(logging.WARNING)  # Логи каждого запроса исказили бы замеры
+    services.client = fake_genai.FakeGenAIClient(latency_ms=args.latency_ms, jitter=args.jitter,
+                                                 slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+                                                 error_rate=args.error_rate, seed=args.seed)
+    rng = random.Random(args.seed)
+    results = {"size": args.size, "corpus_build_seconds": round(corpus_seconds, 2)}
+
+    started = time.perf_counter()
+    await services.startup()
+    results["startup_seconds"] = round(time.perf_counter() - started, 3)
+
+    sample = rng.sample(slugs, min(args.iterations, len(slugs)))
+
+    async def load_cold(i):
+        services.explanation_cache.invalidate(sample[i])
+        await services.load_explanation_from_file(sample[i])
+
+    async def load_warm(i):
+        await services.load_explanation_from_file(sample[i])
+
+    results["load_explanation_cold"] = await measure(load_cold, len(sample))
+    results["load_explanation_warm"] = await measure(load_warm, len(sample))
+    results["search_explanations"] = await measure(
+        lambda i: services.search_explanations(SEARCH_QUERIES[i % len(SEARCH_QUERIES)]), args.iterations)
+    results["suggest_topics"] = await measure(
+        lambda i: services.suggest_topics(SEARCH_QUERIES[i % len(SEARCH_QUERIES)][:3]), args.iterations)
+
+    scope = {"type": "http", "method": "GET", "path": "/", "root_path": "", "scheme": "http", "query_string": b"",
+             "headers": [(b"host", b"bench")], "server": ("bench", 80), "app": main.app, "router": main.app.router}
+    request = Request(scope)
+    explanations = [await services.load_explanation_from_file(slug) for slug in sample]
+
+    async def render(i):
+        main.render_explanation_page(request, explanations[i])
+
+    async def build_page(i):
+        html = main.render_explanation_page(request, explanations[i])
+        main.RenderedPage.build(html, "bench", last_modified=explanations[i].created_at)
+
+    results["template_render"] = await measure(render, len(explanations))
+    results["page_build_compressed"] = await measure(build_page, len(explanations))
+
+    import httpx
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        sitemap_iterations = max(3, args.iterations // 20)
+
+        async def sitemap_index_cold(_):
+            main.sitemap_cache.invalidate()
+            (await client.get("/sitemap.xml")).raise_for_status()
+
+        async def sitemap_page_cold(_):
+            main.sitemap_cache.invalidate()
+            (await client.get("/sitemap-1.xml")).raise_for_status()
+
+        results["sitemap_index_cold"] = await measure(sitemap_index_cold, sitemap_iterations)
+        results["sitemap_page_cold"] = await measure(sitemap_page_cold, sitemap_iterations)
+        results["sitemap_page_warm"] = await measure(lambda _: client.get("/sitemap-1.xml"), args.iterations)
+        results["http_mix"] = await run_http_mix(client, slugs, args, rng)
+
+    results["genai_calls"] = dict(services.client.stats)
+    await services.shutdown()
+    return results
+
+
+async def run_http_mix(client, slugs: list[str], args: argparse.Namespace, rng: random.Random) -> dict:
+    """
+    Смешанная нагрузка: просмотры страниц (популярные темы чаще - распределение Ципфа),
+    поиск и запросы новых тем (промах кеша -> генерация через заглушку).
+    """
+    kinds = rng.choices(["page", "search", "miss"], weights=[args.page_weight, args.search_weight, args.miss_weight],
+                        k=args.http_requests)
+    popular = slugs[:1000]
+    zipf_weights = [1 / (rank + 1) for rank in range(len(popular))]
+    pages = iter(rng.choices(popular, weights=zipf_weights, k=args.http_requests))
+    samples: dict[str, list[float]] = {"page": [], "search": [], "miss": []}
+    statuses: dict[str, dict[int, int]] = {"page": {}, "search": {}, "miss": {}}
+    queue = list(enumerate(kinds))
+
+    async def worker():
+        while queue:
+            i, kind = queue.pop()
+            started = time.perf_counter()
+            if kind == "page":
+                response = await client.get(f"/explanation/{next(pages)}", headers={"Accept-Encoding": "gzip, br"})
+            elif kind == "search":
+                response = await client.get("/api/search", params={"q": SEARCH_QUERIES[i % len(SEARCH_QUERIES)]})
+            else:
+                response = await client.post("/api/explain", json={"topic": f"Новая тема номер {i}", "level": "simple"})
+            samples[kind].append(time.perf_counter() - started)
+            statuses[kind][response.status_code] = statuses[kind].get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    wall = time.perf_counter() - started
+
+    result = {"concurrency": args.concurrency, "requests": args.http_requests,
+              "throughput_rps": round(args.http_requests / wall, 1),
+              "all": summarize([s for kind_samples in samples.values() for s in kind_samples])}
+    for kind, kind_samples in samples.items():
+        result[kind] = {**summarize(kind_samples), "statuses": statuses[kind]}
+    return result
+
+
+# --- Управляющий процесс ---
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_size(size: int, args: argparse.Namespace) -> dict:
+    """Запускает прогон на корпусе size в отдельном процессе с чистой временной папкой."""
+    with tempfile.TemporaryDirectory(prefix=f"bench-{size}-") as tmp_dir:
+        output = Path(tmp_dir) / "result.json"
+        env = {**os.environ,
+               "EXPLANATIONS_DIR": str(Path(tmp_dir) / "explanations"),
+               "SQLITE_DB_PATH": str(Path(tmp_dir) / "explanations.sqlite3"),
+               "STORAGE_BACKEND": args.backend,
+               "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY") or "benchmark",
+               "GENAI_BASE_URL": "",
+               "RATE_LIMIT_ENABLED": "false"}  # Весь трафик бенчмарка идет от одного клиента
+        command = [sys.executable, __file__, "--worker", "--size", str(size), "--worker-output", str(output)]
+        command += [arg for arg in sys.argv[1:] if arg != "--worker"]
+        subprocess.run(command, env=env, check=True)
+        return json.loads(output.read_text(encoding="utf-8"))
+
+
+def compare(previous: dict, current: dict):
+    """Печатает изменение p50/p95 по каждому замеру относительно прошлого прогона."""
+    print(f"\nComparison with {previous['meta'].get('revision')} ({previous['meta'].get('timestamp')}):")
+    for size, results in current["results"].items():
+        old_results = previous["results"].get(size)
+        if not old_results:
+            continue
+        print(f"  size {size}:")
+        for name, value in results.items():
+            old = old_results.get(name)
+            if not isinstance(value, dict) or not isinstance(old, dict):
+                continue
+            for sub_name, new_stats, old_stats in [(name, value, old)] + [
+                    (f"{name}.{key}", value[key], old.get(key)) for key in ("all", "page", "search", "miss")
+                    if isinstance(value.get(key), dict) and isinstance(old.get(key), dict)]:
+                if "p50_ms" not in new_stats or "p50_ms" not in (old_stats or {}):
+                    continue
+                deltas = [f"{q} {old_stats[q]:.3f} -> {new_stats[q]:.3f} ms "
+                          f"({(new_stats[q] - old_stats[q]) / old_stats[q] * 100 if old_stats[q] else 0:+.1f}%)"
+                          for q in ("p50_ms", "p95_ms")]
+                print(f"    {sub_name:32} " + ", ".join(deltas))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Бенчмарки ПростоПонятно.ai на синтетическом корпусе")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Размеры корпусов через запятую")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json", help="Хранилище (STORAGE_BACKEND)")
+    parser.add_argument("--iterations", type=int, default=500, help="Повторов каждого микро-бенчмарка")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Куда записать JSON с результатами (по умолчанию - только stdout)")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    http = parser.add_argument_group("HTTP сценарий")
+    http.add_argument("--http-requests", type=int, default=2000)
+    http.add_argument("--concurrency", type=int, default=32)
+    http.add_argument("--page-weight", type=float, default=0.75, help="Доля просмотров страниц")
+    http.add_argument("--search-weight", type=float, default=0.2, help="Доля поисковых запросов")
+    http.add_argument("--miss-weight", type=float, default=0.05, help="Доля запросов новых тем (генерация)")
+    fake = parser.add_argument_group("Заглушка GenAI")
+    fake.add_argument("--latency-ms", type=float, default=300)
+    fake.add_argument("--jitter", type=float, default=0.3)
+    fake.add_argument("--slow-rate", type=float, default=0.0)
+    fake.add_argument("--slow-ms", type=float, default=5000)
+    fake.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.worker:
+        results = asyncio.run(run_benchmarks(args))
+        Path(args.worker_output).write_text(json.dumps(results, ensure_ascii=False), encoding="utf-8")
+        return
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {key: value for key, value in vars(args).items()
+                     if key not in ("worker", "size", "worker_output", "output", "compare")},
+        },
+        "results": {},
+    }
+    for size in [int(size) for size in args.sizes.split(",") if size.strip()]:
+        print(f"Running benchmarks on {size} explanations ({args.backend})...", file=sys.stderr)
+        report["results"][str(size)] = run_size(size, args)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), report)
+
+
+if __name__ == "__main__":
+    main()
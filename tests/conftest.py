@@ -0,0 +1,77 @@
+"""
+Общие фикстуры тестов: приложение работает на временной папке объяснений,
+вместо Google GenAI подставлен benchmarks/fake_genai.FakeGenAIClient, сеть не нужна.
+
+Запуск из корня проекта:
+    pip install -r requirements-dev.txt
+    python -m pytest -q
+"""
+import asyncio
+import os
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT_DIR), str(ROOT_DIR / "app"), str(ROOT_DIR / "benchmarks")]
+
+# Настройки читаются при импорте app.core.config, поэтому задаются до импорта приложения
+EXPLANATIONS_DIR = Path(tempfile.mkdtemp(prefix="prostoponyatno-tests-"))
+os.environ.update({
+    "GOOGLE_API_KEY": "test",
+    "EXPLANATIONS_DIR": str(EXPLANATIONS_DIR),
+    "STORAGE_BACKEND": "json",
+    "JSON_STORAGE_COMPRESSION": "none",
+    "GENAI_MAX_RETRIES": "0",
+    # У каждого теста свой ключ клиента, чтобы лимиты одних тестов не влияли на другие
+    "RATE_LIMIT_API_KEYS": "single-flight,conditional-get,rate-limit,rate-limit-batch,negative-cache",
+})
+
+import httpx  # noqa: E402
+
+import fake_genai  # noqa: E402
+import main  # noqa: E402
+import services  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def event_loop_runner():
+    """Один event loop на все тесты: объекты приложения (пулы, блокировки) живут весь прогон, как в воркере."""
+    loop = asyncio.new_event_loop()
+    yield loop.run_until_complete
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def app_lifespan(event_loop_runner):
+    """Запускает lifespan приложения (services.startup/shutdown) один раз на прогон."""
+    lifespan = main.app.router.lifespan_context(main.app)
+    event_loop_runner(lifespan.__aenter__())
+    yield
+    event_loop_runner(lifespan.__aexit__(None, None, None))
+
+
+@pytest.fixture
+def run(event_loop_runner, app_lifespan):
+    """Выполняет корутину теста в общем event loop работающего приложения."""
+    return event_loop_runner
+
+
+@pytest.fixture
+def fake_client(monkeypatch):
+    """Заглушка GenAI с фиксированной задержкой: одновременные запросы успевают застать генерацию."""
+    client = fake_genai.FakeGenAIClient(latency_ms=200, jitter=0, chunk_ms=10, seed=1)
+    monkeypatch.setattr(services, "client", client)
+    return client
+
+
+@asynccontextmanager
+async def api_client(api_key: str):
+    """HTTP клиент к приложению через ASGI, с ключом клиента для лимитов."""
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver",
+                                 headers={"X-API-Key": api_key}) as client:
+        yield client
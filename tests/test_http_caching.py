@@ -0,0 +1,32 @@
+"""Условные GET страницы объяснения: ETag/Last-Modified и ответ 304."""
+from conftest import api_client
+
+
+def test_explanation_page_conditional_get(run, fake_client):
+    async def scenario():
+        async with api_client("conditional-get") as client:
+            created = await client.post("/api/explain", json={"topic": "Закон Ома", "level": "simple", "analogy": ""})
+            slug = created.json()["slug"]
+            first = await client.get(f"/explanation/{slug}")
+            by_etag = await client.get(f"/explanation/{slug}", headers={"If-None-Match": first.headers["etag"]})
+            by_date = await client.get(f"/explanation/{slug}",
+                                       headers={"If-Modified-Since": first.headers["last-modified"]})
+            changed = await client.get(f"/explanation/{slug}", headers={"If-None-Match": '"other-version"'})
+            return first, by_etag, by_date, changed
+
+    first, by_etag, by_date, changed = run(scenario())
+
+    assert first.status_code == 200
+    assert "Закон Ома" in first.text
+    assert by_etag.status_code == 304 and by_etag.content == b""
+    assert by_etag.headers["etag"] == first.headers["etag"]
+    assert by_date.status_code == 304
+    assert changed.status_code == 200
+
+
+def test_missing_explanation_page_is_404(run):
+    async def scenario():
+        async with api_client("conditional-get") as client:
+            return await client.get("/explanation/net-takoi-stranitsy")
+
+    assert run(scenario()).status_code == 404
@@ -0,0 +1,17 @@
+"""Негативный кеш: повтор запроса, не прошедшего проверку, не обращается к AI снова."""
+from conftest import api_client
+
+
+def test_empty_response_is_negatively_cached(run, fake_client, monkeypatch):
+    monkeypatch.setattr(fake_client, "text_for", lambda contents: "")
+
+    async def scenario():
+        async with api_client("negative-cache") as client:
+            body = {"topic": "Пустой ответ", "level": "simple", "analogy": ""}
+            return [await client.post("/api/explain", json=body) for _ in range(2)]
+
+    first, second = run(scenario())
+
+    assert first.status_code == 200 and first.json()["slug"] is None
+    assert second.json() == first.json()
+    assert fake_client.stats["requests"] == 1
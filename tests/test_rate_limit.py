@@ -0,0 +1,41 @@
+"""Лимит генераций по клиенту: промах кеша сверх бюджета - 429 с Retry-After, сохраненное отдается."""
+from app.core.rate_limit import BucketPolicy
+from conftest import api_client
+
+import services
+
+
+def test_generate_budget_exhausted_returns_429(run, fake_client, monkeypatch):
+    monkeypatch.setitem(services.rate_limiter.policies, "generate", BucketPolicy(per_minute=1, burst=1))
+
+    async def scenario():
+        async with api_client("rate-limit") as client:
+            first = await client.post("/api/explain", json={"topic": "Вулканы", "level": "simple", "analogy": ""})
+            limited = await client.post("/api/explain", json={"topic": "Ледники", "level": "simple", "analogy": ""})
+            cached = await client.post("/api/explain", json={"topic": "Вулканы", "level": "simple", "analogy": ""})
+            return first, limited, cached
+
+    first, limited, cached = run(scenario())
+
+    assert first.status_code == 200 and first.json()["slug"]
+    assert limited.status_code == 429
+    assert int(limited.headers["retry-after"]) >= 1
+    assert cached.status_code == 200 and cached.json()["slug"] == first.json()["slug"]
+    assert fake_client.stats["requests"] == 1
+
+
+def test_batch_is_charged_per_level(run, fake_client, monkeypatch):
+    monkeypatch.setitem(services.rate_limiter.policies, "explain", BucketPolicy(per_minute=1, burst=3))
+
+    async def scenario():
+        async with api_client("rate-limit-batch") as client:
+            batch = await client.post("/api/explain/batch", json={
+                "topic": "Приливы и отливы", "levels": ["simple", "tldr", "5-year-old"], "analogy": ""})
+            single = await client.post("/api/explain", json={"topic": "Приливы и отливы", "level": "simple",
+                                                              "analogy": ""})
+            return batch, single
+
+    batch, single = run(scenario())
+
+    assert batch.status_code == 200 and len(batch.json()["results"]) == 3
+    assert single.status_code == 429
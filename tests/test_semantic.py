@@ -0,0 +1,29 @@
+"""Семантический поиск перефразировок: близкие темы совпадают, темы с другими числами - нет."""
+import pytest
+
+pytest.importorskip("numpy")
+
+from app.core.semantic import SemanticIndex  # noqa: E402
+
+
+def test_lookup_matches_paraphrase_but_not_other_numbers(tmp_path):
+    index = SemanticIndex(tmp_path / "semantic_index.npz", dim=256)
+    index.add("python-3-simple", "Что такое Python 3", "simple")
+
+    assert index.lookup("что такое python 3?", "simple", 0.9)[0] == "python-3-simple"
+    assert index.lookup("Что такое Python 2", "simple", 0.5) is None
+    assert index.lookup("Что такое Python 3", "advanced", 0.5) is None
+
+
+def test_index_survives_save_and_load(tmp_path):
+    index = SemanticIndex(tmp_path / "semantic_index.npz", dim=256)
+    index.add("python-3-simple", "Что такое Python 3", "simple")
+    index.add("python-2-simple", "Что такое Python 2", "simple")
+    index.remove("python-3-simple")
+    index.save()
+
+    loaded = SemanticIndex(tmp_path / "semantic_index.npz", dim=256)
+
+    assert loaded.load()
+    assert loaded.lookup("Что такое Python 2", "simple", 0.9)[0] == "python-2-simple"
+    assert loaded.lookup("Что такое Python 3", "simple", 0.5) is None
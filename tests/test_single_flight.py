@@ -0,0 +1,55 @@
+"""Одновременные запросы одной темы - одна генерация, в том числе для потокового эндпоинта."""
+import asyncio
+
+from conftest import api_client
+
+
+def explain_body(topic: str) -> dict:
+    return {"topic": topic, "level": "simple", "analogy": ""}
+
+
+def test_concurrent_explain_requests_generate_once(run, fake_client):
+    async def scenario():
+        async with api_client("single-flight") as client:
+            return await asyncio.gather(*[
+                client.post("/api/explain", json=explain_body("Фотосинтез у растений")) for _ in range(5)])
+
+    responses = run(scenario())
+
+    assert [r.status_code for r in responses] == [200] * 5
+    slugs = {r.json()["slug"] for r in responses}
+    assert len(slugs) == 1 and None not in slugs
+    assert fake_client.stats["requests"] == 1
+
+
+def test_concurrent_streams_generate_once(run, fake_client):
+    async def scenario():
+        async with api_client("single-flight") as client:
+            async def stream(delay: float):
+                await asyncio.sleep(delay)  # Поздние подписчики получают и уже выданные фрагменты
+                return await client.post("/api/explain/stream", json=explain_body("Теория относительности"))
+            return await asyncio.gather(*[stream(i * 0.05) for i in range(5)])
+
+    responses = run(scenario())
+
+    assert [r.status_code for r in responses] == [200] * 5
+    assert len({r.text for r in responses}) == 1
+    assert "event: chunk" in responses[0].text and "event: done" in responses[0].text
+    assert fake_client.stats["requests"] == 1
+
+
+def test_stream_and_plain_requests_share_generation(run, fake_client):
+    async def scenario():
+        async with api_client("single-flight") as client:
+            async def plain():
+                await asyncio.sleep(0.05)  # Поток успевает начать генерацию
+                return await client.post("/api/explain", json=explain_body("Черные дыры"))
+            return await asyncio.gather(
+                client.post("/api/explain/stream", json=explain_body("Черные дыры")), plain(), plain(), plain())
+
+    stream_response, *plain_responses = run(scenario())
+
+    assert stream_response.status_code == 200 and "event: chunk" in stream_response.text
+    assert {r.json()["slug"] for r in plain_responses} == {plain_responses[0].json()["slug"]}
+    assert plain_responses[0].json()["slug"] is not None
+    assert fake_client.stats["requests"] == 1
@@ -0,0 +1,90 @@
+"""Хранилища объяснений: запись и чтение, перевод файлов командой compact-storage."""
+import datetime
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.core.record_format import shard_name
+from app.core.storage import JsonFileStorage, SQLiteStorage, explanation_to_dict
+from conftest import ROOT_DIR
+from models import StoredExplanation
+
+
+def make_explanation(slug: str, topic: str = "Тестовая тема") -> StoredExplanation:
+    return StoredExplanation(
+        topic_raw=topic, slug=slug, level="simple", explanation_text=f"Подробное объяснение темы «{topic}». " * 5,
+        explanation_html="<p>Подробное объяснение</p>", meta_title=topic, meta_description="Описание",
+        created_at=datetime.datetime(2024, 5, 1, 12, 0, tzinfo=datetime.timezone.utc), prompt_version=1)
+
+
+def json_storage(directory, compression: str = "none") -> JsonFileStorage:
+    return JsonFileStorage(directory, directory / ".index" / "search_index.json",
+                           directory / ".index" / "aliases.json", compression=compression)
+
+
+def compact_storage(directory, compression: str):
+    """Запускает python manage.py compact-storage для папки directory."""
+    subprocess.run([sys.executable, str(ROOT_DIR / "app" / "manage.py"), "compact-storage",
+                    "--compression", compression],
+                   env={**os.environ, "EXPLANATIONS_DIR": str(directory), "STORAGE_BACKEND": "json"},
+                   check=True, capture_output=True)
+
+
+@pytest.mark.parametrize("compression, suffix", [("none", ".json"), ("gzip", ".json.gz")])
+def test_json_storage_write_read(event_loop_runner, tmp_path, compression, suffix):
+    async def scenario():
+        storage = json_storage(tmp_path, compression)
+        await storage.init()
+        await storage.write(make_explanation("fotosintez-simple", "Фотосинтез"))
+        record = await storage.read("fotosintez-simple")
+        found = await storage.search("фотосинтез", 10)
+        await storage.close()
+        return record, found
+
+    storage_record, found = event_loop_runner(scenario())
+
+    assert storage_record.explanation == make_explanation("fotosintez-simple", "Фотосинтез")
+    assert (tmp_path / shard_name("fotosintez-simple") / f"fotosintez-simple{suffix}").exists()
+    assert [doc.slug for doc in found] == ["fotosintez-simple"]
+    assert event_loop_runner(json_storage(tmp_path, compression).read("net-takogo")) is None
+
+
+def test_sqlite_storage_write_read(event_loop_runner, tmp_path):
+    async def scenario():
+        storage = SQLiteStorage(tmp_path / "explanations.sqlite3")
+        await storage.init()
+        await storage.write(make_explanation("atom-simple", "Атом"))
+        record = await storage.read("atom-simple")
+        slugs = await storage.list_slugs()
+        await storage.close()
+        return record, slugs
+
+    record, slugs = event_loop_runner(scenario())
+
+    assert record.explanation == make_explanation("atom-simple", "Атом")
+    assert slugs == ["atom-simple"]
+
+
+def test_compact_storage_round_trip(event_loop_runner, tmp_path):
+    legacy = make_explanation("staraya-tema-simple", "Старая тема")
+    (tmp_path / "staraya-tema-simple.json").write_text(
+        json.dumps(explanation_to_dict(legacy), ensure_ascii=False, indent=4), encoding="utf-8")
+    current = make_explanation("novaya-tema-simple", "Новая тема")
+    event_loop_runner(json_storage(tmp_path).write(current))
+
+    compact_storage(tmp_path, "gzip")
+
+    assert not (tmp_path / "staraya-tema-simple.json").exists()
+    for record in (legacy, current):
+        assert (tmp_path / shard_name(record.slug) / f"{record.slug}.json.gz").exists()
+        assert event_loop_runner(json_storage(tmp_path, "gzip").read(record.slug)).explanation == record
+
+    compact_storage(tmp_path, "none")
+
+    for record in (legacy, current):
+        assert not (tmp_path / shard_name(record.slug) / f"{record.slug}.json.gz").exists()
+        assert (tmp_path / shard_name(record.slug) / f"{record.slug}.json").exists()
+        assert event_loop_runner(json_storage(tmp_path).read(record.slug)).explanation == record